@@ -0,0 +1,117 @@
+"""Compare per-hop CPU time and memory of the BeautifulSoup and lxml fast-path extractors.
+
+Usage:
+    python benchmarks/bench_extractors.py                 # synthetic pages
+    python benchmarks/bench_extractors.py saved/*.html    # recorded pages (run through every pattern set)
+    python benchmarks/bench_extractors.py --repeat 200 --padding 400
+
+Memory is the tracemalloc peak of one parse+extract, i.e. Python-level allocations. lxml keeps
+its tree in C memory, so its figure is mostly the wrapper objects; the RSS column is the
+process high-water mark after each engine's run and captures both.
+"""
+import argparse
+import importlib.util
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_app(name):
+    path = os.path.join(ROOT, name, 'app.py')
+    spec = importlib.util.spec_from_file_location(f"{name}_bench", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def ad_padding(blocks):
+    return ''.join(
+        f'<div class="ad-slot" id="ad{i}"><a href="https://ads.example/{i}" class="btn btn-ad">'
+        f'<span>Sponsored {i}</span></a><p>Filler text for block {i} with <b>markup</b> and '
+        f'<i>nested</i> <em>elements</em>.</p><script>var slot{i} = {{"id": {i}}};</script></div>'
+        for i in range(blocks)
+    )
+
+def synthetic_pages(blocks):
+    padding = ad_padding(blocks)
+    return {
+        'gdflix_page1': (f'<html><head><title>file</title></head><body>{padding}'
+                         '<a class="btn" href="/zfile/abc">FAST CLOUD DOWNLOAD</a>'
+                         '<a class="btn" href="https://drivebot.example/x">DRIVEBOT</a>'
+                         f'{padding}</body></html>', 'page1'),
+        'gdflix_poll': (f'<html><body>{padding}<p>Please wait, your link is being generated...</p>'
+                        f'{padding}</body></html>', 'poll'),
+        'hubcloud_drive': (f'<html><body>{padding}<div class="card-body">'
+                           '<a class="btn btn-success" href="https://cdn.fsl.pub/dl/abc">Download [FSL Server]</a>'
+                           f'</div>{padding}</body></html>', 'drive'),
+    }
+
+def measure(run, html, repeat):
+    run(html) # warm-up: regex compilation, lru caches
+    start = time.process_time()
+    for _ in range(repeat):
+        run(html)
+    cpu_ms = (time.process_time() - start) * 1000 / repeat
+    tracemalloc.start()
+    run(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu_ms, peak / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages', nargs='*', help='recorded HTML files; synthetic pages are used when omitted')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--padding', type=int, default=200, help='ad blocks around the buttons in synthetic pages')
+    args = parser.parse_args()
+
+    gdflix = load_app('gdflix_api')
+    hubcloud = load_app('hubcloud_api')
+    from bypass_common.extract import PARSER, etree, fast_page # put on sys.path by the apps
+    if etree is None:
+        sys.exit("lxml is not installed; the fast path is disabled.")
+
+    def gdflix_runner(patterns):
+        return {
+            'bs4': lambda html: gdflix.analyze_page(BeautifulSoup(html, PARSER), patterns),
+            'fast': lambda html: gdflix.analyze_page(fast_page(html), patterns),
+        }
+
+    def drive_runner():
+        return {
+            'bs4': lambda html: hubcloud.drive_extract_final_download_link(BeautifulSoup(html, PARSER), 'https://hubcloud.example/drive/abc', []),
+            'fast': lambda html: hubcloud.drive_extract_final_download_link(fast_page(html), 'https://hubcloud.example/drive/abc', []),
+        }
+
+    runners = {
+        'page1': gdflix_runner(gdflix.GDFLIX_PAGE1_PATTERNS),
+        'poll': gdflix_runner(gdflix.FAST_CLOUD_POLL_PATTERNS),
+        'drive': drive_runner(),
+    }
+
+    if args.pages:
+        pages = {}
+        for path in args.pages:
+            with open(path, encoding='utf-8', errors='replace') as handle:
+                html = handle.read()
+            for kind in runners:
+                pages[f"{os.path.basename(path)}:{kind}"] = (html, kind)
+    else:
+        pages = synthetic_pages(args.padding)
+
+    print(f"{'page':<32} {'size KB':>8} {'engine':<6} {'CPU ms/hop':>11} {'peak KB':>9} {'RSS MB':>8}")
+    for label, (html, kind) in pages.items():
+        results = {}
+        for engine, run in runners[kind].items():
+            cpu_ms, peak_kb = measure(run, html, args.repeat)
+            rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            results[engine] = cpu_ms
+            print(f"{label:<32} {len(html) / 1024:>8.1f} {engine:<6} {cpu_ms:>11.3f} {peak_kb:>9.1f} {rss_mb:>8.1f}")
+        print(f"{'':<32} {'':>8} speedup {results['bs4'] / results['fast']:>9.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Offline benchmark of full resolutions, replayed from recorded upstream fixtures.
+
+Usage:
+    # 1. record once (needs network, or a local mock upstream)
+    python benchmarks/bench_resolvers.py record --fixtures fixtures https://gdflix.example/file/abc fast_cloud=https://...
+    # 2. replay anywhere, offline
+    python benchmarks/bench_resolvers.py run --fixtures fixtures --iterations 50 --concurrency 8 --latency 0.05
+
+Recording runs each URL once through get_gdflix_download_link / handle_drive_link /
+handle_video_link with HTTP_FIXTURE_MODE=record and writes manifest.json next to the fixtures,
+labelling each URL with the strategy path that resolved it (or the name given as name=URL).
+Replay serves every exchange from disk (HTTP_FIXTURE_MODE=replay); a request that was never
+recorded fails like a network error. The resolvers' own waits (Fast Cloud polling, HubCloud's
+pauses between pages) are real sleeps and show up in latency, not in CPU.
+
+Per strategy path it reports throughput, p50/p95/p99 latency, process CPU per resolution and
+the process RSS high-water mark after that path has run.
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_app(name):
+    path = os.path.join(ROOT, name, 'app.py')
+    spec = importlib.util.spec_from_file_location(f"{name}_bench", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def load_apps(mode, fixtures, latency='0', jitter=0):
+    # The apps read their fixture settings at import time
+    os.environ.update({"HTTP_FIXTURE_MODE": mode, "HTTP_FIXTURE_DIR": os.path.abspath(fixtures),
+                       "HTTP_FIXTURE_LATENCY": str(latency), "HTTP_FIXTURE_JITTER": str(jitter)})
+    apps = {'gdflix': load_app('gdflix_api'), 'hubcloud': load_app('hubcloud_api')}
+    logging.disable(logging.INFO)
+    return apps
+
+def resolve(apps, kind, url):
+    # Returns (final link, logs); the result caches are bypassed on purpose
+    if kind == 'gdflix':
+        return apps['gdflix'].get_gdflix_download_link(url, [])
+    hubcloud = apps['hubcloud']
+    handler = hubcloud.handle_drive_link if kind == 'drive' else hubcloud.handle_video_link
+    return handler(hubcloud.new_session(), url, [])
+
+def strategy_path(kind, trace, link, logs):
+    if not link: return f"{kind}:failed"
+    if kind != 'gdflix': return kind
+    for span in trace.to_dict()["spans"]:
+        if span["name"].startswith('strategy_') and span["status"] == 'ok':
+            return span["name"][len('strategy_'):]
+    last = logs[-1].lower() if logs else ''
+    return 'pixeldrain' if 'pixeldrain' in last else 'r2' if 'r2' in last else 'gdflix'
+
+def record(args):
+    apps = load_apps('record', args.fixtures)
+    # Loaded by the apps, after the fixture settings
+    from bypass_common.batch import classify_batch_url
+    from bypass_common.tracing import tracer
+    manifest = []
+    for item in args.urls:
+        name, separator, url = item.partition('=')
+        if not separator or '://' in name: name, url = '', item
+        kind = classify_batch_url(url)
+        if kind is None: sys.exit(f"Not a URL: {url}")
+        with tracer.trace('bench.record', force=True) as trace:
+            link, logs = resolve(apps, kind, url)
+        path = name or strategy_path(kind, trace, link, logs)
+        manifest.append({"name": path, "kind": kind, "url": url, "finalUrl": link})
+        print(f"{path:<14} {kind:<7} {url} -> {link}")
+    os.makedirs(args.fixtures, exist_ok=True)
+    with open(os.path.join(args.fixtures, 'manifest.json'), 'w', encoding='utf-8') as handle:
+        json.dump(manifest, handle, indent=1)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def run(args):
+    with open(os.path.join(args.fixtures, 'manifest.json'), encoding='utf-8') as handle:
+        manifest = json.load(handle)
+    apps = load_apps('replay', args.fixtures, args.latency, args.jitter)
+
+    def timed(entry):
+        start = time.perf_counter()
+        link, _ = resolve(apps, entry["kind"], entry["url"])
+        return time.perf_counter() - start, link == entry["finalUrl"]
+
+    print(f"{'path':<14} {'runs':>5} {'ok':>5} {'res/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'CPU ms/res':>11} {'RSS MB':>8}")
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for entry in manifest:
+            if args.only and entry["name"] not in args.only: continue
+            timed(entry) # warm-up: imports, regex compilation, fixture cache
+            cpu_start, wall_start = time.process_time(), time.perf_counter()
+            results = list(pool.map(timed, [entry] * args.iterations))
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            latencies = [latency * 1000 for latency, _ in results]
+            ok = sum(1 for _, matched in results if matched)
+            rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"{entry['name']:<14} {len(results):>5} {ok:>5} {len(results) / wall:>8.2f} "
+                  f"{percentile(latencies, 0.5):>9.1f} {percentile(latencies, 0.95):>9.1f} {percentile(latencies, 0.99):>9.1f} "
+                  f"{cpu * 1000 / len(results):>11.2f} {rss_mb:>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record', help='resolve URLs once against the live upstream and save fixtures')
+    record_parser.add_argument('urls', nargs='+', help='URL or name=URL')
+    record_parser.add_argument('--fixtures', default='fixtures')
+    run_parser = commands.add_parser('run', help='replay the recorded resolutions offline')
+    run_parser.add_argument('--fixtures', default='fixtures')
+    run_parser.add_argument('--iterations', type=int, default=20, help='resolutions per strategy path')
+    run_parser.add_argument('--concurrency', type=int, default=1)
+    run_parser.add_argument('--latency', default='0', help='seconds added per upstream response, or "recorded"')
+    run_parser.add_argument('--jitter', type=float, default=0, help='+/- fraction applied to the latency')
+    run_parser.add_argument('--only', nargs='*', help='strategy paths to run')
+    args = parser.parse_args()
+    if args.command == 'record':
+        record(args)
+    else:
+        run(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Step-load generator for the GDFLIX and HubCloud APIs, run against benchmarks/mock_upstream.py.
+
+Usage:
+    python benchmarks/mock_upstream.py --port 8770 --latency 0.2 &
+    # start both apps under gunicorn with the repo's gunicorn_config.py, then ramp up load
+    python benchmarks/loadgen.py --spawn --workers 2 --steps 4,8,16,32,64 --step-seconds 30
+    # or drive apps that are already running
+    python benchmarks/loadgen.py --gdflix http://127.0.0.1:10000 --hubcloud http://127.0.0.1:10001
+
+Each step keeps N clients busy (closed loop) for --step-seconds, every request asking for a fresh
+link so the result caches never answer. The flow mix picks mock flows by weight:
+pd, r2, fc, db (GDFLIX file pages with those buttons), drive and video (HubCloud).
+
+The report lists throughput, latency percentiles and error rate per step. The saturation
+point is the first step where adding clients no longer adds throughput (< 10% gain) while
+p95 latency grows, or where errors/timeouts pass 1%.
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLIENT_TIMEOUT = 130 # seconds; above gunicorn's 120s worker timeout so those surface as errors, not client timeouts
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        flow, _, weight = item.partition('=')
+        mix[flow.strip()] = float(weight or 1)
+    return mix
+
+def spawn_app(name, port, args, upstream):
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(args.workers), DEFAULT_RESPONSE_MODE='minimal',
+               EXTRA_DRIVE_INTERMEDIATE_DOMAINS=urlparse(upstream).netloc)
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn_config.py'),
+                                '--chdir', os.path.join(ROOT, name), 'app:app'],
+                               env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(base, timeout=1)
+            return process, base
+        except requests.exceptions.RequestException:
+            time.sleep(0.3)
+    process.kill()
+    sys.exit(f"{name} did not start on port {port}")
+
+def request_for(flow, upstream, targets):
+    link_id = uuid.uuid4().hex[:12]
+    if flow in ('drive', 'video'):
+        return f"{targets['hubcloud']}/api/hubcloud", {"hubcloudUrl": f"{upstream}/{flow}/{link_id}", "responseMode": "minimal"}
+    return f"{targets['gdflix']}/api/gdflix", {"gdflixUrl": f"{upstream}/file/{flow}/{link_id}", "responseMode": "minimal"}
+
+def run_step(clients, seconds, flows, weights, upstream, targets):
+    results = []
+    lock = threading.Lock()
+    stop_at = time.time() + seconds
+
+    def client():
+        session = requests.Session()
+        while time.time() < stop_at:
+            flow = random.choices(flows, weights)[0]
+            endpoint, body = request_for(flow, upstream, targets)
+            start = time.perf_counter()
+            try:
+                response = session.post(endpoint, json=body, timeout=CLIENT_TIMEOUT)
+                ok = response.status_code == 200 and response.json().get('success') is True
+            except (requests.exceptions.RequestException, ValueError):
+                ok = False
+            with lock: results.append((time.perf_counter() - start, ok))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for _ in range(clients): pool.submit(client)
+    return results, time.perf_counter() - started
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] if ordered else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--upstream', default='http://127.0.0.1:8770', help='mock upstream base URL')
+    parser.add_argument('--gdflix', help='running GDFLIX API base URL')
+    parser.add_argument('--hubcloud', help='running HubCloud API base URL')
+    parser.add_argument('--spawn', action='store_true', help='start both apps under gunicorn with gunicorn_config.py')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers per spawned app')
+    parser.add_argument('--mix', default='pd=3,r2=2,fc=1,db=1,drive=2,video=2')
+    parser.add_argument('--steps', default='1,2,4,8,16,32,64', help='concurrent clients per step')
+    parser.add_argument('--step-seconds', type=float, default=20)
+    args = parser.parse_args()
+
+    targets, processes = {'gdflix': args.gdflix, 'hubcloud': args.hubcloud}, []
+    if args.spawn:
+        for name, port in (('gdflix', 10100), ('hubcloud', 10101)):
+            process, targets[name] = spawn_app(f"{name}_api", port, args, args.upstream)
+            processes.append(process)
+    mix = {flow: weight for flow, weight in parse_mix(args.mix).items()
+           if targets['hubcloud' if flow in ('drive', 'video') else 'gdflix']}
+    if not mix: sys.exit("No app to drive: pass --spawn, --gdflix or --hubcloud")
+
+    print(f"{'clients':>7} {'requests':>8} {'res/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    previous, saturation = None, None
+    try:
+        for clients in (int(step) for step in args.steps.split(',')):
+            results, elapsed = run_step(clients, args.step_seconds, list(mix), list(mix.values()), args.upstream, targets)
+            latencies = [latency * 1000 for latency, _ in results]
+            throughput = len(results) / elapsed
+            error_rate = sum(1 for _, ok in results if not ok) / max(1, len(results))
+            p95 = percentile(latencies, 0.95)
+            print(f"{clients:>7} {len(results):>8} {throughput:>8.2f} {percentile(latencies, 0.5):>9.0f} {p95:>9.0f} "
+                  f"{percentile(latencies, 0.99):>9.0f} {error_rate:>7.1%}")
+            if saturation is None:
+                if error_rate > 0.01:
+                    saturation = (clients, throughput, f"error rate {error_rate:.1%}")
+                elif previous and throughput < previous[1] * 1.1 and p95 > previous[2]:
+                    saturation = (previous[0], previous[1], f"throughput flat from {previous[0]} to {clients} clients while p95 grew")
+            previous = (clients, throughput, p95)
+    finally:
+        for process in processes: process.terminate()
+        for process in processes: process.wait(timeout=30)
+
+    if saturation:
+        print(f"\nSaturation at ~{saturation[0]} clients, {saturation[1]:.2f} resolutions/s ({saturation[2]}).")
+    else:
+        print("\nNo saturation within the tested steps; extend --steps.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Mock GDFLIX / HubCloud upstream for load tests and fixture recording.
+
+Usage:
+    python benchmarks/mock_upstream.py --port 8770 --latency 0.2 --error-rate 0.02 --page-kb 80
+    # many concurrent clients: serve it from gevent instead of the threaded dev server
+    MOCK_LATENCY=0.2 gunicorn -k gevent -w 1 -b 127.0.0.1:8770 --chdir benchmarks mock_upstream:app
+
+Flows (IDs are free-form; use a fresh one per request so the apps' result caches stay cold):
+    /file/<buttons>/<id>   GDFLIX link: MOCK_REDIRECT_HOPS alternating meta-refresh / JS redirects,
+                           then the file page. <buttons> combines pd, r2, fc and db
+                           (Pixeldrain, R2, Fast Cloud, Drivebot), e.g. /file/fcdb/abc; bc is a
+                           Fast Cloud button whose page answers 503, sc one whose link takes 4s.
+    /big/<buttons>/<id>    1 MB page whose META refresh in <head> leads to /file/<buttons>/<id>.
+    /go/<buttons>/<id>     Short link redirecting into /file/<buttons>/<id>; /alias/<buttons>/<id>
+                           redirects to a different id (/file/<buttons>/<id>x).
+    /fc/<id>               Fast Cloud page; its generate POST becomes ready after MOCK_FAST_CLOUD_READY s
+                           (or ?ready=<s>). The poll page carries an ETag and answers If-None-Match with 304.
+    /db/<id>               Drivebot index -> server choice -> "Generate Link" -> gdindex.lol link.
+    /drive/<id>            HubCloud drive form; the POST leads through a gamerxyt-style intermediate
+                           page at /gamerxyt/<id>. Start the HubCloud app with
+                           EXTRA_DRIVE_INTERMEDIATE_DOMAINS=<mock host:port> so it follows it.
+    /video/<id>            HubCloud video page -> /hubcloud.php -> PixelServer link.
+
+Latency, jitter, error rate and page size apply to every response and are read from the
+MOCK_* environment variables or the matching flags. The mock keeps no state,
+so it can run with several workers.
+"""
+import argparse
+import os
+import random
+import time
+
+from flask import Flask, request, jsonify
+
+MOCK_LATENCY = float(os.environ.get("MOCK_LATENCY", 0.05)) # seconds per response
+MOCK_JITTER = float(os.environ.get("MOCK_JITTER", 0.3)) # +/- fraction applied to the latency
+MOCK_ERROR_RATE = float(os.environ.get("MOCK_ERROR_RATE", 0)) # fraction of responses that are 503s
+MOCK_PAGE_KB = int(os.environ.get("MOCK_PAGE_KB", 60)) # ad/script padding per HTML page
+MOCK_FAST_CLOUD_READY = float(os.environ.get("MOCK_FAST_CLOUD_READY", 8)) # seconds until a generated link is ready
+MOCK_REDIRECT_HOPS = int(os.environ.get("MOCK_REDIRECT_HOPS", 2))
+
+app = Flask(__name__)
+
+def padding(kb):
+    block = ('<div class="ad-slot"><a href="https://ads.example/x" class="btn btn-ad"><span>Sponsored</span></a>'
+             '<p>Filler text with <b>markup</b>.</p><script>var slot = {"id": 1};</script></div>')
+    return block * max(0, kb * 1024 // len(block))
+
+PAD = padding(MOCK_PAGE_KB // 2) # half before the decisive elements, half after
+BIG_PAD = padding(1024)
+
+def page(body, head=''):
+    return f'<html><head><title>mock</title>{head}</head><body>{PAD}{body}{PAD}</body></html>'
+
+@app.before_request
+def inject_latency_and_errors():
+    if MOCK_LATENCY > 0:
+        time.sleep(MOCK_LATENCY * (1 + random.uniform(-MOCK_JITTER, MOCK_JITTER)))
+    if MOCK_ERROR_RATE and random.random() < MOCK_ERROR_RATE:
+        return page('<h1>503 Service Temporarily Unavailable</h1>'), 503
+
+# --- GDFLIX ---
+@app.route('/file/<buttons>/<fid>')
+@app.route('/file/<buttons>/<fid>/<int:hop>')
+def gdflix_redirect(buttons, fid, hop=0):
+    if hop >= MOCK_REDIRECT_HOPS:
+        return gdflix_file_page(buttons, fid)
+    target = f"/file/{buttons}/{fid}/{hop + 1}"
+    if hop % 2 == 0:
+        return page('Redirecting...', head=f'<meta http-equiv="refresh" content="0;url={target}">')
+    return page(f'<script>location.replace("{target}");</script>Redirecting...')
+
+@app.route('/big/<buttons>/<fid>')
+def gdflix_big_redirect(buttons, fid):
+    head = f'<title>mock</title><meta http-equiv="refresh" content="0;url=/file/{buttons}/{fid}">'
+    return f'<html><head>{head}</head><body>{BIG_PAD}</body></html>'
+
+@app.route('/go/<buttons>/<fid>')
+@app.route('/alias/<buttons>/<fid>')
+def gdflix_short_link(buttons, fid):
+    target_id = fid if request.path.startswith('/go/') else f"{fid}x"
+    return page('Redirecting...', head=f'<meta http-equiv="refresh" content="0;url=/file/{buttons}/{target_id}">')
+
+def gdflix_file_page(buttons, fid):
+    links = []
+    if 'pd' in buttons: links.append(f'<a class="btn" href="https://pixeldrain.com/api/file/{fid}">PixeldrainDL 20MB/s</a>')
+    if 'r2' in buttons: links.append(f'<a class="btn" href="https://pub-1.r2.dev/{fid}.mkv?X-Amz-Expires=3600">CLOUD DOWNLOAD [R2]</a>')
+    if 'fc' in buttons: links.append(f'<a class="btn" href="/fc/{fid}">FAST CLOUD DOWNLOAD</a>')
+    if 'bc' in buttons: links.append(f'<a class="btn" href="/fc/{fid}?broken=1">FAST CLOUD DOWNLOAD</a>')
+    if 'sc' in buttons: links.append(f'<a class="btn" href="/fc/{fid}?ready=4">FAST CLOUD DOWNLOAD</a>')
+    if 'db' in buttons: links.append(f'<form action="/db/{fid}" method="get"><button class="btn">DRIVEBOT</button></form>')
+    return page(f'<div class="card">{"".join(links)}<a href="https://t.me/example">Telegram</a></div>')
+
+@app.route('/fc/<fid>', methods=['GET', 'POST'])
+def fast_cloud(fid):
+    if request.args.get('broken'):
+        return page('<h1>503 Service Temporarily Unavailable</h1>'), 503
+    if request.method == 'POST':
+        ready_at = time.time() + float(request.args.get('ready', MOCK_FAST_CLOUD_READY))
+        return jsonify({"visit_url": f"/fcpoll/{fid}?ready={ready_at:.3f}", "error": False})
+    return page('<form method="post"><input type="hidden" name="key" value="k1">'
+                '<button id="cloud" class="btn">Generate Cloud Link</button></form>')
+
+@app.route('/fcpoll/<fid>')
+def fast_cloud_poll(fid):
+    ready = time.time() >= float(request.args.get('ready', 0))
+    etag = f'"{"ready" if ready else "pending"}-{fid}"'
+    if request.headers.get('If-None-Match') == etag: return '', 304, {'ETag': etag}
+    if ready:
+        return page(f'<a class="btn" href="https://fastcloud.example/dl/{fid}">Cloud Resume Download</a>'), {'ETag': etag}
+    return page('<p>Please wait, your link is being generated...</p>'), {'ETag': etag}
+
+@app.route('/db/<fid>')
+def drivebot_index(fid):
+    return page(f'<form action="/db/{fid}/server" method="post"><input type="hidden" name="token" value="t1">'
+                '<button name="server" value="1" class="btn">DRIVEBOT 1 [R1]</button></form>')
+
+@app.route('/db/<fid>/server', methods=['POST'])
+def drivebot_server(fid):
+    return page(f'<form action="/db/{fid}/generate" method="post"><input type="hidden" name="g" value="2">'
+                '<input type="submit" class="btn" value="Generate Link"></form>')
+
+@app.route('/db/<fid>/generate', methods=['POST'])
+def drivebot_generate(fid):
+    return page(f'<input class="form-control" value="https://a.gdindex.lol/{fid}/file.mkv" readonly>')
+
+# --- HubCloud ---
+@app.route('/drive/<fid>', methods=['GET', 'POST'])
+def hubcloud_drive(fid):
+    if request.method == 'POST':
+        return page(f'<div class="card-body"><a class="btn" href="{request.host_url}gamerxyt/{fid}">Download Here</a></div>')
+    return page(f'<form method="POST"><input type="hidden" name="op" value="download1"><input type="hidden" name="id" value="{fid}">'
+                '<button class="btn">Generate Download Link</button></form>')
+
+@app.route('/gamerxyt/<fid>')
+def hubcloud_intermediate(fid):
+    return page(f'<div class="card-body"><a class="btn btn-success" href="https://cdn.fsl.pub/dl/{fid}">Download [FSL Server]</a></div>')
+
+@app.route('/video/<fid>')
+def hubcloud_video(fid):
+    return page(f'<div class="vd"><a class="btn" href="/hubcloud.php?id={fid}">Generate Direct Download Link</a></div>')
+
+@app.route('/hubcloud.php')
+def hubcloud_video_servers():
+    fid = request.args.get('id', '')
+    return page(f'<a class="btn btn-success" href="https://pixeldrain.com/api/file/{fid}">Download [PixelServer : 2]</a>')
+
+def main():
+    global MOCK_LATENCY, MOCK_JITTER, MOCK_ERROR_RATE, MOCK_PAGE_KB, MOCK_FAST_CLOUD_READY, MOCK_REDIRECT_HOPS, PAD
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8770)
+    parser.add_argument('--latency', type=float, default=MOCK_LATENCY)
+    parser.add_argument('--jitter', type=float, default=MOCK_JITTER)
+    parser.add_argument('--error-rate', type=float, default=MOCK_ERROR_RATE)
+    parser.add_argument('--page-kb', type=int, default=MOCK_PAGE_KB)
+    parser.add_argument('--fast-cloud-ready', type=float, default=MOCK_FAST_CLOUD_READY)
+    parser.add_argument('--redirect-hops', type=int, default=MOCK_REDIRECT_HOPS)
+    args = parser.parse_args()
+    MOCK_LATENCY, MOCK_JITTER, MOCK_ERROR_RATE = args.latency, args.jitter, args.error_rate
+    MOCK_PAGE_KB, MOCK_FAST_CLOUD_READY, MOCK_REDIRECT_HOPS = args.page_kb, args.fast_cloud_ready, args.redirect_hops
+    PAD = padding(MOCK_PAGE_KB // 2)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+if __name__ == '__main__':
+    main()
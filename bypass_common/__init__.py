@@ -0,0 +1,22 @@
+# bypass_common/__init__.py
+# Infrastructure shared by the GDFLIX and HubCloud services. Each app.py keeps only its own scraping
+# code and endpoints, and creates its Service, which it passes to the functions that resolve links
+# on its behalf.
+#   service    Service: per-service caches, jobs, prefetch and the resolve path
+#   store      shared SQLite file (WAL) used by every worker on the host
+#   cache      in-process result cache, request coalescing, link expiry, negative cache
+#   upstream   pooled HTTP adapter and sessions
+#   limits     per-host concurrency and rate limits
+#   pacing     learned gaps between steps on the same host
+#   breakers   circuit breakers per host (and per GDFLIX strategy)
+#   learning   strategy order learned from outcomes, mirror link probes
+#   streaming  page fetches that stop once the page is decided
+#   extract    lxml fast path with a BeautifulSoup fallback
+#   fixtures   record/replay of upstream HTTP
+#   metrics    Prometheus metrics and stage timers
+#   tracing    per-request traces and their export
+#   responses  response modes, log levels and debug captures
+#   jobs       background resolution jobs
+#   batch      batch resolution and forwarding to the sibling service
+#   prefetch   ahead-of-time resolution of watched links
+#   settings   numeric environment settings, validated with a fallback
@@ -0,0 +1,187 @@
+# bypass_common/batch.py
+# Batch resolution: links spread over a shared pool with a per-host cap, answered in completion
+# order, and links of the sibling service's kind forwarded to it.
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+
+from bypass_common.responses import LogBuffer
+from bypass_common.settings import env_int
+from bypass_common.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# --- Batch Configuration ---
+BATCH_MAX_URLS = env_int("BATCH_MAX_URLS", 500, minimum=1)
+BATCH_WORKERS = env_int("BATCH_WORKERS", 16, minimum=1)
+BATCH_PER_HOST_CONCURRENCY = env_int("BATCH_PER_HOST_CONCURRENCY", 4, minimum=1)
+# Links of the other kind in a mixed batch or prefetch request are forwarded to the sibling service
+# (HUBCLOUD_API_URL for GDFLIX, GDFLIX_API_URL for HubCloud, e.g. http://127.0.0.1:5002); without it they are rejected
+SIBLING_TIMEOUT = 30 # seconds to connect to the sibling service, and for its answer to a forwarded prefetch
+SIBLING_READ_TIMEOUT = 120 # seconds to wait for the next line of a forwarded batch
+# A batch still waiting for results after BATCH_IDLE_TIMEOUT seconds without any arriving answers the
+# rest with an error, so one stuck resolution never holds the response open forever
+BATCH_IDLE_TIMEOUT = env_int("BATCH_IDLE_TIMEOUT", 300, minimum=1)
+
+# --- Batch Resolution ---
+class HostDispatcher:
+    # Hands work to the pool at most per_host items at a time per upstream host. The rest wait in a
+    # per-host queue instead of holding pool threads, so links to a slow host never keep the links
+    # to other hosts waiting behind them.
+    def __init__(self, executor, per_host):
+        self.executor = executor
+        self.per_host = per_host
+        self._running = {}
+        self._waiting = {}
+        self._lock = threading.Lock()
+
+    def submit(self, host, fn, *args):
+        with self._lock:
+            if self._running.get(host, 0) >= self.per_host:
+                self._waiting.setdefault(host, deque()).append((fn, args))
+                return
+            self._running[host] = self._running.get(host, 0) + 1
+        self.executor.submit(self._run, host, fn, args)
+
+    def _run(self, host, fn, args):
+        try:
+            fn(*args)
+        finally:
+            with self._lock:
+                waiting = self._waiting.get(host)
+                if waiting:
+                    fn, args = waiting.popleft()
+                    if not waiting: del self._waiting[host]
+                else:
+                    fn = None
+                    self._running[host] -= 1
+                    if not self._running[host]: del self._running[host]
+            if fn is not None: self.executor.submit(self._run, host, fn, args)
+
+    def stats(self):
+        with self._lock:
+            return {"running": sum(self._running.values()), "waiting": sum(len(waiting) for waiting in self._waiting.values())}
+
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="resolve-batch")
+batch_dispatcher = HostDispatcher(batch_executor, BATCH_PER_HOST_CONCURRENCY)
+sibling_session = requests.Session() # not the pooled adapter: forwarded requests are not upstream traffic
+
+def classify_batch_url(url):
+    # Same path detection as the endpoints: HubCloud /drive/ and /video/, everything else is GDFLIX
+    if not url or not isinstance(url, str): return None
+    parsed = urlparse(url)
+    if not parsed.scheme or not parsed.netloc: return None
+    path = parsed.path.lower()
+    if path.startswith('/drive/'): return 'drive'
+    if path.startswith('/video/'): return 'video'
+    return 'gdflix'
+
+def resolve_batch_item(service, index, url, link_type, include_logs, include_trace=False):
+    item = {"index": index, "url": url, "type": link_type, "success": False, "finalUrl": None, "error": None, "cached": False, "expiresAt": None}
+    logs = LogBuffer()
+    trace = None
+    started = time.time()
+    try:
+        if link_type is None:
+            item["error"] = f"Invalid URL format provided: {url}"
+        else:
+            with tracer.trace('batch.resolve', force=include_trace, url=url, index=index) as trace:
+                final_download_link, error, cached, link_expires_at = service.process_request(url, logs)
+            item["success"] = bool(final_download_link)
+            item["finalUrl"] = final_download_link
+            item["error"] = None if final_download_link else error
+            item["cached"] = cached
+            item["expiresAt"] = link_expires_at
+    except Exception as e:
+        logger.error(f"FATAL Batch Item Error ({url}): {e}", exc_info=True)
+        item["error"] = "Internal server error processing this link."
+    item["elapsed"] = round(time.time() - started, 3)
+    if include_logs: item["logs"] = list(logs)
+    if trace and include_trace: item["trace"] = trace.to_dict()
+    return item
+
+def is_sibling_link(service, link_type):
+    return link_type is not None and link_type not in service.link_types
+
+def batch_error_item(index, url, error):
+    return {"index": index, "url": url, "type": classify_batch_url(url), "success": False, "finalUrl": None, "error": error,
+            "cached": False, "expiresAt": None, "elapsed": 0}
+
+def forward_batch_items(service, items, include_logs, include_trace, results):
+    # items: (index, url) pairs for the sibling service; each of its NDJSON answers is put on results
+    # with its index in this batch, and links it never answered get an error item
+    pending = dict(enumerate(items))
+    error = f"Mixed batches need {service.sibling_env} (the {service.sibling_label} service) to resolve this link."
+    try:
+        if service.sibling_url:
+            body = {"urls": [url for _, url in items], "includeLogs": include_logs, "trace": include_trace}
+            with sibling_session.post(f"{service.sibling_url}/api/batch", json=body, stream=True,
+                                      timeout=(SIBLING_TIMEOUT, SIBLING_READ_TIMEOUT)) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line: continue
+                    item = json.loads(line)
+                    item["index"] = pending.pop(item["index"])[0]
+                    results.put(item)
+            error = f"The {service.sibling_label} service did not answer for this link."
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Batch forwarding to {service.sibling_url} failed: {e}")
+        error = f"The {service.sibling_label} service could not be reached: {e}"
+    except Exception as e:
+        logger.warning(f"Batch forwarding to {service.sibling_url} got a bad answer: {e}", exc_info=True)
+        error = f"The {service.sibling_label} service gave an invalid answer for this link."
+    finally:
+        # Whatever happened, every link handed to the sibling gets a line
+        for index, url in pending.values():
+            results.put(batch_error_item(index, url, error))
+
+def forward_prefetch(service, items):
+    # items: (index, url, priority); returns (queued, rejected, status code) from the sibling's /api/prefetch
+    error = f"Mixed prefetch requests need {service.sibling_env} (the {service.sibling_label} service) to watch this link."
+    if service.sibling_url:
+        try:
+            response = sibling_session.post(f"{service.sibling_url}/api/prefetch", timeout=SIBLING_TIMEOUT,
+                                            json={"urls": [{"url": url, "priority": priority} for _, url, priority in items]})
+            answer = response.json()
+            rejected = [dict(entry, index=items[entry["index"]][0]) for entry in answer.get("rejected", [])]
+            return answer.get("queued", 0), rejected, response.status_code
+        except (requests.exceptions.RequestException, ValueError, KeyError, IndexError, TypeError) as e:
+            logger.warning(f"Prefetch forwarding to {service.sibling_url} failed: {e}")
+            error = f"The {service.sibling_label} service could not be reached: {e}"
+    return 0, [{"index": index, "url": url, "error": error} for index, url, _ in items], 503
+
+def batch_results(service, urls, include_logs=False, include_trace=False):
+    # One result per link, in completion order; links of the sibling's kind go to it in one request
+    results = queue.Queue()
+    outstanding = dict(enumerate(urls))
+    sibling_items = []
+    for index, url in enumerate(urls):
+        link_type = classify_batch_url(url)
+        if is_sibling_link(service, link_type):
+            sibling_items.append((index, url))
+        elif link_type is None:
+            results.put(resolve_batch_item(service, index, url, link_type, include_logs, include_trace))
+        else:
+            # At most BATCH_PER_HOST_CONCURRENCY links per host at once, across all batches of this worker
+            batch_dispatcher.submit(urlparse(url).netloc.lower(), lambda *args: results.put(resolve_batch_item(*args)),
+                                    service, index, url, link_type, include_logs, include_trace)
+    if sibling_items:
+        threading.Thread(target=forward_batch_items, args=(service, sibling_items, include_logs, include_trace, results), daemon=True).start()
+    while outstanding:
+        try:
+            item = results.get(timeout=BATCH_IDLE_TIMEOUT)
+        except queue.Empty:
+            logger.warning(f"Batch gave up on {len(outstanding)} links after {BATCH_IDLE_TIMEOUT}s without a result")
+            for index, url in sorted(outstanding.items()):
+                yield batch_error_item(index, url, f"No result for this link within {BATCH_IDLE_TIMEOUT}s.")
+            return
+        if item["index"] in outstanding:
+            del outstanding[item["index"]]
+            yield item
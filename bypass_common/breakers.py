@@ -0,0 +1,131 @@
+# bypass_common/breakers.py
+# Circuit breakers that stop calling an upstream host (or a GDFLIX strategy) while it keeps failing.
+import logging
+import threading
+import time
+from collections import deque
+
+import requests
+
+from bypass_common.metrics import metrics
+from bypass_common.settings import env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+# --- Circuit Breaker Configuration ---
+# Breakers per upstream host (GDFLIX adds one per strategy). One opens when, over its last BREAKER_WINDOW calls
+# (at least BREAKER_MIN_CALLS), the error or slow-call rate reaches its threshold; after
+# BREAKER_OPEN_SECONDS it lets BREAKER_HALF_OPEN_PROBES calls through, closing if they all succeed.
+BREAKER_WINDOW = 20
+BREAKER_MIN_CALLS = 8
+BREAKER_ERROR_RATE = 0.5 # 5xx, 429, timeouts and connection errors count as errors
+BREAKER_SLOW_RATE = 0.8
+BREAKER_HOST_SLOW_SECONDS = 10 # time to response headers
+BREAKER_OPEN_SECONDS = env_int("BREAKER_OPEN_SECONDS", 30, minimum=0)
+BREAKER_HALF_OPEN_PROBES = 2
+BREAKER_LINK_PROBE_RATE = env_float("BREAKER_LINK_PROBE_RATE", 0.1, minimum=0) # share of returned mirror links HEAD-checked in the background
+
+# --- Circuit Breakers ---
+class CircuitOpen(requests.exceptions.RequestException):
+    pass
+
+class CircuitBreaker:
+    # closed -> open when the recent error or slow-call rate passes its threshold; open -> half_open
+    # after BREAKER_OPEN_SECONDS; half_open -> closed after BREAKER_HALF_OPEN_PROBES good calls, or
+    # back to open on the first bad one.
+    def __init__(self, kind, key, slow_seconds):
+        self.kind = kind
+        self.key = key
+        self.slow_seconds = slow_seconds
+        self.state = 'closed'
+        self.reason = None
+        self.outcomes = deque(maxlen=BREAKER_WINDOW) # (ok, slow)
+        self.opened_at = 0
+        self.half_opened_at = 0
+        self.probes = 0
+        self.probe_successes = 0
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def _transition(self, state):
+        self.state = state
+        self.probes = self.probe_successes = 0
+        if state == 'open':
+            self.opened_at = time.monotonic()
+            self.trips += 1
+        elif state == 'half_open':
+            self.half_opened_at = time.monotonic()
+        else:
+            self.outcomes.clear()
+            self.reason = None
+        metrics.inc('circuit_breaker_transitions_total', {'kind': self.kind, 'key': self.key, 'state': state})
+        logger.warning(f"Circuit breaker {self.kind}:{self.key} is now {state}" + (f" ({self.reason})" if self.reason else ''))
+
+    def current_state(self):
+        with self.lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= BREAKER_OPEN_SECONDS: return 'half_open'
+            return self.state
+
+    def retry_in(self):
+        return max(0, BREAKER_OPEN_SECONDS - (time.monotonic() - self.opened_at))
+
+    def allow(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.state == 'open':
+                if now - self.opened_at < BREAKER_OPEN_SECONDS: return False
+                self._transition('half_open')
+            if self.state == 'half_open':
+                if self.probes >= BREAKER_HALF_OPEN_PROBES:
+                    if now - self.half_opened_at < BREAKER_OPEN_SECONDS: return False
+                    self.half_opened_at, self.probes, self.probe_successes = now, 0, 0 # probes never reported back
+                self.probes += 1
+            return True
+
+    def cancel(self):
+        # An allowed call that never reached the upstream
+        with self.lock:
+            if self.state == 'half_open' and self.probes: self.probes -= 1
+
+    def record(self, ok, seconds):
+        slow = seconds > self.slow_seconds
+        with self.lock:
+            if self.state == 'half_open':
+                if not ok or slow:
+                    self.reason = f"probe {'was slow' if ok else 'failed'}"
+                    self._transition('open')
+                else:
+                    self.probe_successes += 1
+                    if self.probe_successes >= BREAKER_HALF_OPEN_PROBES: self._transition('closed')
+                return
+            if self.state == 'open': return
+            self.outcomes.append((ok, slow))
+            if len(self.outcomes) < BREAKER_MIN_CALLS: return
+            error_rate = sum(1 for call_ok, _ in self.outcomes if not call_ok) / len(self.outcomes)
+            slow_rate = sum(1 for _, call_slow in self.outcomes if call_slow) / len(self.outcomes)
+            if error_rate >= BREAKER_ERROR_RATE or slow_rate >= BREAKER_SLOW_RATE:
+                self.reason = f"{error_rate:.0%} errors, {slow_rate:.0%} slow over the last {len(self.outcomes)} calls"
+                self._transition('open')
+
+    def stats(self):
+        return {"state": self.current_state(), "reason": self.reason, "trips": self.trips, "recentCalls": len(self.outcomes)}
+
+class BreakerRegistry:
+    def __init__(self, kind, slow_seconds):
+        self.kind = kind
+        self.slow_seconds = slow_seconds
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None: breaker = self._breakers[key] = CircuitBreaker(self.kind, key, self.slow_seconds)
+            return breaker
+
+    def stats(self):
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {key: breaker.stats() for key, breaker in breakers.items()}
+
+upstream_breakers = BreakerRegistry('host', BREAKER_HOST_SLOW_SECONDS)
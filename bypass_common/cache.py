@@ -0,0 +1,230 @@
+# bypass_common/cache.py
+# The in-process tier of the result cache (the shared tier is the store's result_cache table),
+# coalescing of concurrent resolutions of the same link, final-link expiry and hot keys, and the
+# failure classes that set how long a failed resolution stays cached.
+import calendar
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlparse
+
+from bypass_common.settings import env_int, env_map, parse_number
+
+logger = logging.getLogger(__name__)
+
+# --- Result Cache Configuration ---
+RESULT_CACHE_MAX_ENTRIES = env_int("RESULT_CACHE_MAX_ENTRIES", 500, minimum=1)
+RESULT_CACHE_DEFAULT_TTL = 300 # seconds, for final links from an unrecognised host
+# Final links expire at different rates depending on where they point
+RESULT_CACHE_TTLS = {
+    'pixeldrain': 3600,
+    'r2': 900,
+    'gdindex': 1800,
+    'fsl': 900,
+}
+# Signed final links carry their expiry (X-Amz-Date + X-Amz-Expires, X-Goog-*, expires=<epoch>); for the
+# others RESULT_CACHE_TTLS doubles as the estimated link lifetime. A cached link is dropped
+# RESULT_CACHE_EXPIRY_MARGIN seconds before it expires, so a client always has time to start the download.
+RESULT_CACHE_EXPIRY_MARGIN = 120
+RESULT_CACHE_MAX_TTL = 6 * 3600 # for signed links valid for days
+# A key hit RESULT_CACHE_HOT_HITS times within RESULT_CACHE_HOT_WINDOW seconds (counted per worker) is put on
+# the prefetch watch list until a window after its cached link expires, so it is re-resolved before then
+RESULT_CACHE_HOT_HITS = 3
+RESULT_CACHE_HOT_WINDOW = 900
+RESULT_CACHE_HOT_MAX_KEYS = 5000
+RESULT_CACHE_NEGATIVE_TTL = 60 # seconds a failed resolution is remembered when its failure class is unknown
+
+# --- Negative Cache Configuration ---
+# A failed resolution is cached for its normalized URL with a TTL picked by failure class, so clients
+# retrying a dead link get the answer at once while transient failures clear quickly. The class is the
+# first NEGATIVE_CACHE_FINGERPRINTS entry matching the error message, else the resolution's error logs;
+# unmatched failures use RESULT_CACHE_NEGATIVE_TTL. Each service adds the fingerprints of its own
+# scraping errors (no_download_link, strategy_step_failed) for its own resolutions.
+NEGATIVE_CACHE_TTLS = {
+    'not_found': 900, # upstream answered 404/410
+    'no_download_link': 600,
+    'too_many_redirects': 300,
+    'strategy_step_failed': 120,
+    'link_generation_timeout': 45,
+    'upstream_error': 30, # 5xx / 429 from the upstream
+    'timeout': 20,
+    'network': 20,
+    'circuit_open': 10, # breaker or limiter refused; the breaker decides when to retry
+}
+# Overrides as class=seconds, e.g. NEGATIVE_CACHE_TTL_OVERRIDES="not_found=3600,timeout=5"
+NEGATIVE_CACHE_TTLS.update(env_map("NEGATIVE_CACHE_TTL_OVERRIDES", lambda seconds: parse_number(seconds, int, minimum=0)))
+NEGATIVE_CACHE_FINGERPRINTS = tuple((name, re.compile(pattern, re.IGNORECASE)) for name, pattern in (
+    ('circuit_open', r'circuit open for|currently failing|no slot within'),
+    ('not_found', r'\b(404|410)\b'),
+    ('upstream_error', r'\b(5\d\d|429)\b (server error|client error|service unavailable|bad gateway|gateway timeout|too many requests)|status: (5\d\d|429)\b'),
+    ('link_generation_timeout', r'link generation .*timed out'),
+    ('timeout', r'timed out|timeout'),
+    ('network', r'max retries exceeded|failed to establish|connection (refused|reset|aborted)|name resolution|network.{0,10}request error'),
+    ('too_many_redirects', r'too many redirects|exceeded maximum redirect'),
+))
+
+# --- Result Cache ---
+def normalize_url(url):
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    netloc = parsed.netloc.lower()
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    path = parsed.path.rstrip('/') or '/'
+    query = '&'.join(sorted(part for part in parsed.query.split('&') if part))
+    return f"{scheme}://{netloc}{path}" + (f"?{query}" if query else '')
+
+def classify_final_link(url):
+    host = urlparse(url).netloc.lower()
+    if 'pixeldrain' in host: return 'pixeldrain'
+    if host.endswith('.r2.dev') or host.endswith('.r2.cloudflarestorage.com'): return 'r2'
+    if host.endswith('gdindex.lol'): return 'gdindex'
+    if host == 'fsl.pub' or host.endswith('.fsl.pub'): return 'fsl'
+    return 'default'
+
+class ResultCache:
+    # In-process LRU in front of the shared store; entries are dicts with
+    # 'finalUrl', 'error', 'failureClass', 'linkExpiresAt', 'storedAt' and 'expiresAt'
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['expiresAt'] <= now:
+                if entry is not None: del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+# --- Link Expiry ---
+def signed_link_expiry(url, issued_at=None):
+    # Epoch seconds a signed link stops working, when its query string says so
+    query = {key.lower(): value for key, value in parse_qsl(urlparse(url).query)}
+    issued_at = time.time() if issued_at is None else issued_at
+    try:
+        for prefix in ('x-amz-', 'x-goog-'):
+            if prefix + 'expires' in query:
+                signed_at = query.get(prefix + 'date')
+                start = calendar.timegm(time.strptime(signed_at, '%Y%m%dT%H%M%SZ')) if signed_at else issued_at
+                return start + float(query[prefix + 'expires'])
+        for name in ('expires', 'exp'):
+            if name in query:
+                value = float(query[name])
+                return value if value > 1e9 else issued_at + value # an epoch, else a lifetime in seconds
+    except ValueError:
+        pass
+    return None
+
+def link_metadata(final_url, resolved_at):
+    # Family of a final link and when it stops working: read from its signature, else estimated for the family
+    family = classify_final_link(final_url)
+    expires_at = signed_link_expiry(final_url, resolved_at)
+    if expires_at is not None:
+        return {"family": family, "expiresAt": expires_at, "expirySource": "signed"}
+    return {"family": family, "expiresAt": resolved_at + RESULT_CACHE_TTLS.get(family, RESULT_CACHE_DEFAULT_TTL), "expirySource": "estimated"}
+
+def result_cache_ttl(link_expires_at, now):
+    return min(RESULT_CACHE_MAX_TTL, link_expires_at - RESULT_CACHE_EXPIRY_MARGIN - now)
+
+class HotKeys:
+    # Cache hits per key within RESULT_CACHE_HOT_WINDOW; hit() is true once per window, when a key turns hot
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._keys = OrderedDict() # key -> (window start, hits)
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        now = time.time()
+        with self._lock:
+            started, hits = self._keys.pop(key, (now, 0))
+            if now - started > RESULT_CACHE_HOT_WINDOW: started, hits = now, 0
+            self._keys[key] = (started, hits + 1)
+            while len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+        return hits + 1 == RESULT_CACHE_HOT_HITS
+
+# --- Request Coalescing ---
+class _FlightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.served = 1
+
+class SingleFlight:
+    # Concurrent callers asking for the same key share one in-progress call
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.resolutions = 0
+        self.requests_served = 0
+        self.max_served = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _FlightCall()
+                self._calls[key] = call
+            else:
+                call.served += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None: raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self.resolutions += 1
+                self.requests_served += call.served
+                self.max_served = max(self.max_served, call.served)
+            if call.served > 1:
+                logger.info(f"Resolution for {key} served {call.served} requests.")
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            "resolutions": self.resolutions,
+            "requestsServed": self.requests_served,
+            "coalescedRequests": self.requests_served - self.resolutions,
+            "maxRequestsPerResolution": self.max_served,
+            "inFlight": in_flight,
+        }
+
+# --- Negative Cache ---
+def classify_failure(error, logs=(), fingerprints=NEGATIVE_CACHE_FINGERPRINTS):
+    error_lines = [entry for entry in logs if isinstance(entry, str) and 'error' in entry.lower()]
+    for name, pattern in fingerprints:
+        if error and pattern.search(error): return name
+    for name, pattern in fingerprints:
+        if any(pattern.search(entry) for entry in error_lines): return name
+    return 'unknown'
+
+def negative_cache_ttl(failure_class):
+    return NEGATIVE_CACHE_TTLS.get(failure_class, RESULT_CACHE_NEGATIVE_TTL)
@@ -0,0 +1,132 @@
+# bypass_common/extract.py
+# Fast-path extraction on an lxml tree, falling back to BeautifulSoup when a lookup finds nothing.
+import logging
+import threading
+
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+# Use lxml when installed (parser and fast-path extractors), fall back to html.parser otherwise
+try:
+    from lxml import etree
+    PARSER = "lxml"
+except ImportError:
+    etree = None
+    PARSER = "html.parser"
+    logger.warning("lxml not found, using html.parser; the fast-path extractors are disabled.")
+
+# --- Fast-Path Extraction ---
+class _ExtractorCounters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fast_path = 0 # lookup answered from the lxml tree
+        self.fallbacks = 0 # lookup needed a full BeautifulSoup tree
+
+extractor_counters = _ExtractorCounters()
+
+def _attr_matches(key, value, expected):
+    if expected is True: return value is not None
+    if callable(expected): return bool(expected(value))
+    if value is None: return False
+    # Like bs4, class is multi-valued: a filter may match any single class or the whole attribute
+    values = value.split() if key == 'class' else [value]
+    if hasattr(expected, 'search'):
+        return bool(expected.search(value)) or any(expected.search(item) for item in values)
+    return value == expected or expected in values
+
+class FastTag:
+    # Thin BeautifulSoup-Tag lookalike over an lxml element. It covers only the calls the
+    # resolvers make (name/get/string/get_text/find/find_all/find_parent), so the same
+    # extraction code runs on either tree without building bs4 objects for every node.
+    __slots__ = ('element',)
+
+    def __init__(self, element):
+        self.element = element
+
+    @property
+    def name(self):
+        return self.element.tag
+
+    @property
+    def string(self):
+        element = self.element
+        if len(element) == 0: return element.text
+        if len(element) == 1 and not element.text and not element[0].tail:
+            return FastTag(element[0]).string
+        return None
+
+    def get(self, key, default=None):
+        return self.element.get(key, default)
+
+    def has_attr(self, key):
+        return key in self.element.attrib
+
+    def get_text(self, strip=False):
+        texts = self.element.itertext()
+        if strip: return ''.join(text.strip() for text in texts)
+        return ''.join(texts)
+
+    def find_all(self, name=None, attrs=None, string=None, **kwargs):
+        names = [name] if isinstance(name, str) else list(name or [])
+        filters = dict(attrs or {})
+        filters.update({('class' if key == 'class_' else key): value for key, value in kwargs.items()})
+        results = []
+        for element in self.element.iterdescendants(*names):
+            if not isinstance(element.tag, str): continue
+            if string is not None and not _attr_matches('string', FastTag(element).string, string): continue
+            if all(_attr_matches(key, element.get(key), expected) for key, expected in filters.items()):
+                results.append(FastTag(element))
+        return results
+
+    def find(self, name=None, attrs=None, string=None, **kwargs):
+        matches = self.find_all(name, attrs, string, **kwargs)
+        return matches[0] if matches else None
+
+    def find_parent(self, name):
+        for ancestor in self.element.iterancestors(name):
+            return FastTag(ancestor)
+        return None
+
+    def __str__(self):
+        return etree.tostring(self.element, encoding='unicode', method='html')
+
+def fast_page(html):
+    if etree is None or not html: return None
+    try:
+        # A parser per call: lxml parser objects must not be shared between threads
+        root = etree.fromstring(html, etree.HTMLParser(remove_comments=True))
+    except (etree.LxmlError, ValueError):
+        return None
+    return FastTag(root) if root is not None else None
+
+def parse_with_fallback(html, extract, found=bool, page=None):
+    # Runs extract() on the cheap lxml view first (an already parsed page may be passed in)
+    # and only builds a full BeautifulSoup tree when the fast path finds nothing. Returns the
+    # page that answered and extract()'s result.
+    if page is None: page = fast_page(html)
+    if isinstance(page, FastTag):
+        result = extract(page)
+        if found(result):
+            with extractor_counters.lock: extractor_counters.fast_path += 1
+            return page, result
+        with extractor_counters.lock: extractor_counters.fallbacks += 1
+        page = None
+    soup = page if page is not None else BeautifulSoup(html or '', PARSER)
+    return soup, extract(soup)
+
+def extract_with_fallback(html, extract, log_entries, page=None, outcomes=None):
+    # extract(page, page_logs) -> result. Only the logs of the parse that answered are kept,
+    # so a fallback does not repeat the search messages; outcomes, the dict extract() records
+    # strategy outcomes in, is emptied before each parse for the same reason.
+    def run(candidate_page):
+        page_logs = []
+        if outcomes is not None: outcomes.clear()
+        return extract(candidate_page, page_logs), page_logs
+    answered_page, (result, page_logs) = parse_with_fallback(html, run, found=lambda outcome: outcome[0], page=page)
+    log_entries.extend(page_logs)
+    return answered_page, result
+
+def extractor_stats():
+    with extractor_counters.lock:
+        return {"fastPath": extractor_counters.fast_path, "fallbacks": extractor_counters.fallbacks, "lxml": etree is not None}
@@ -0,0 +1,145 @@
+# bypass_common/fixtures.py
+# Record/replay of upstream HTTP exchanges, for benchmarks and tests that must not touch the network.
+import base64
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from bypass_common.metrics import metrics
+from bypass_common.settings import env_float
+
+# --- HTTP Fixture Configuration ---
+# "record" saves every upstream exchange under HTTP_FIXTURE_DIR; "replay" serves them back
+# without touching the network (see benchmarks/bench_resolvers.py). A relative HTTP_FIXTURE_DIR
+# is taken from the repository root, so every worker finds the same files whatever its cwd.
+HTTP_FIXTURE_MODE = os.environ.get("HTTP_FIXTURE_MODE", "").lower()
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HTTP_FIXTURE_DIR = os.path.join(REPO_ROOT, os.environ.get("HTTP_FIXTURE_DIR", "fixtures"))
+# Replay latency per response: seconds, or "recorded" to reuse the time each exchange took when recorded
+HTTP_FIXTURE_LATENCY = 'recorded' if os.environ.get("HTTP_FIXTURE_LATENCY") == 'recorded' else env_float("HTTP_FIXTURE_LATENCY", 0, minimum=0)
+HTTP_FIXTURE_JITTER = env_float("HTTP_FIXTURE_JITTER", 0, minimum=0) # +/- fraction applied to the latency
+
+# --- HTTP Fixtures ---
+FIXTURE_DROPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding') # bodies are stored decoded
+
+class FixtureNotFound(requests.exceptions.ConnectionError):
+    pass
+
+def fixture_key(request):
+    body = request.body or b''
+    if isinstance(body, str): body = body.encode('utf-8')
+    return hashlib.sha1(request.method.encode() + b' ' + request.url.encode() + b'\n' + body).hexdigest()[:20]
+
+class FixtureStore:
+    # One JSON file per distinct request (method, URL, body), holding its responses in the
+    # order they were recorded so repeated polls of the same URL replay as a sequence
+    def __init__(self, directory):
+        self.directory = directory
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _path(self, request, key):
+        host = re.sub(r'[^A-Za-z0-9.-]', '_', urlparse(request.url).netloc) or 'unknown'
+        return os.path.join(self.directory, host, f"{key}.json")
+
+    def _load(self, request, key):
+        if key not in self._cache:
+            try:
+                with open(self._path(request, key), encoding='utf-8') as fixture_file:
+                    self._cache[key] = json.load(fixture_file)
+            except (OSError, ValueError):
+                self._cache[key] = None
+        return self._cache[key]
+
+    def record(self, request, response, body, elapsed):
+        key = fixture_key(request)
+        try:
+            text, body_encoding = body.decode('utf-8'), 'utf-8'
+        except UnicodeDecodeError:
+            text, body_encoding = base64.b64encode(body).decode('ascii'), 'base64'
+        entry = {"status": response.status_code, "reason": response.reason, "elapsed": round(elapsed, 4),
+                 "headers": {name: value for name, value in response.headers.items() if name.lower() not in FIXTURE_DROPPED_HEADERS},
+                 "body": text, "bodyEncoding": body_encoding}
+        with self._lock:
+            fixture = self._load(request, key) or {"method": request.method, "url": request.url, "responses": []}
+            fixture["responses"].append(entry)
+            self._cache[key] = fixture
+            path = self._path(request, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as fixture_file:
+                json.dump(fixture, fixture_file, indent=1)
+
+    def response(self, request, index):
+        with self._lock:
+            fixture = self._load(request, fixture_key(request))
+        if not fixture or not fixture["responses"]: return None
+        # Past the end of a recorded sequence keep serving its last response (e.g. a ready poll)
+        return fixture["responses"][min(index, len(fixture["responses"]) - 1)]
+
+class RecordingAdapter(BaseAdapter):
+    # Reads each body in full before handing it back, so streamed fetches cannot stop early while recording
+    def __init__(self, store, inner):
+        super().__init__()
+        self.store = store
+        self.inner = inner
+
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+        response = self.inner.send(request, **kwargs)
+        body = response.content
+        self.store.record(request, response, body, time.perf_counter() - started)
+        return response
+
+    def close(self):
+        pass
+
+class ReplayAdapter(BaseAdapter):
+    # One per session: the position in each recorded sequence belongs to a single resolution
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+        self._calls = {}
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        key = fixture_key(request)
+        index = self._calls.get(key, 0)
+        self._calls[key] = index + 1
+        recorded = self.store.response(request, index)
+        if recorded is None:
+            raise FixtureNotFound(f"No recorded response for {request.method} {request.url}", request=request)
+        latency = recorded["elapsed"] if HTTP_FIXTURE_LATENCY == 'recorded' else HTTP_FIXTURE_LATENCY
+        if latency > 0: time.sleep(latency * (1 + random.uniform(-HTTP_FIXTURE_JITTER, HTTP_FIXTURE_JITTER)))
+        body = base64.b64decode(recorded["body"]) if recorded["bodyEncoding"] == 'base64' else recorded["body"].encode('utf-8')
+        response = requests.Response()
+        response.status_code = recorded["status"]
+        response.reason = recorded["reason"]
+        response.headers = CaseInsensitiveDict(recorded["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = io.BytesIO(body)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        metrics.inc('upstream_responses_total', {'host': urlparse(request.url).hostname or '', 'status': response.status_code})
+        return response
+
+    def close(self):
+        pass
+
+fixture_store = FixtureStore(HTTP_FIXTURE_DIR) if HTTP_FIXTURE_MODE in ('record', 'replay') else None
+
+def fixture_adapter(inner):
+    # The adapter a new session mounts in record or replay mode; inner is the one recordings go through
+    if HTTP_FIXTURE_MODE == 'record': return RecordingAdapter(fixture_store, inner)
+    if HTTP_FIXTURE_MODE == 'replay': return ReplayAdapter(fixture_store)
+    return None
@@ -0,0 +1,150 @@
+# bypass_common/jobs.py
+# Background resolution jobs: submitted, run on a thread pool and polled by id from any worker.
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from bypass_common.responses import LogBuffer
+from bypass_common.settings import env_int
+from bypass_common.store import add_schema
+from bypass_common.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# --- Background Job Configuration ---
+JOB_WORKERS = env_int("JOB_WORKERS", 8, minimum=1)
+JOB_MAX_RETAINED = env_int("JOB_MAX_RETAINED", 1000, minimum=1)
+JOB_RETENTION_SECONDS = 900 # finished jobs are kept this long for polling
+JOB_PROGRESS_FLUSH_INTERVAL = 2 # seconds between partial-log writes to the shared store
+
+# --- Background Jobs ---
+add_schema(
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    " id TEXT PRIMARY KEY, status TEXT NOT NULL, data TEXT NOT NULL, updated_at REAL NOT NULL)",
+)
+
+class JobLog(LogBuffer):
+    # Log buffer that pushes partial progress to the job store while a job runs. lock is this job's
+    # own: appends and field updates hold it so a status poll never copies the list halfway through
+    # a trim, without making jobs on other threads wait for each other's log lines.
+    def __init__(self, job, job_store, capture=None):
+        super().__init__(capture)
+        self.job = job
+        self.job_store = job_store
+        self.lock = threading.Lock()
+        self._last_flush = 0
+
+    def append(self, item):
+        with self.lock:
+            super().append(item)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.time() - self._last_flush >= JOB_PROGRESS_FLUSH_INTERVAL:
+            self._last_flush = time.time()
+            self.job_store.save(self.job)
+
+class JobStore:
+    # Jobs live in the worker that runs them and are mirrored to the shared
+    # SQLite file so a poll landing on another gunicorn worker still finds them.
+    # _lock guards the job table and pruning; each job's fields and logs use its JobLog's lock.
+    def __init__(self, shared_store, max_jobs, retention):
+        self.shared = shared_store
+        self.max_jobs = max_jobs
+        self.retention = retention
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, url, capture=None):
+        now = time.time()
+        job = {"id": uuid.uuid4().hex, "status": "queued", "url": url, "finalUrl": None, "error": None,
+               "cached": False, "expiresAt": None, "createdAt": now, "updatedAt": now}
+        job["logs"] = JobLog(job, self, capture)
+        with self._lock:
+            self._prune(now)
+            if len(self._jobs) >= self.max_jobs:
+                return None
+            self._jobs[job["id"]] = job
+        self.save(job)
+        return job
+
+    def snapshot(self, job):
+        # A copy that can be serialized while the job's thread keeps updating the original
+        with job["logs"].lock:
+            copy = dict(job)
+            copy["logs"] = list(job["logs"])
+        return copy
+
+    def update(self, job, **fields):
+        with job["logs"].lock:
+            job.update(fields)
+        self.save(job)
+
+    def save(self, job):
+        with job["logs"].lock:
+            job["updatedAt"] = time.time()
+        if not self.shared.available: return
+        copy = self.snapshot(job)
+        row = (copy["id"], copy["status"], json.dumps(copy), copy["updatedAt"])
+        self.shared.write_later(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO jobs (id, status, data, updated_at) VALUES (?, ?, ?, ?)", row), "Shared job store write")
+
+    def get(self, job_id):
+        # Always a snapshot, never the dict the job's thread is updating
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None: return self.snapshot(job)
+        if not self.shared.available: return None
+        try:
+            row = self.shared.read(lambda conn: conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone())
+        except sqlite3.Error as e:
+            logger.warning(f"Shared job store read failed: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def _prune(self, now):
+        # Finished jobs past retention go first, then the oldest finished ones over the limit
+        cutoff = now - self.retention
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in ("succeeded", "failed")]
+        for job_id in finished:
+            if self._jobs[job_id]["updatedAt"] < cutoff or len(self._jobs) >= self.max_jobs:
+                del self._jobs[job_id]
+        if not self.shared.available: return
+        max_rows = self.max_jobs * 4
+
+        def prune(conn):
+            conn.execute("DELETE FROM jobs WHERE updated_at < ? AND status IN ('succeeded', 'failed')", (cutoff,))
+            conn.execute("DELETE FROM jobs WHERE id IN (SELECT id FROM jobs ORDER BY updated_at DESC LIMIT -1 OFFSET ?)", (max_rows,))
+
+        self.shared.write_later(prune, "Shared job store prune")
+
+job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="resolve-job")
+
+def run_job(service, job, include_trace=False):
+    job_store = service.jobs
+    job_store.update(job, status="running")
+    try:
+        with tracer.trace('job.resolve', force=include_trace, url=job["url"], jobId=job["id"]) as trace:
+            final_download_link, error, cached, link_expires_at = service.process_request(job["url"], job["logs"])
+        result = {"finalUrl": final_download_link, "error": None if final_download_link else error, "cached": cached,
+                  "expiresAt": link_expires_at, "status": "succeeded" if final_download_link else "failed"}
+        if trace and include_trace: result["trace"] = trace.to_dict()
+        if job["logs"].captures: result["debugCaptures"] = list(job["logs"].captures)
+        job_store.update(job, **result)
+    except Exception as e:
+        logger.error(f"FATAL Job Error ({job['id']}): {e}", exc_info=True)
+        job["logs"].append("FATAL Job Error: An unexpected server error occurred.")
+        job_store.update(job, error="Internal server error processing the job.", status="failed")
+
+def submit_job(service, url, capture_html=False, include_trace=False):
+    # Returns the queued job, or None when too many are in progress
+    job = service.jobs.create(url, capture=service.debug_captures if capture_html else None)
+    if job is None: return None
+    job["logs"].append(f"Job queued for {service.url_field}: {url}")
+    job_executor.submit(run_job, service, job, include_trace)
+    return job
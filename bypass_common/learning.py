@@ -0,0 +1,203 @@
+# bypass_common/learning.py
+# Strategy order learned from each strategy's success rate, time to link and link lifetime, plus
+# background probes of the mirror links handed to clients.
+import atexit
+import logging
+import os
+import random
+import sqlite3
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+
+from bypass_common.breakers import BREAKER_LINK_PROBE_RATE, CircuitOpen, upstream_breakers
+from bypass_common.cache import signed_link_expiry
+from bypass_common.metrics import run_periodically
+from bypass_common.store import add_schema
+from bypass_common.upstream import new_session
+
+logger = logging.getLogger(__name__)
+
+# --- Strategy Learning Configuration ---
+# Rolling outcomes per upstream host and strategy (the last STRATEGY_WINDOW of each, at most
+# STRATEGY_MAX_AGE old) are kept in the shared SQLite file, so they survive restarts. When a page
+# offers several candidates they are tried cheapest first, the cost being the expected time to a
+# working link: (median time-to-link + STRATEGY_BASE_SECONDS) / (success rate * link-alive rate),
+# doubled for links that expire within STRATEGY_SHORT_LINK_SECONDS. Rates start optimistic
+# (STRATEGY_PRIOR_SAMPLES pseudo-successes) so untried strategies get tried; ties keep the default order.
+STRATEGY_LEARNING = os.environ.get("STRATEGY_LEARNING", "1") != "0"
+STRATEGY_WINDOW = 50
+STRATEGY_MAX_AGE = 7 * 24 * 3600
+STRATEGY_PRIOR_SAMPLES = 2
+STRATEGY_MIN_TIMED_SAMPLES = 5 # successes needed before the median time replaces the typical one
+STRATEGY_BASE_SECONDS = 1.0
+STRATEGY_SHORT_LINK_SECONDS = 900
+STRATEGY_SYNC_INTERVAL = 30 # seconds between writing this worker's outcomes and re-reading everyone's
+LINK_PROBE_TIMEOUT = 30 # seconds per background HEAD of a returned mirror link
+
+# --- Strategy Learning ---
+add_schema(
+    "CREATE TABLE IF NOT EXISTS strategy_outcomes ("
+    " app TEXT NOT NULL, kind TEXT NOT NULL, host TEXT NOT NULL, strategy TEXT NOT NULL, event TEXT NOT NULL,"
+    " ok INTEGER NOT NULL, seconds REAL, lifetime REAL, recorded_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS strategy_outcomes_key ON strategy_outcomes (app, kind, host, strategy, event, recorded_at)",
+)
+
+def link_lifetime(url):
+    # Seconds a signed link stays valid from now, when its query string says so
+    expires_at = signed_link_expiry(url)
+    return None if expires_at is None else expires_at - time.time()
+
+def _median(values):
+    return statistics.median(values) if values else None
+
+class StrategyLearner:
+    # Workers buffer outcomes and append them to a table in the shared SQLite file every
+    # STRATEGY_SYNC_INTERVAL seconds, trimming each (kind, host, strategy, event) to its window,
+    # then re-read this app's rows. Without the shared store only this worker's outcomes count.
+    # Events: 'attempt' (did the strategy produce a link, how fast, how long will it live)
+    # and 'check' (was a returned link still alive when probed).
+    def __init__(self, shared_store=None, app_name=None):
+        self.shared = shared_store
+        self.app_name = app_name
+        self.typical_seconds = {} # kind -> strategy -> seconds, used until timed samples exist
+        self._pending = []
+        self._local = {}
+        self._snapshot = {}
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._syncer_started = False
+
+    def attach(self, shared_store, app_name):
+        # Called by the first Service of the process
+        self.shared = shared_store
+        self.app_name = app_name
+
+    def _add(self, key, ok, seconds=None, lifetime=None):
+        with self._lock:
+            self._local.setdefault(key, deque(maxlen=STRATEGY_WINDOW)).append((ok, seconds, lifetime))
+            self._pending.append(key + (int(ok), seconds, lifetime, time.time()))
+        self._maybe_sync()
+
+    def record(self, kind, host, strategy, ok, seconds=None, link=None):
+        self._add((kind, host or '', strategy, 'attempt'), bool(ok), seconds, link_lifetime(link) if link else None)
+
+    def record_check(self, kind, host, strategy, alive):
+        self._add((kind, host or '', strategy, 'check'), bool(alive))
+
+    def _maybe_sync(self):
+        # The first outcome or ordering in a worker starts its syncer; strategies never wait on the shared store
+        if self._syncer_started: return
+        with self._lock:
+            if self._syncer_started: return
+            self._syncer_started = True
+        run_periodically(self.sync, STRATEGY_SYNC_INTERVAL, "strategy-sync")
+
+    def sync(self):
+        if not self._sync_lock.acquire(blocking=False): return # another thread is syncing
+        try:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            now = time.time()
+            if self.shared is None or not self.shared.available:
+                with self._lock:
+                    self._snapshot = {key: list(samples) for key, samples in self._local.items()}
+                return
+            app_name = self.app_name
+
+            def store(conn):
+                conn.executemany(
+                    "INSERT INTO strategy_outcomes (app, kind, host, strategy, event, ok, seconds, lifetime, recorded_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [(app_name,) + row for row in pending])
+                for key in {row[:4] for row in pending}:
+                    conn.execute(
+                        "DELETE FROM strategy_outcomes WHERE rowid IN ("
+                        " SELECT rowid FROM strategy_outcomes WHERE app = ? AND kind = ? AND host = ? AND strategy = ? AND event = ?"
+                        " ORDER BY recorded_at DESC LIMIT -1 OFFSET ?)", (app_name,) + key + (STRATEGY_WINDOW,))
+                conn.execute("DELETE FROM strategy_outcomes WHERE recorded_at < ?", (now - STRATEGY_MAX_AGE,))
+                return conn.execute(
+                    "SELECT kind, host, strategy, event, ok, seconds, lifetime FROM strategy_outcomes"
+                    " WHERE app = ? ORDER BY recorded_at", (app_name,)).fetchall()
+
+            try:
+                rows = self.shared.write(store)
+            except sqlite3.Error as e:
+                logger.warning(f"Strategy stats sync failed, keeping outcomes for the next one: {e}")
+                with self._lock: self._pending[:0] = pending
+                return
+            snapshot = {}
+            for kind, host, strategy, event, ok, seconds, lifetime in rows:
+                snapshot.setdefault((kind, host, strategy, event), []).append((bool(ok), seconds, lifetime))
+            with self._lock: self._snapshot = snapshot
+        finally:
+            self._sync_lock.release()
+
+    def summary(self, kind, host, strategy):
+        with self._lock:
+            attempts = self._snapshot.get((kind, host, strategy, 'attempt'), [])
+            checks = self._snapshot.get((kind, host, strategy, 'check'), [])
+        successes = [seconds for ok, seconds, _ in attempts if ok]
+        timed = [seconds for seconds in successes if seconds is not None]
+        success_rate = (len(successes) + STRATEGY_PRIOR_SAMPLES) / (len(attempts) + STRATEGY_PRIOR_SAMPLES)
+        alive_rate = (sum(1 for ok, _, _ in checks if ok) + STRATEGY_PRIOR_SAMPLES) / (len(checks) + STRATEGY_PRIOR_SAMPLES)
+        median_seconds = _median(timed) if len(timed) >= STRATEGY_MIN_TIMED_SAMPLES else None
+        median_lifetime = _median([lifetime for ok, _, lifetime in attempts if ok and lifetime is not None])
+        expected = median_seconds if median_seconds is not None else self.typical_seconds.get(kind, {}).get(strategy, 0)
+        cost = (expected + STRATEGY_BASE_SECONDS) / (success_rate * alive_rate)
+        if median_lifetime is not None and median_lifetime < STRATEGY_SHORT_LINK_SECONDS: cost *= 2
+        return {"attempts": len(attempts), "successRate": round(success_rate, 3), "medianSeconds": median_seconds,
+                "checks": len(checks), "aliveRate": round(alive_rate, 3), "medianLifetimeSeconds": median_lifetime,
+                "expectedCost": round(cost, 3)}
+
+    def order(self, kind, host, candidates):
+        # Cheapest expected cost first; sorted() is stable, so ties keep the default priority
+        candidates = list(candidates)
+        if not STRATEGY_LEARNING or len(candidates) < 2: return candidates
+        self._maybe_sync()
+        costs = {strategy: self.summary(kind, host or '', strategy)["expectedCost"] for strategy in candidates}
+        return sorted(candidates, key=lambda strategy: costs[strategy])
+
+    def stats(self):
+        self.sync()
+        with self._lock:
+            keys = sorted({key[:3] for key in self._snapshot})
+        result = {}
+        for kind, host, strategy in keys:
+            result.setdefault(kind, {}).setdefault(host, {})[strategy] = self.summary(kind, host, strategy)
+        return result
+
+# Process-wide; the first Service created attaches it to its shared store
+strategy_learner = StrategyLearner()
+atexit.register(strategy_learner.sync)
+
+# --- Link Probes ---
+strategy_mirrors = {} # (kind, strategy) -> host of the last link it produced
+link_probe_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="link-probe")
+
+def _probe_link(kind, name, page_host, link, headers):
+    session = new_session()
+    if headers: session.headers.update(headers)
+    try:
+        response = session.head(link, timeout=LINK_PROBE_TIMEOUT, allow_redirects=False)
+        response.close()
+    except CircuitOpen:
+        return
+    except requests.exceptions.RequestException:
+        strategy_learner.record_check(kind, page_host, name, False)
+        return
+    strategy_learner.record_check(kind, page_host, name, response.status_code < 400 or response.status_code == 405)
+
+def probe_strategy_link(kind, name, page_host, link, headers=None):
+    # Mirror links go to the client unfetched, so a share of them (all while the mirror is
+    # recovering) get a background HEAD that feeds the mirror host's breaker and the
+    # strategy's link-alive rate
+    host = urlparse(link).hostname
+    if not host: return
+    strategy_mirrors[(kind, name)] = host
+    if upstream_breakers.get(host).current_state() == 'closed' and random.random() >= BREAKER_LINK_PROBE_RATE: return
+    link_probe_executor.submit(_probe_link, kind, name, page_host, link, headers)
@@ -0,0 +1,117 @@
+# bypass_common/limits.py
+# Per-host concurrency and token-bucket rate limits on the upstream requests of a worker.
+import threading
+import time
+
+import requests
+
+from bypass_common.metrics import metrics
+from bypass_common.settings import env_float, env_int, env_map, parse_number
+
+# --- Upstream Rate Limit Configuration ---
+# Every upstream request of a worker passes a per-host limiter: at most UPSTREAM_MAX_CONCURRENCY
+# requests open on the host at once (until their body is read or closed) and a token bucket of
+# UPSTREAM_RATE requests/s (bursts of UPSTREAM_BURST). Requests over the limit queue for up to
+# UPSTREAM_QUEUE_TIMEOUT seconds.
+UPSTREAM_MAX_CONCURRENCY = env_int("UPSTREAM_MAX_CONCURRENCY", 8, minimum=1)
+UPSTREAM_RATE = env_float("UPSTREAM_RATE", 5, above=0)
+UPSTREAM_BURST = env_int("UPSTREAM_BURST", 10, minimum=1)
+UPSTREAM_QUEUE_TIMEOUT = env_float("UPSTREAM_QUEUE_TIMEOUT", 15, minimum=0)
+# Per-domain overrides as concurrency/rate/burst (subdomains share the domain's limiter),
+# e.g. UPSTREAM_HOST_LIMITS="gdflix.dev=4/2/4,pixeldrain.com=16/20/40"
+def parse_host_limits(text):
+    parts = [part for part in text.split('/') if part.strip()]
+    if not 1 <= len(parts) <= 3: raise ValueError("expected concurrency[/rate[/burst]]")
+    bounds = ((int, dict(minimum=1)), (float, dict(above=0)), (int, dict(minimum=1))) # concurrency, rate, burst
+    return tuple(parse_number(part.strip(), cast, **bound) for part, (cast, bound) in zip(parts, bounds))
+
+UPSTREAM_HOST_LIMITS = env_map("UPSTREAM_HOST_LIMITS", parse_host_limits)
+
+# --- Upstream Rate Limiting ---
+class UpstreamBusy(requests.exceptions.RequestException):
+    # Raised when a request could not get a slot or token for its host within the queue deadline
+    pass
+
+class HostLimit:
+    def __init__(self, concurrency, rate, burst):
+        if concurrency < 1 or rate <= 0 or burst < 1:
+            raise ValueError(f"Host limits need concurrency >= 1, rate > 0 and burst >= 1, got {concurrency}/{rate}/{burst}")
+        self.concurrency = int(concurrency)
+        self.rate = rate
+        self.burst = burst
+        self.slots = threading.BoundedSemaphore(self.concurrency)
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.queued = 0 # requests that had to wait
+        self.rejected = 0
+        self.waited = 0.0
+
+    def _take_token(self, deadline):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline: return False
+            time.sleep(wait)
+
+    def acquire(self, deadline):
+        started = time.monotonic()
+        if not self.slots.acquire(timeout=max(0, deadline - started)):
+            return None
+        if not self._take_token(deadline):
+            self.slots.release()
+            return None
+        return time.monotonic() - started
+
+class UpstreamLimiter:
+    def __init__(self, overrides):
+        self.overrides = overrides
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def key_for(self, host):
+        # The most specific configured domain the host belongs to, else the host itself
+        host = (host or '').lower()
+        matches = [domain for domain in self.overrides if host == domain or host.endswith('.' + domain)]
+        return max(matches, key=len, default=host)
+
+    def limit_for(self, key):
+        with self._lock:
+            limit = self._limits.get(key)
+            if limit is None:
+                defaults = (UPSTREAM_MAX_CONCURRENCY, UPSTREAM_RATE, UPSTREAM_BURST)
+                configured = self.overrides.get(key, ())
+                limit = self._limits[key] = HostLimit(*(configured + defaults[len(configured):]))
+            return limit
+
+    def acquire(self, host):
+        # Waits for a slot and a token of the host's limiter; returns the function that frees the slot
+        key = self.key_for(host)
+        limit = self.limit_for(key)
+        waited = limit.acquire(time.monotonic() + UPSTREAM_QUEUE_TIMEOUT)
+        with limit.lock:
+            limit.requests += 1
+            if waited is None: limit.rejected += 1
+            elif waited > 0.001:
+                limit.queued += 1
+                limit.waited += waited
+        if waited is None:
+            raise UpstreamBusy(f"Too many requests to {key}: no slot within {UPSTREAM_QUEUE_TIMEOUT:.0f}s")
+        if waited > 0.001: metrics.observe('upstream_queue_seconds', waited, {'host': key})
+        return limit.slots.release
+
+    def stats(self):
+        with self._lock:
+            limits = dict(self._limits)
+        return {key: {"requests": limit.requests, "queued": limit.queued, "rejected": limit.rejected,
+                      "waitedSeconds": round(limit.waited, 3), "concurrency": limit.concurrency, "rate": limit.rate}
+                for key, limit in limits.items()}
+
+upstream_limiter = UpstreamLimiter(UPSTREAM_HOST_LIMITS)
@@ -0,0 +1,211 @@
+# bypass_common/metrics.py
+# Prometheus metrics summed across the workers of a host through the shared store, and the stage
+# timer that also records trace spans.
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import g, request
+
+from bypass_common.store import add_schema
+from bypass_common.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# --- Metrics Configuration ---
+METRICS_FLUSH_INTERVAL = 5 # seconds between pushes of a worker's deltas into the shared store
+METRICS_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60)
+
+# --- Metrics ---
+add_schema(
+    "CREATE TABLE IF NOT EXISTS metrics ("
+    " name TEXT NOT NULL, labels TEXT NOT NULL, le TEXT NOT NULL, value REAL NOT NULL,"
+    " PRIMARY KEY (name, labels, le))",
+)
+
+METRIC_DEFINITIONS = {
+    'http_requests_total': ('counter', 'HTTP requests served, by endpoint, method and status code.'),
+    'http_request_duration_seconds': ('histogram', 'Time to produce the HTTP response (streamed bodies excluded).'),
+    'resolutions_total': ('counter', 'Resolution outcomes, by result and where the answer came from.'),
+    'stage_duration_seconds': ('histogram', 'Latency of each resolution stage.'),
+    'upstream_responses_total': ('counter', 'Upstream HTTP responses, by host and status code.'),
+    'cache_lookups_total': ('counter', 'Result cache lookups, by tier and result.'),
+    'upstream_queue_seconds': ('histogram', 'Time upstream requests waited for their host limiter, by host.'),
+    'circuit_breaker_transitions_total': ('counter', 'Circuit breaker state changes, by kind, key and new state.'),
+    'upstream_pacing_penalties_total': ('counter', 'Pacing gap increases, by host and reason (rate_limited or challenge).'),
+    'prefetch_resolutions_total': ('counter', 'Background prefetch resolutions, by reason (new or refresh) and result.'),
+    'resolution_failures_total': ('counter', 'Failed fresh resolutions, by failure class (which sets the negative-cache TTL).'),
+}
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _label_key(labels):
+    return ','.join(f'{key}="{_escape_label(value)}"' for key, value in sorted((labels or {}).items()))
+
+def _format_metric_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def run_periodically(task, interval, name):
+    # Daemon thread (a greenlet under gevent) calling task now and then every interval seconds
+    def loop():
+        while True:
+            try:
+                task()
+            except Exception as e:
+                logger.error(f"{name} failed: {e}", exc_info=True)
+            time.sleep(interval)
+    threading.Thread(target=loop, name=name, daemon=True).start()
+
+class MetricsRegistry:
+    # Workers accumulate deltas in memory and periodically add them into a table in the
+    # shared SQLite file with an UPSERT, so /metrics on any worker reports host-wide totals.
+    def __init__(self):
+        self.shared = None
+        self.prefix = None # the service name
+        self._pending = {}
+        self._totals = {} # this worker only; rendered when the shared store is unavailable
+        self._lock = threading.Lock()
+        self._flusher_started = False
+
+    def attach(self, shared_store, prefix):
+        # Called by the first Service of the process
+        self.shared = shared_store
+        self.prefix = prefix
+
+    @property
+    def _shared_available(self):
+        return self.shared is not None and self.shared.available
+
+    def _add(self, name, labels, le, value):
+        key = (f"{self.prefix}_{name}", labels, le)
+        self._pending[key] = self._pending.get(key, 0) + value
+        self._totals[key] = self._totals.get(key, 0) + value
+
+    def inc(self, name, labels=None, value=1):
+        with self._lock:
+            self._add(name, _label_key(labels), '', value)
+        self._maybe_flush()
+
+    def observe(self, name, seconds, labels=None):
+        label_key = _label_key(labels)
+        with self._lock:
+            for bound in METRICS_LATENCY_BUCKETS:
+                if seconds <= bound: self._add(f"{name}_bucket", label_key, f"{bound:g}", 1)
+            self._add(f"{name}_bucket", label_key, '+Inf', 1)
+            self._add(f"{name}_sum", label_key, '', seconds)
+            self._add(f"{name}_count", label_key, '', 1)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        # The first metric a worker records starts its flusher, so requests never wait on the shared store
+        if self._flusher_started: return
+        with self._lock:
+            if self._flusher_started: return
+            self._flusher_started = True
+        run_periodically(self.flush, METRICS_FLUSH_INTERVAL, "metrics-flush")
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending or not self._shared_available: return
+        rows = [(name, labels, le, value) for (name, labels, le), value in pending.items()]
+        try:
+            self.shared.write(lambda conn: conn.executemany(
+                "INSERT INTO metrics (name, labels, le, value) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (name, labels, le) DO UPDATE SET value = value + excluded.value", rows))
+        except sqlite3.Error as e:
+            logger.warning(f"Metrics flush failed, keeping deltas for the next one: {e}")
+            with self._lock:
+                for key, value in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + value
+
+    def _rows(self):
+        if self._shared_available:
+            try:
+                pattern = self.prefix.replace('_', '\\_') + '\\_%'
+                return self.shared.read(lambda conn: conn.execute(
+                    "SELECT name, labels, le, value FROM metrics WHERE name LIKE ? ESCAPE '\\'", (pattern,)).fetchall())
+            except sqlite3.Error as e:
+                logger.warning(f"Shared metrics read failed, reporting this worker only: {e}")
+        with self._lock:
+            return [(name, labels, le, value) for (name, labels, le), value in self._totals.items()]
+
+    def render(self):
+        # Prometheus text exposition format
+        self.flush()
+        series = {}
+        for name, labels, le, value in self._rows():
+            series.setdefault(name, {}).setdefault(labels, {})[le] = value
+        lines = []
+        for name, (kind, help_text) in METRIC_DEFINITIONS.items():
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            if kind == 'counter':
+                for labels, values in sorted(series.get(full_name, {}).items()):
+                    suffix = f"{{{labels}}}" if labels else ''
+                    lines.append(f"{full_name}{suffix} {_format_metric_value(values[''])}")
+                continue
+            counts = series.get(f"{full_name}_count", {})
+            for labels in sorted(counts):
+                buckets = series.get(f"{full_name}_bucket", {}).get(labels, {})
+                prefix = f"{labels}," if labels else ''
+                for le in [f"{bound:g}" for bound in METRICS_LATENCY_BUCKETS] + ['+Inf']:
+                    lines.append(f'{full_name}_bucket{{{prefix}le="{le}"}} {_format_metric_value(buckets.get(le, 0))}')
+                suffix = f"{{{labels}}}" if labels else ''
+                lines.append(f"{full_name}_sum{suffix} {_format_metric_value(series.get(f'{full_name}_sum', {}).get(labels, {}).get('', 0))}")
+                lines.append(f"{full_name}_count{suffix} {_format_metric_value(counts[labels][''])}")
+        return '\n'.join(lines) + '\n'
+
+# Process-wide; the first Service created attaches it to its shared store
+metrics = MetricsRegistry()
+atexit.register(metrics.flush)
+
+class _StageTimer:
+    # Times a stage into stage_duration_seconds and records it as a span of the current trace.
+    # Usable as a with-block (yielding the span) or a decorator; a decorated stage returning nothing is marked failed.
+    def __init__(self, stage, attributes):
+        self.stage = stage
+        self.attributes = attributes
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._span = tracer.start_span(self.stage, self.attributes)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        metrics.observe('stage_duration_seconds', time.perf_counter() - self._start, {'stage': self.stage})
+        tracer.end_span(self._span, exc)
+        return False
+
+    def __call__(self, fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _StageTimer(self.stage, self.attributes) as span:
+                result = fn(*args, **kwargs)
+                if not result: span.set_error("Stage produced no result")
+                return result
+        return wrapper
+
+def timed_stage(stage, **attributes):
+    return _StageTimer(stage, attributes)
+
+# --- Request Metrics ---
+def instrument_app(app):
+    # Request counts and latencies for /metrics
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.inc('http_requests_total', {'endpoint': endpoint, 'method': request.method, 'status': response.status_code})
+        started = g.get('request_started')
+        if started is not None:
+            metrics.observe('http_request_duration_seconds', time.perf_counter() - started, {'endpoint': endpoint})
+        return response
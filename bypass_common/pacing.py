@@ -0,0 +1,105 @@
+# bypass_common/pacing.py
+# Gaps between consecutive steps of a resolution on the same host, learned from 429s and challenge pages.
+import logging
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+from bypass_common.limits import upstream_limiter
+from bypass_common.metrics import metrics
+from bypass_common.settings import env_float
+
+logger = logging.getLogger(__name__)
+
+# --- Upstream Pacing Configuration ---
+# Pauses between consecutive steps of a resolution on the same host. A step waits until
+# PACING_BASE_GAP seconds have passed since that resolution last heard from the host (no wait
+# when it hasn't contacted the host recently). The gap per host is learned: a 429 or challenge
+# response doubles it (at least PACING_PENALTY_GAP, at most PACING_MAX_GAP) and honours
+# Retry-After for every resolution; every PACING_RELAX_AFTER clean responses shrink it by a quarter.
+PACING_BASE_GAP = env_float("PACING_BASE_GAP", 0.2, minimum=0)
+PACING_PENALTY_GAP = 1.0
+PACING_MAX_GAP = 8.0
+PACING_RELAX_AFTER = 20
+CHALLENGE_PAGE_PATTERN = re.compile(r'challenge-platform|checking your browser|cf-chl-|<title>\s*just a moment', re.IGNORECASE)
+
+# --- Upstream Pacing ---
+class HostPacing:
+    def __init__(self):
+        self.gap = PACING_BASE_GAP
+        self.blocked_until = 0
+        self.clean = 0 # responses since the last penalty or relaxation
+        self.penalties = 0
+        self.waits = 0
+        self.waited = 0.0
+
+class PacingPolicy:
+    def __init__(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host):
+        key = upstream_limiter.key_for(host)
+        pacing = self._hosts.get(key)
+        if pacing is None: pacing = self._hosts[key] = HostPacing()
+        return key, pacing
+
+    def track(self, session):
+        # Remember when this session last heard from each host
+        session.pacing_contacts = {}
+        def record_contact(response, *args, **kwargs):
+            session.pacing_contacts[upstream_limiter.key_for(urlparse(response.url).hostname)] = time.monotonic()
+        session.hooks['response'].append(record_contact)
+
+    def delay_for(self, session, url):
+        # Seconds to wait before the session's next request to url's host
+        now = time.monotonic()
+        with self._lock:
+            key, pacing = self._host(urlparse(url).hostname)
+            last_contact = getattr(session, 'pacing_contacts', {}).get(key)
+            delay = max(0, pacing.blocked_until - now)
+            if last_contact is not None: delay = max(delay, pacing.gap - (now - last_contact))
+            delay = min(delay, PACING_MAX_GAP)
+            if delay > 0:
+                pacing.waits += 1
+                pacing.waited += delay
+        return delay
+
+    def observe(self, host, status_code, headers):
+        challenged = headers.get('cf-mitigated', '').lower() == 'challenge' or (
+            status_code in (403, 503) and 'cloudflare' in headers.get('Server', '').lower())
+        if status_code == 429 or challenged:
+            retry_after = headers.get('Retry-After', '')
+            self.penalize(host, 'rate_limited' if status_code == 429 else 'challenge', float(retry_after) if retry_after.isdigit() else 0)
+            return
+        with self._lock:
+            _, pacing = self._host(host)
+            pacing.clean += 1
+            if pacing.clean >= PACING_RELAX_AFTER:
+                pacing.gap = max(PACING_BASE_GAP, pacing.gap * 0.75)
+                pacing.clean = 0
+
+    def penalize(self, host, reason, retry_after=0):
+        with self._lock:
+            key, pacing = self._host(host)
+            pacing.gap = min(PACING_MAX_GAP, max(PACING_PENALTY_GAP, pacing.gap * 2))
+            if retry_after: pacing.blocked_until = max(pacing.blocked_until, time.monotonic() + min(retry_after, PACING_MAX_GAP))
+            pacing.clean = 0
+            pacing.penalties += 1
+            gap = pacing.gap
+        metrics.inc('upstream_pacing_penalties_total', {'host': key, 'reason': reason})
+        logger.warning(f"Pacing {key}: {reason}, gap between steps is now {gap:.2f}s")
+
+    def stats(self):
+        with self._lock:
+            return {key: {"gapSeconds": round(pacing.gap, 3), "penalties": pacing.penalties, "waits": pacing.waits,
+                          "waitedSeconds": round(pacing.waited, 3)}
+                    for key, pacing in self._hosts.items()}
+
+upstream_pacing = PacingPolicy()
+
+def note_challenge_page(url, html):
+    # Challenge interstitials often come back as 200s, so page bodies are checked too
+    if html and CHALLENGE_PAGE_PATTERN.search(html):
+        upstream_pacing.penalize(urlparse(url).hostname, 'challenge')
@@ -0,0 +1,222 @@
+# bypass_common/prefetch.py
+# Links resolved ahead of time and kept fresh while watched, under a token budget shared by the
+# workers of a host.
+import logging
+import sqlite3
+import threading
+import time
+
+from bypass_common.batch import classify_batch_url, forward_prefetch, is_sibling_link
+from bypass_common.cache import RESULT_CACHE_NEGATIVE_TTL, normalize_url
+from bypass_common.metrics import metrics
+from bypass_common.responses import LogBuffer
+from bypass_common.settings import env_float, env_int
+from bypass_common.store import add_schema
+from bypass_common.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# --- Prefetch Configuration ---
+# Links posted to /api/prefetch are resolved ahead of time by PREFETCH_WORKERS background threads per
+# worker, highest priority first, and stay watched for PREFETCH_WATCH_SECONDS: a watched link is resolved
+# again once its cached result is within PREFETCH_REFRESH_FRACTION of its TTL (at least
+# PREFETCH_REFRESH_MIN_LEAD seconds) of expiring. The watch list and a token bucket of
+# PREFETCH_RATE_PER_MINUTE resolutions (bursts of PREFETCH_BURST) live in the shared SQLite file, so
+# the budget holds for all workers on the host together. Prefetch is off without the shared store.
+PREFETCH_WORKERS = env_int("PREFETCH_WORKERS", 2, minimum=0)
+PREFETCH_RATE_PER_MINUTE = env_float("PREFETCH_RATE_PER_MINUTE", 30, minimum=0)
+PREFETCH_BURST = 5
+PREFETCH_MAX_URLS = env_int("PREFETCH_MAX_URLS", 500, minimum=1) # per request
+PREFETCH_MAX_WATCHED = env_int("PREFETCH_MAX_WATCHED", 5000, minimum=1)
+PREFETCH_WATCH_SECONDS = env_int("PREFETCH_WATCH_SECONDS", 6 * 3600, minimum=0)
+PREFETCH_REFRESH_FRACTION = 0.2
+PREFETCH_REFRESH_MIN_LEAD = 60
+PREFETCH_CLAIM_SECONDS = 300 # a claimed link is handed to another worker after this long
+PREFETCH_POLL_INTERVAL = 2 # seconds an idle prefetch thread waits before looking again
+
+# --- Prefetch ---
+add_schema(
+    "CREATE TABLE IF NOT EXISTS prefetch_links ("
+    " app TEXT NOT NULL, key TEXT NOT NULL, url TEXT NOT NULL, priority REAL NOT NULL, due_at REAL NOT NULL,"
+    " watch_until REAL NOT NULL, claimed_until REAL NOT NULL DEFAULT 0, PRIMARY KEY (app, key))",
+    "CREATE INDEX IF NOT EXISTS prefetch_links_due ON prefetch_links (app, due_at)",
+    "CREATE TABLE IF NOT EXISTS prefetch_budget (app TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)",
+)
+
+class Prefetcher:
+    # Watched links are rows in the shared SQLite file: due_at is when a link next needs resolving and
+    # claimed_until keeps two workers from resolving it at once. Threads start with the first request a
+    # worker serves, so importing the module (benchmarks) starts nothing. resolve(url, key, logs) runs
+    # one coalesced resolution (see Service.resolve_coalesced).
+    def __init__(self, shared_store, app_name=None, resolve=None):
+        self.shared = shared_store
+        self.app_name = app_name
+        self.resolve = resolve
+        self.resolved = 0
+        self.refreshed = 0
+        self.skipped = 0
+        self._started = False
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        # Prefetch is off without the shared store
+        return self.shared.available
+
+    def due_at(self, entry, now):
+        # When a link should next be resolved, given its cached result
+        if entry is None: return now
+        if not entry['finalUrl']: return entry['expiresAt'] # failures are retried once their negative entry expires
+        lead = max(PREFETCH_REFRESH_MIN_LEAD, (entry['expiresAt'] - entry['storedAt']) * PREFETCH_REFRESH_FRACTION)
+        return entry['expiresAt'] - lead
+
+    def enqueue(self, items, watch_seconds=PREFETCH_WATCH_SECONDS, wait=True):
+        # items: (url, priority) pairs; returns an error message, or None once all are watched.
+        # With wait=False the links are handed to the store's writer and None means queued.
+        if not self.available: return "Prefetch needs the shared result store, which is unavailable."
+        now = time.time()
+        links = [(normalize_url(url), url, priority) for url, priority in items]
+
+        def add(conn):
+            watched = conn.execute("SELECT COUNT(*) FROM prefetch_links WHERE app = ? AND watch_until >= ?", (self.app_name, now)).fetchone()[0]
+            if watched + len(links) > PREFETCH_MAX_WATCHED:
+                return f"Too many watched links (max {PREFETCH_MAX_WATCHED}), please try again later."
+            rows = [(self.app_name, key, url, priority, self.due_at(self.shared._select(conn, key, now), now), now + watch_seconds)
+                    for key, url, priority in links]
+            conn.executemany(
+                "INSERT INTO prefetch_links (app, key, url, priority, due_at, watch_until) VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (app, key) DO UPDATE SET priority = MAX(priority, excluded.priority),"
+                " due_at = MIN(due_at, excluded.due_at), watch_until = MAX(watch_until, excluded.watch_until)", rows)
+            return None
+
+        if not wait:
+            self.shared.write_later(add, "Prefetch enqueue")
+            return None
+        try:
+            return self.shared.write(add)
+        except sqlite3.Error as e:
+            logger.warning(f"Prefetch enqueue failed: {e}")
+            return "Prefetch queue unavailable, please try again later."
+
+    def _claim(self):
+        now = time.time()
+
+        def claim(conn):
+            conn.execute("DELETE FROM prefetch_links WHERE app = ? AND watch_until < ? AND claimed_until < ?", (self.app_name, now, now))
+            row = conn.execute(
+                "SELECT key, url FROM prefetch_links WHERE app = ? AND due_at <= ? AND claimed_until < ?"
+                " ORDER BY priority DESC, due_at LIMIT 1", (self.app_name, now, now)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE prefetch_links SET claimed_until = ? WHERE app = ? AND key = ?",
+                             (now + PREFETCH_CLAIM_SECONDS, self.app_name, row[0]))
+            return row
+
+        return self.shared.write(claim)
+
+    def _release(self, key, entry):
+        now = time.time()
+        due_at = self.due_at(entry, now) if entry is not None else now + RESULT_CACHE_NEGATIVE_TTL
+        self.shared.write(lambda conn: conn.execute("UPDATE prefetch_links SET due_at = ?, claimed_until = 0 WHERE app = ? AND key = ?",
+                                                    (due_at, self.app_name, key)))
+
+    def _take_token(self):
+        # Seconds until the shared budget has a token; 0 once one was taken
+        rate = PREFETCH_RATE_PER_MINUTE / 60
+
+        def take(conn):
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated_at FROM prefetch_budget WHERE app = ?", (self.app_name,)).fetchone()
+            tokens = PREFETCH_BURST if row is None else min(PREFETCH_BURST, row[0] + (now - row[1]) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if tokens >= 1: tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO prefetch_budget (app, tokens, updated_at) VALUES (?, ?, ?)", (self.app_name, tokens, now))
+            return wait
+
+        return self.shared.write(take)
+
+    def _work_once(self):
+        row = self._claim()
+        if row is None: return False
+        key, url = row
+        entry = self.shared.peek(key)
+        if self.due_at(entry, time.time()) > time.time():
+            self.skipped += 1 # a user request resolved it in the meantime
+            self._release(key, entry)
+            return True
+        wait = self._take_token()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self._take_token()
+        reason = 'refresh' if entry is not None and entry['finalUrl'] else 'new'
+        logs = LogBuffer()
+        final_download_link, raised = None, True
+        try:
+            with tracer.trace('prefetch.resolve', url=url, reason=reason):
+                (final_download_link, _, _, _), _ = self.resolve(url, key, logs)
+            raised = False
+        finally:
+            # A resolver that raises still frees the row; it is retried like a failure, after RESULT_CACHE_NEGATIVE_TTL
+            metrics.inc('prefetch_resolutions_total', {'reason': reason, 'result': 'success' if final_download_link else 'failure'})
+            with self._lock:
+                if reason == 'refresh': self.refreshed += 1
+                else: self.resolved += 1
+            self._release(key, None if raised else self.shared.peek(key))
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                if not self._work_once(): time.sleep(PREFETCH_POLL_INTERVAL)
+            except Exception as e:
+                logger.error(f"Prefetch worker error: {e}", exc_info=True)
+                time.sleep(PREFETCH_POLL_INTERVAL)
+
+    def start(self):
+        if self._started: return
+        with self._lock:
+            if self._started or not self.available or PREFETCH_WORKERS <= 0 or PREFETCH_RATE_PER_MINUTE <= 0: return
+            self._started = True
+        for index in range(PREFETCH_WORKERS):
+            threading.Thread(target=self._run, name=f"prefetch-{index}", daemon=True).start()
+
+    def stats(self):
+        result = {"running": self._started, "resolved": self.resolved, "refreshed": self.refreshed, "skipped": self.skipped}
+        if not self.available: return result
+        now = time.time()
+        try:
+            watched, due, claimed = self.shared.read(lambda conn: conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(due_at <= ?), 0), COALESCE(SUM(claimed_until >= ?), 0)"
+                " FROM prefetch_links WHERE app = ? AND watch_until >= ?", (now, now, self.app_name, now)).fetchone())
+        except sqlite3.Error as e:
+            logger.warning(f"Prefetch stats read failed: {e}")
+            return result
+        result.update({"watched": watched, "due": due, "inProgress": claimed})
+        return result
+
+def prefetch_links(service, urls, default_priority=0):
+    # Body and status code for /api/prefetch; links of the sibling's kind go to its watch list
+    own, sibling_items, rejected = [], [], []
+    for index, item in enumerate(urls):
+        url, priority = (item.get('url'), item.get('priority', default_priority)) if isinstance(item, dict) else (item, default_priority)
+        link_type = classify_batch_url(url)
+        if link_type is None or isinstance(priority, bool) or not isinstance(priority, (int, float)):
+            rejected.append({"index": index, "url": url, "error": "Invalid URL or priority."})
+            continue
+        (sibling_items if is_sibling_link(service, link_type) else own).append((index, url, float(priority)))
+    queued, status_code = 0, 400
+    if own:
+        prefetcher = service.prefetcher
+        prefetcher.start()
+        error = prefetcher.enqueue([(url, priority) for _, url, priority in own])
+        if error:
+            rejected.extend({"index": index, "url": url, "error": error} for index, url, _ in own)
+            status_code = 503
+        else:
+            queued += len(own)
+    if sibling_items:
+        sibling_queued, sibling_rejected, sibling_status = forward_prefetch(service, sibling_items)
+        queued += sibling_queued
+        rejected.extend(sibling_rejected)
+        if sibling_rejected and sibling_status >= 500: status_code = 503
+    rejected.sort(key=lambda entry: entry["index"])
+    return {"success": not rejected, "queued": queued, "rejected": rejected}, 202 if queued else status_code
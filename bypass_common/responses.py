@@ -0,0 +1,195 @@
+# bypass_common/responses.py
+# What a response carries besides the link: the response mode, log verbosity and HTML debug captures.
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# --- Response Mode Configuration ---
+# "minimal": success/finalUrl/expiresAt/error only, "summary": plus stage outcomes and a trimmed log,
+# "debug": full logs, with HTML dumps kept in a local capture store and referenced by id.
+# Requests without a responseMode get DEFAULT_RESPONSE_MODE; HTML is only captured when the request
+# itself asks for "debug", so a debug default never fills the capture store on its own.
+RESPONSE_MODES = ('minimal', 'summary', 'debug')
+DEFAULT_RESPONSE_MODE = os.environ.get("DEFAULT_RESPONSE_MODE", "summary").lower()
+LOG_BUFFER_MAX_ENTRIES = 400 # per request; the oldest entries are dropped beyond this
+# DEBUG_CAPTURE_DIR defaults to <tempdir>/<service>_debug_captures
+DEBUG_CAPTURE_TTL = 3600 # seconds a capture stays retrievable
+DEBUG_CAPTURE_MAX_FILES = 500
+# Response log verbosity chosen per request with "logLevel"
+LOG_LEVELS = ('none', 'errors', 'info', 'debug')
+DEFAULT_LOG_LEVEL = 'debug' # responseMode 'summary' defaults to 'info'
+LOG_INFO_MAX_CHARS = 500 # "info" truncates longer entries (HTML snippets and dumps)
+LOG_ERROR_PATTERN = re.compile(r'\b(?:Error|ERROR|Warning|WARNING|FATAL|FAILED)\b')
+
+# --- Response Modes ---
+CAPTURE_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+class LogBuffer(list):
+    # Bounded request log: past max_entries the oldest entries are dropped. HTML dumps are
+    # only stored (see log_html) when the request asked for debug output, in which case
+    # capture is the service's DebugCaptureStore.
+    def __init__(self, capture=None, max_entries=LOG_BUFFER_MAX_ENTRIES):
+        super().__init__()
+        self.capture = capture
+        self.max_entries = max_entries
+        self.dropped = 0
+        self.captures = []
+
+    def append(self, item):
+        super().append(item)
+        if len(self) > self.max_entries:
+            excess = len(self) - self.max_entries
+            del self[:excess]
+            self.dropped += excess
+
+    def extend(self, items):
+        for item in items: self.append(item)
+
+    def child(self):
+        # Separate log list for work running on behalf of this one (speculative branches);
+        # nothing reaches this buffer until merge_logs adopts it
+        return LogBuffer(self.capture, self.max_entries)
+
+def log_mark(logs):
+    # Position that stays valid after the buffer drops old entries; read back with logs_since
+    return getattr(logs, 'dropped', 0) + len(logs)
+
+def logs_since(logs, mark):
+    return list(logs[max(0, mark - getattr(logs, 'dropped', 0)):])
+
+def child_logs(logs):
+    return logs.child() if isinstance(logs, LogBuffer) else []
+
+def merge_logs(logs, child):
+    logs.extend(list(child))
+    if hasattr(logs, 'captures'): logs.captures.extend(getattr(child, 'captures', []))
+
+class DebugCaptureStore:
+    # Content-addressed HTML captures on local disk, so every worker on the host can serve them
+    # at url_prefix + capture id
+    def __init__(self, directory, url_prefix, ttl, max_files):
+        self.directory = directory
+        self.url_prefix = url_prefix
+        self.ttl = ttl
+        self.max_files = max_files
+        self._puts = 0
+        self._lock = threading.Lock()
+
+    def _path(self, capture_id):
+        return os.path.join(self.directory, f"{capture_id}.html")
+
+    def put(self, html):
+        data = html.encode('utf-8', 'replace')
+        capture_id = hashlib.sha256(data).hexdigest()[:32]
+        path = self._path(capture_id)
+        try:
+            if os.path.exists(path):
+                os.utime(path)
+                return capture_id
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, 'wb') as capture_file: capture_file.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not store debug capture: {e}")
+            return None
+        with self._lock:
+            self._puts += 1
+            prune = self._puts % 50 == 0
+        if prune: self._prune()
+        return capture_id
+
+    def get(self, capture_id):
+        if not CAPTURE_ID_PATTERN.fullmatch(capture_id): return None
+        path = self._path(capture_id)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl: return None
+            with open(path, encoding='utf-8', errors='replace') as capture_file: return capture_file.read()
+        except OSError:
+            return None
+
+    def _prune(self):
+        # Other workers write and prune the same directory: a file may vanish between listing and
+        # removal, and *.tmp files are captures still being written
+        try:
+            names = os.listdir(self.directory)
+        except OSError as e:
+            logger.warning(f"Could not prune debug captures: {e}")
+            return
+        entries = []
+        for name in names:
+            if not name.endswith('.html'): continue
+            path = os.path.join(self.directory, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                continue
+        entries.sort()
+        expired = [path for mtime, path in entries if time.time() - mtime > self.ttl]
+        overflow = [path for _, path in entries[:max(0, len(entries) - self.max_files)]]
+        for path in set(expired + overflow):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.warning(f"Could not prune debug capture {path}: {e}")
+
+def log_html(logs, label, html):
+    if not html: return
+    capture = getattr(logs, 'capture', None)
+    if capture is None:
+        logs.append(f"--- {label}: {len(html)} characters of HTML (not captured; use responseMode 'debug') ---")
+        return
+    capture_id = capture.put(html)
+    if capture_id is None:
+        logs.append(f"--- {label}: {len(html)} characters of HTML (capture failed) ---")
+        return
+    logs.captures.append({"id": capture_id, "label": label, "characters": len(html), "url": f"{capture.url_prefix}{capture_id}"})
+    logs.append(f"--- {label}: {len(html)} characters of HTML captured as {capture_id} ---")
+
+def request_response_mode(data):
+    mode = data.get('responseMode') if isinstance(data, dict) else None
+    return mode if mode in RESPONSE_MODES else DEFAULT_RESPONSE_MODE
+
+def capture_requested(data):
+    return isinstance(data, dict) and data.get('responseMode') == 'debug'
+
+def trace_requested(data):
+    # Asked for explicitly: "trace": true, or "responseMode": "summary" for its stage outcomes.
+    # A summary default from DEFAULT_RESPONSE_MODE only gets stages for sampled requests.
+    return isinstance(data, dict) and (data.get('trace') is True or data.get('responseMode') == 'summary')
+
+def stage_outcomes(trace):
+    stages = []
+    for span in trace.to_dict()["spans"][1:]: # the first span is the request itself
+        stage = {"stage": span["name"], "status": span["status"], "durationMs": span["durationMs"]}
+        if span.get("message"): stage["error"] = span["message"]
+        stages.append(stage)
+    return stages
+
+def shape_response(result, logs, mode, log_level, trace=None):
+    if mode == 'minimal':
+        result.pop("logs", None)
+        return result
+    result["logs"] = filter_logs(list(logs), log_level)
+    if mode == 'summary' and trace: result["stages"] = stage_outcomes(trace)
+    if mode == 'debug': result["debugCaptures"] = list(getattr(logs, 'captures', []))
+    return result
+
+def filter_logs(logs, level):
+    if level == 'debug': return logs
+    if level == 'none': return []
+    if level == 'errors': return [line for line in logs if LOG_ERROR_PATTERN.search(line)]
+    return [line if len(line) <= LOG_INFO_MAX_CHARS else f"{line[:LOG_INFO_MAX_CHARS]}... [{len(line) - LOG_INFO_MAX_CHARS} more characters]" for line in logs]
+
+def request_log_level(data, mode=None):
+    level = data.get('logLevel') if isinstance(data, dict) else None
+    if level in LOG_LEVELS: return level
+    return 'info' if mode == 'summary' else DEFAULT_LOG_LEVEL
@@ -0,0 +1,172 @@
+# bypass_common/service.py
+# One scraping service: its caches, coalesced resolutions, jobs, prefetch watch list and debug
+# captures, and the resolve path that ties them together.
+import logging
+import os
+import re
+import tempfile
+import time
+
+from bypass_common.batch import batch_dispatcher
+from bypass_common.breakers import upstream_breakers
+from bypass_common.cache import (
+    NEGATIVE_CACHE_FINGERPRINTS, RESULT_CACHE_HOT_MAX_KEYS, RESULT_CACHE_HOT_WINDOW, RESULT_CACHE_MAX_ENTRIES,
+    HotKeys, ResultCache, SingleFlight, classify_failure, link_metadata, negative_cache_ttl, normalize_url,
+    result_cache_ttl,
+)
+from bypass_common.extract import extractor_stats
+from bypass_common.jobs import JOB_MAX_RETAINED, JOB_RETENTION_SECONDS, JobStore
+from bypass_common.learning import strategy_learner
+from bypass_common.limits import upstream_limiter
+from bypass_common.metrics import instrument_app, metrics, timed_stage
+from bypass_common.pacing import upstream_pacing
+from bypass_common.prefetch import Prefetcher
+from bypass_common.responses import (
+    DEBUG_CAPTURE_MAX_FILES, DEBUG_CAPTURE_TTL, DebugCaptureStore, log_mark, logs_since,
+)
+from bypass_common.store import SHARED_CACHE_MAX_ENTRIES, SharedResultStore
+from bypass_common.streaming import stream_stats
+from bypass_common.tracing import TRACE_EXPORT, TraceExporter, tracer
+from bypass_common.upstream import pool_stats
+
+logger = logging.getLogger(__name__)
+
+# --- Services ---
+class Service:
+    # One scraping service and the state that belongs to it: its result caches and shared SQLite
+    # file, coalesced resolutions, jobs, prefetch watch list and debug captures. Upstream HTTP state
+    # (pools, limits, pacing, breakers) and telemetry are process-wide; the first Service created in
+    # a process attaches metrics, strategy outcomes and trace export to its name and SQLite file.
+    def __init__(self, name, find_link, error_message, url_field, link_types, sibling, failure_fingerprints=(),
+                 typical_seconds=None, extra_stats=None):
+        self.name = name
+        self.find_link = find_link # (url, logs) -> final link or None
+        self.error_message = error_message # (resolution logs) -> error shown to the client
+        self.url_field = url_field # request key holding the link, e.g. 'gdflixUrl'
+        self.link_types = tuple(link_types) # classify_batch_url types this service resolves itself
+        self.sibling_env, self.sibling_label = sibling
+        self.sibling_url = os.environ.get(self.sibling_env, "").rstrip('/')
+        self.extra_stats = extra_stats
+        self.failure_fingerprints = NEGATIVE_CACHE_FINGERPRINTS + tuple(
+            (failure_class, re.compile(pattern, re.IGNORECASE)) for failure_class, pattern in failure_fingerprints)
+        self.store = SharedResultStore(SHARED_CACHE_MAX_ENTRIES)
+        self.store.open(os.environ.get("SHARED_CACHE_DB_PATH", os.path.join(tempfile.gettempdir(), f"{name}_result_cache.sqlite3")))
+        self.result_cache = ResultCache(RESULT_CACHE_MAX_ENTRIES)
+        self.hot_keys = HotKeys(RESULT_CACHE_HOT_MAX_KEYS)
+        self.flight = SingleFlight()
+        self.jobs = JobStore(self.store, JOB_MAX_RETAINED, JOB_RETENTION_SECONDS)
+        self.prefetcher = Prefetcher(self.store, name, self.resolve_coalesced)
+        self.debug_captures = DebugCaptureStore(
+            os.environ.get("DEBUG_CAPTURE_DIR", os.path.join(tempfile.gettempdir(), f"{name}_debug_captures")),
+            f"/api/{name}/debug/", DEBUG_CAPTURE_TTL, DEBUG_CAPTURE_MAX_FILES)
+        strategy_learner.typical_seconds.update(typical_seconds or {})
+        if metrics.shared is not None:
+            # The benchmarks load both apps into one process
+            logger.info(f"{name} shares the {metrics.prefix} metrics, strategy outcomes and trace export of this process")
+            return
+        metrics.attach(self.store, name)
+        strategy_learner.attach(self.store, name)
+        if TRACE_EXPORT in ('file', 'otlp'):
+            trace_path = os.environ.get("TRACE_FILE_PATH", os.path.join(tempfile.gettempdir(), f"{name}_traces.jsonl"))
+            tracer.exporter = TraceExporter(TRACE_EXPORT, trace_path, f"{name}-api")
+
+    def instrument(self, app):
+        # Request metrics, and the prefetch threads start with the first request the worker serves
+        instrument_app(app)
+        app.before_request(self.prefetcher.start)
+
+    def cache_lookup(self, key):
+        entry = self.result_cache.get(key)
+        metrics.inc('cache_lookups_total', {'tier': 'local', 'result': 'miss' if entry is None else 'hit'})
+        if entry is None:
+            entry = self.store.get(key)
+            metrics.inc('cache_lookups_total', {'tier': 'shared', 'result': 'miss' if entry is None else 'hit'})
+            if entry is not None: self.result_cache.set(key, entry)
+        return entry
+
+    def cache_store(self, key, final_url, error, ttl, failure_class=None, link_expires_at=None):
+        now = time.time()
+        entry = {'finalUrl': final_url, 'error': error, 'failureClass': failure_class, 'linkExpiresAt': link_expires_at,
+                 'storedAt': now, 'expiresAt': now + ttl}
+        self.result_cache.set(key, entry)
+        self.store.set(key, entry)
+
+    def resolve_url(self, url, cache_key, logs):
+        # Runs the service's resolver and caches the outcome. Appends to the caller's logs as it goes;
+        # returns the part it added so coalesced callers can copy it
+        start = log_mark(logs)
+        with timed_stage('resolution'):
+            final_download_link = self.find_link(url, logs)
+        error = link_expires_at = None
+        if final_download_link:
+            resolved_at = time.time()
+            link = link_metadata(final_download_link, resolved_at)
+            link_expires_at = link["expiresAt"]
+            ttl = result_cache_ttl(link_expires_at, resolved_at)
+            if ttl > 0:
+                self.cache_store(cache_key, final_download_link, None, ttl, link_expires_at=link_expires_at)
+                logs.append(f"Cached final link for {cache_key} (TTL {ttl:.0f}s; {link['family']} link, "
+                            f"{link['expirySource']} to expire in {link_expires_at - resolved_at:.0f}s).")
+            else:
+                logs.append(f"Final link for {cache_key} expires in {link_expires_at - resolved_at:.0f}s, too soon to cache.")
+        else:
+            resolve_logs = logs_since(logs, start)
+            error = self.error_message(resolve_logs)
+            failure_class = classify_failure(error, resolve_logs, self.failure_fingerprints)
+            ttl = negative_cache_ttl(failure_class)
+            self.cache_store(cache_key, None, error, ttl, failure_class)
+            metrics.inc('resolution_failures_total', {'class': failure_class})
+            tracer.current_span().set('failure_class', failure_class)
+            logs.append(f"Cached failure for {cache_key} as {failure_class} (TTL {ttl}s).")
+        return final_download_link, logs_since(logs, start), error, link_expires_at
+
+    def resolve_coalesced(self, url, cache_key, logs):
+        # ((final link, resolution logs, error, link expiry), joined an in-progress resolution)
+        return self.flight.do(cache_key, lambda: self.resolve_url(url, cache_key, logs))
+
+    def process_request(self, url, logs):
+        # Returns (final link, error, served from cache, link expiry)
+        cache_key = normalize_url(url)
+        cached = self.cache_lookup(cache_key)
+        if cached:
+            cached_age = time.time() - cached['storedAt']
+            if cached['finalUrl']:
+                logs.append(f"Cache hit for {cache_key} (resolved {cached_age:.0f}s ago).")
+                watch_seconds = cached['expiresAt'] - time.time() + RESULT_CACHE_HOT_WINDOW
+                if self.hot_keys.hit(cache_key) and self.prefetcher.enqueue([(url, 0)], watch_seconds, wait=False) is None:
+                    logs.append(f"{cache_key} is hot, it will be re-resolved before its link expires.")
+            else:
+                logs.append(f"Negative cache hit for {cache_key} ({cached.get('failureClass') or 'unknown'}, failed {cached_age:.0f}s ago, "
+                            f"expires in {max(0, cached['expiresAt'] - time.time()):.0f}s).")
+            metrics.inc('resolutions_total', {'result': 'success' if cached['finalUrl'] else 'failure', 'source': 'cache'})
+            tracer.current_span().set('source', 'cache')
+            if not cached['finalUrl']: tracer.current_span().set_error(cached['error'])
+            return cached['finalUrl'], cached['error'], True, cached.get('linkExpiresAt')
+
+        (final_download_link, resolve_logs, error, link_expires_at), shared = self.resolve_coalesced(url, cache_key, logs)
+        if shared:
+            logs.append(f"Joined an in-progress resolution for {cache_key}.")
+            logs.extend(resolve_logs)
+        metrics.inc('resolutions_total', {'result': 'success' if final_download_link else 'failure', 'source': 'coalesced' if shared else 'fresh'})
+        tracer.current_span().set('source', 'coalesced' if shared else 'fresh')
+        if not final_download_link: tracer.current_span().set_error(error)
+        return final_download_link, error, False, link_expires_at
+
+    def stats(self):
+        stats = {
+            "cache": {
+                "local": {"hits": self.result_cache.hits, "misses": self.result_cache.misses, "entries": len(self.result_cache._entries)},
+                "shared": {"hits": self.store.hits, "misses": self.store.misses, "available": self.store.available},
+            },
+            "singleFlight": self.flight.stats(),
+            "connectionPool": pool_stats(),
+            "upstreamLimits": upstream_limiter.stats(),
+            "pacing": upstream_pacing.stats(),
+            "circuitBreakers": upstream_breakers.stats(),
+            "extractor": extractor_stats(),
+            "streaming": stream_stats(),
+            "prefetch": self.prefetcher.stats(),
+            "batch": batch_dispatcher.stats(),
+        }
+        if self.extra_stats: stats.update(self.extra_stats())
+        return stats
@@ -0,0 +1,44 @@
+# bypass_common/settings.py
+# Numeric settings read from the environment. A malformed or out-of-range value is logged and
+# replaced by its default, so one bad variable never stops a worker from importing.
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# --- Environment Settings ---
+def parse_number(text, cast, minimum=None, above=None):
+    # cast(text), or ValueError when it is not a number of that type or not within the bounds
+    value = cast(text)
+    if minimum is not None and value < minimum: raise ValueError(f"{text} is below {minimum}")
+    if above is not None and value <= above: raise ValueError(f"{text} is not above {above}")
+    return value
+
+def env_number(name, default, cast, minimum=None, above=None):
+    text = os.environ.get(name)
+    if text is None or not text.strip(): return default
+    try:
+        return parse_number(text.strip(), cast, minimum, above)
+    except ValueError as e:
+        logger.warning(f"Ignoring {name}={text!r} ({e}); using {default}")
+        return default
+
+def env_int(name, default, minimum=None, above=None):
+    return env_number(name, default, int, minimum, above)
+
+def env_float(name, default, minimum=None, above=None):
+    return env_number(name, default, float, minimum, above)
+
+def env_map(name, parse):
+    # "key=value,key=value" with keys lowercased; entries parse(value) rejects with ValueError are skipped
+    entries = {}
+    for item in os.environ.get(name, "").split(','):
+        if not item.strip(): continue
+        key, separator, value = item.partition('=')
+        key = key.strip().lower()
+        try:
+            if not separator or not key: raise ValueError("expected key=value")
+            entries[key] = parse(value.strip())
+        except ValueError as e:
+            logger.warning(f"Ignoring {name} entry {item.strip()!r} ({e})")
+    return entries
@@ -0,0 +1,184 @@
+# bypass_common/store.py
+# SQLite file (WAL mode) shared by every gunicorn worker on the host: the shared tier of the result
+# cache, plus the tables other modules register with add_schema.
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from bypass_common.settings import env_int
+
+logger = logging.getLogger(__name__)
+
+# --- Shared Store Configuration ---
+# Shared by all gunicorn workers on the host; SHARED_CACHE_DB_PATH defaults to <tempdir>/<service>_result_cache.sqlite3
+SHARED_CACHE_MAX_ENTRIES = env_int("SHARED_CACHE_MAX_ENTRIES", 20000, minimum=1)
+SHARED_CACHE_COMPACT_INTERVAL = 300 # seconds between expiry sweeps
+SHARED_CACHE_BUSY_TIMEOUT = 5 # seconds to wait on a locked database
+SHARED_CACHE_READERS = 4 # threads (one connection each) serving reads; writes go through one more
+
+SHARED_STORE_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS result_cache ("
+    " key TEXT PRIMARY KEY, final_url TEXT, error TEXT,"
+    " stored_at REAL NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL, failure_class TEXT, link_expires_at REAL)",
+    "CREATE INDEX IF NOT EXISTS result_cache_expires ON result_cache (expires_at)",
+]
+
+def add_schema(*statements):
+    # Tables kept by other modules in the same file; open() creates them with the result cache's
+    SHARED_STORE_SCHEMA.extend(statements)
+
+def store_thread_pool(max_workers, name):
+    # sqlite3 calls block. Under gevent's monkey-patching a Thread is a greenlet and a blocking call
+    # stalls every request of the worker, so the store's threads come from gevent's OS-thread pool.
+    if 'gevent' in sys.modules:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+            return GeventThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+class SharedResultStore:
+    # SQLite (WAL mode) file shared by every gunicorn worker on the host. It also holds the
+    # tables added with add_schema, all created by open().
+    # Every statement runs on the store's own threads, each with one connection: reads on
+    # SHARED_CACHE_READERS reader threads, writes in order on a single writer thread, so a worker
+    # never waits on itself for the write lock and callers only wait when they need the result.
+    def __init__(self, max_entries):
+        self.path = None
+        self.max_entries = max_entries
+        self.available = False # until open() succeeds
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._readers = self._writer = None
+        self._last_compaction = 0
+
+    def open(self, path):
+        self.path = path
+        self._readers = store_thread_pool(SHARED_CACHE_READERS, "shared-store-read")
+        self._writer = store_thread_pool(1, "shared-store-write")
+
+        def create(conn):
+            for statement in SHARED_STORE_SCHEMA: conn.execute(statement)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(result_cache)")}
+            for column, column_type in (('failure_class', 'TEXT'), ('link_expires_at', 'REAL')):
+                if column in columns: continue
+                try:
+                    conn.execute(f"ALTER TABLE result_cache ADD COLUMN {column} {column_type}")
+                except sqlite3.OperationalError:
+                    pass # another worker added it first
+
+        try:
+            self._wait(self._submit(self._writer, create, False))
+            self.available = True
+        except sqlite3.Error as e:
+            logger.warning(f"Shared result cache disabled ({path}): {e}")
+
+    def _conn(self):
+        # Only called on the store's threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SHARED_CACHE_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _execute(self, work, transaction, what=None):
+        # sqlite3 errors come back as part of the result, so gevent's pool doesn't report them as crashes
+        conn = None
+        try:
+            conn = self._conn()
+            if not transaction: return work(conn), None
+            conn.execute("BEGIN IMMEDIATE")
+            result = work(conn)
+            conn.execute("COMMIT")
+            return result, None
+        except sqlite3.Error as e:
+            if conn is not None and conn.in_transaction: conn.execute("ROLLBACK")
+            if what: logger.warning(f"{what} failed: {e}")
+            return None, e
+
+    def _submit(self, executor, work, transaction, what=None):
+        try:
+            return executor.submit(self._execute, work, transaction, what)
+        except RuntimeError: # interpreter shutdown: the atexit flushes run on the calling thread
+            future = Future()
+            future.set_result(self._execute(work, transaction, what))
+            return future
+
+    def _wait(self, future):
+        result, error = future.result()
+        if error is not None: raise error
+        return result
+
+    def read(self, work):
+        # work(conn) on a reader thread; returns its result, sqlite3 errors are raised here
+        return self._wait(self._submit(self._readers, work, False))
+
+    def write(self, work):
+        # work(conn) in one transaction on the writer thread, after every write queued before it
+        return self._wait(self._submit(self._writer, work, True))
+
+    def write_later(self, work, what):
+        # Like write, without waiting; a failure is only logged
+        self._submit(self._writer, work, True, what)
+
+    def _select(self, conn, key, now):
+        row = conn.execute(
+            "SELECT final_url, error, stored_at, expires_at, failure_class, link_expires_at FROM result_cache WHERE key = ? AND expires_at > ?",
+            (key, now)).fetchone()
+        if row is None: return None
+        return {'finalUrl': row[0], 'error': row[1], 'storedAt': row[2], 'expiresAt': row[3], 'failureClass': row[4], 'linkExpiresAt': row[5]}
+
+    def get(self, key):
+        if not self.available: return None
+        now = time.time()
+        try:
+            entry = self.read(lambda conn: self._select(conn, key, now))
+        except sqlite3.Error as e:
+            logger.warning(f"Shared result cache read failed: {e}")
+            return None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.write_later(lambda conn: conn.execute("UPDATE result_cache SET last_access = ? WHERE key = ?", (now, key)),
+                         "Shared result cache write")
+        self.hits += 1
+        return entry
+
+    def peek(self, key):
+        # Like get, without touching access times or hit counts
+        if not self.available: return None
+        try:
+            return self.read(lambda conn: self._select(conn, key, time.time()))
+        except sqlite3.Error as e:
+            logger.warning(f"Shared result cache read failed: {e}")
+            return None
+
+    def set(self, key, entry):
+        if not self.available: return
+        row = (key, entry['finalUrl'], entry['error'], entry['storedAt'], entry['expiresAt'], entry['storedAt'],
+               entry.get('failureClass'), entry.get('linkExpiresAt'))
+        self.write_later(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO result_cache (key, final_url, error, stored_at, expires_at, last_access, failure_class, link_expires_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row), "Shared result cache write")
+        if time.time() - self._last_compaction > SHARED_CACHE_COMPACT_INTERVAL:
+            self.compact()
+
+    def compact(self):
+        # Drop expired rows, then trim the least recently used rows over the size limit
+        self._last_compaction = now = time.time()
+
+        def trim(conn):
+            conn.execute("DELETE FROM result_cache WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "DELETE FROM result_cache WHERE key IN ("
+                " SELECT key FROM result_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+
+        self.write_later(trim, "Shared result cache compaction")
+        self._submit(self._writer, lambda conn: conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone(), False, "Shared result cache checkpoint")
@@ -0,0 +1,61 @@
+# bypass_common/streaming.py
+# Streamed page fetches that stop reading, and close the connection, once the page is decided.
+import codecs
+import threading
+
+# --- Streaming Fetch Configuration ---
+STREAM_CHUNK_SIZE = 16 * 1024 # bytes read per chunk before re-checking the stop condition
+STREAM_MATCH_OVERLAP = 4096 # characters re-scanned from the previous chunk so matches can straddle chunks
+
+# --- Streaming Fetch ---
+class _StreamCounters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fetches = 0
+        self.early_exits = 0 # connection closed once the stop condition matched
+        self.bytes_read = 0
+
+stream_counters = _StreamCounters()
+
+def _incremental_decoder(encoding):
+    try:
+        return codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+    except LookupError:
+        return codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+def fetch_html(session, url, stop_when=None, method='GET', **kwargs):
+    # Streams the body and closes the connection as soon as stop_when(response, text, pos) says
+    # the page is decided; pos is where the newly received text starts (minus an overlap), so
+    # the check can scan incrementally. Error responses are not read at all.
+    # Returns (response, text, complete).
+    response = session.request(method, url, stream=True, **kwargs)
+    if not response.ok:
+        response.close()
+        return response, '', True
+    decoder = _incremental_decoder(response.encoding)
+    text = ''
+    complete = True
+    bytes_read = 0
+    try:
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            bytes_read += len(chunk)
+            pos = max(0, len(text) - STREAM_MATCH_OVERLAP)
+            text += decoder.decode(chunk)
+            if stop_when is not None and stop_when(response, text, pos):
+                complete = False
+                break
+        if complete: text += decoder.decode(b'', final=True)
+    finally:
+        response.close()
+    with stream_counters.lock:
+        stream_counters.fetches += 1
+        stream_counters.bytes_read += bytes_read
+        if not complete: stream_counters.early_exits += 1
+    return response, text, complete
+
+def stream_stats():
+    with stream_counters.lock:
+        return {"fetches": stream_counters.fetches, "earlyExits": stream_counters.early_exits, "bytesRead": stream_counters.bytes_read}
+
+def stop_on_pattern(pattern):
+    return lambda response, text, pos: pattern.search(text, pos) is not None
@@ -0,0 +1,212 @@
+# bypass_common/tracing.py
+# Per-request traces: spans for each resolution stage, returned with the response when asked for
+# and optionally exported to a JSON-lines file or an OTLP collector.
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import requests
+
+from bypass_common.settings import env_float
+
+logger = logging.getLogger(__name__)
+
+# --- Tracing Configuration ---
+# Spans are recorded for every resolution when an exporter is set, otherwise only for requests
+# that ask for their trace (see trace_requested) and a TRACE_SAMPLE_RATE fraction of the rest.
+# TRACE_EXPORT: "" (off), "file" (JSON lines) or "otlp" (OTLP/HTTP JSON).
+TRACE_EXPORT = os.environ.get("TRACE_EXPORT", "").lower()
+TRACE_SAMPLE_RATE = env_float("TRACE_SAMPLE_RATE", 0, minimum=0)
+# TRACE_FILE_PATH defaults to <tempdir>/<service>_traces.jsonl
+TRACE_OTLP_ENDPOINT = os.environ.get("TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces")
+TRACE_EXPORT_BATCH = 50 # traces per file write / OTLP request
+TRACE_EXPORT_QUEUE = 1000 # finished traces waiting for export; more are dropped
+TRACE_EXPORT_TIMEOUT = 30 # seconds per OTLP request
+
+# --- Tracing ---
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'start', 'end', 'attributes', 'status', 'message')
+
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.end = None
+        self.attributes = dict(attributes)
+        self.status = None
+        self.message = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def set_error(self, message):
+        self.status = 'error'
+        self.message = message
+
+    def to_dict(self):
+        span = {"spanId": self.span_id, "parentSpanId": self.parent_id, "name": self.name,
+                "start": self.start, "end": self.end, "durationMs": round((self.end - self.start) * 1000, 1),
+                "status": self.status, "attributes": self.attributes}
+        if self.message: span["message"] = self.message
+        return span
+
+class _NoopSpan:
+    # Returned when the current request is not traced, so call sites never need to check
+    def set(self, key, value): pass
+    def set_error(self, message): pass
+
+NOOP_SPAN = _NoopSpan()
+
+class Trace:
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, span):
+        with self.lock: self.spans.append(span)
+
+    def to_dict(self):
+        with self.lock: spans = sorted(self.spans, key=lambda span: span.start)
+        return {"traceId": self.trace_id, "spans": [span.to_dict() for span in spans]}
+
+def _otlp_value(value):
+    if isinstance(value, bool): return {"boolValue": value}
+    if isinstance(value, int): return {"intValue": str(value)}
+    if isinstance(value, float): return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def otlp_payload(traces, service_name):
+    spans = []
+    for trace in traces:
+        for span in trace.spans:
+            item = {"traceId": trace.trace_id, "spanId": span.span_id, "name": span.name, "kind": 1,
+                    "startTimeUnixNano": str(int(span.start * 1e9)), "endTimeUnixNano": str(int(span.end * 1e9)),
+                    "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+                    "status": {"code": 2, "message": span.message or ''} if span.status == 'error' else {"code": 1}}
+            if span.parent_id: item["parentSpanId"] = span.parent_id
+            spans.append(item)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{"scope": {"name": service_name}, "spans": spans}],
+    }]}
+
+class TraceExporter:
+    # Background thread draining finished traces to a JSON-lines file or an OTLP/HTTP collector
+    def __init__(self, kind, path, service_name):
+        self.kind = kind
+        self.path = path
+        self.service_name = service_name
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=TRACE_EXPORT_QUEUE)
+        self._session = requests.Session() # not the pooled adapter: exports are not upstream traffic
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < TRACE_EXPORT_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if self.kind == 'otlp':
+                    self._session.post(TRACE_OTLP_ENDPOINT, json=otlp_payload(batch, self.service_name), timeout=TRACE_EXPORT_TIMEOUT).raise_for_status()
+                else:
+                    with open(self.path, 'a', encoding='utf-8') as trace_file:
+                        for trace in batch: trace_file.write(json.dumps(trace.to_dict()) + "\n")
+            except (OSError, requests.exceptions.RequestException) as e:
+                self.dropped += len(batch)
+                logger.warning(f"Trace export to {self.kind} failed, dropped {len(batch)} traces: {e}")
+
+class Tracer:
+    # The active (trace, span) context is kept per thread; work handed to another thread
+    # carries it over with activate(current()).
+    def __init__(self, exporter=None):
+        self.exporter = exporter # set by the first Service when TRACE_EXPORT is on
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None: stack = self._local.stack = []
+        return stack
+
+    def current(self):
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def current_span(self):
+        context = self.current()
+        return context[1] if context and context[1] is not None else NOOP_SPAN
+
+    @contextmanager
+    def activate(self, context):
+        if context is None:
+            yield
+            return
+        stack = self._stack()
+        stack.append(context)
+        try:
+            yield
+        finally:
+            stack.pop()
+
+    @contextmanager
+    def trace(self, name, force=False, **attributes):
+        # Yields the Trace, or None when this request is neither asked for, sampled nor exported
+        sampled = TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+        if not (force or self.exporter or sampled):
+            yield None
+            return
+        trace = Trace()
+        try:
+            # An exception leaving the body ends the root span as an error
+            with self.activate((trace, None)):
+                with self.span(name, **attributes):
+                    yield trace
+        finally:
+            if self.exporter: self.exporter.submit(trace)
+
+    def start_span(self, name, attributes):
+        context = self.current()
+        if context is None: return NOOP_SPAN
+        trace, parent = context
+        span = Span(trace, name, parent.span_id if parent is not None else None, attributes)
+        self._stack().append((trace, span))
+        return span
+
+    def end_span(self, span, error=None):
+        if span is NOOP_SPAN: return
+        span.end = time.time()
+        if error is not None: span.set_error(f"{type(error).__name__}: {error}")
+        elif span.status is None: span.status = 'ok'
+        stack = self._stack()
+        if stack and stack[-1][1] is span: stack.pop()
+        span.trace.add(span)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        span = self.start_span(name, attributes)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, e)
+            raise
+        self.end_span(span)
+
+tracer = Tracer()
@@ -0,0 +1,172 @@
+# bypass_common/upstream.py
+# The worker's pooled HTTP adapter: every upstream request goes through its host's circuit breaker,
+# limiter and pacing, on keep-alive connections shared across resolutions.
+import threading
+import time
+import weakref
+from urllib.parse import urlparse
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+from bypass_common.breakers import CircuitOpen, upstream_breakers
+from bypass_common.fixtures import fixture_adapter
+from bypass_common.limits import UpstreamBusy, upstream_limiter
+from bypass_common.metrics import metrics
+from bypass_common.pacing import upstream_pacing
+from bypass_common.settings import env_int, env_map, parse_number
+
+# --- Connection Pool Configuration ---
+HTTP_POOL_HOSTS = env_int("HTTP_POOL_HOSTS", 32, minimum=1) # distinct upstream hosts kept pooled per worker
+HTTP_POOL_MAXSIZE = env_int("HTTP_POOL_MAXSIZE", 10, minimum=1) # keep-alive connections kept per host
+# Per-host overrides, e.g. HTTP_POOL_HOST_MAXSIZE="gdflix.dev=20,new.gdflix.dev=20"
+HTTP_POOL_HOST_MAXSIZE = env_map("HTTP_POOL_HOST_MAXSIZE", lambda size: parse_number(size, int, minimum=1))
+HTTP_POOL_IDLE_TIMEOUT = 90 # seconds before an unused host pool is closed
+
+# --- Connection Pooling ---
+class _PoolCounters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0 # request sent on a kept-alive connection
+        self.misses = 0 # request needed a fresh TCP/TLS connection
+        self.evicted_pools = 0
+
+pool_counters = _PoolCounters()
+
+class _CountingPoolMixin:
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout=timeout)
+        self.last_used = time.time()
+        reused = getattr(conn, 'sock', None) is not None
+        with pool_counters.lock:
+            if reused: pool_counters.hits += 1
+            else: pool_counters.misses += 1
+        return conn
+
+class CountingHTTPConnectionPool(_CountingPoolMixin, urllib3.HTTPConnectionPool):
+    pass
+
+class CountingHTTPSConnectionPool(_CountingPoolMixin, urllib3.HTTPSConnectionPool):
+    pass
+
+class _ResponseSlot:
+    # A request's hold on its host: the limiter slot and the host's in-use count. Released once,
+    # when the body has been read, the response is closed, the send fails or the response is
+    # garbage collected unread.
+    def __init__(self, adapter, host, release_limit):
+        self.adapter = adapter
+        self.host = host
+        self.release_limit = release_limit
+        self.released = False
+
+    def release(self):
+        with self.adapter._lock:
+            if self.released: return
+            self.released = True
+            in_use = self.adapter._in_use
+            in_use[self.host] -= 1
+            if not in_use[self.host]: del in_use[self.host]
+        self.release_limit()
+
+    def hold_until_released(self, response):
+        # urllib3 calls release_conn once the body is exhausted or the response is closed
+        raw = response.raw
+        release_conn = getattr(raw, 'release_conn', None)
+        if release_conn is None:
+            self.release()
+            return
+
+        def release_conn_and_slot():
+            try:
+                release_conn()
+            finally:
+                self.release()
+        raw.release_conn = release_conn_and_slot
+        weakref.finalize(response, self.release)
+
+class PooledHTTPAdapter(HTTPAdapter):
+    # Shared by every session in the worker so keep-alive connections to the same
+    # upstream hosts survive across resolutions. Sessions stay per resolution, so
+    # cookie jars are never shared.
+    def __init__(self):
+        super().__init__(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_MAXSIZE)
+        self._last_sweep = time.time()
+        self._lock = threading.RLock() # re-entrant: a response finalizer may run during a sweep
+        self._in_use = {} # host -> requests whose response body is still open
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': CountingHTTPConnectionPool, 'https': CountingHTTPSConnectionPool}
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+        maxsize = HTTP_POOL_HOST_MAXSIZE.get((host_params.get('host') or '').lower())
+        if maxsize: pool_kwargs['maxsize'] = maxsize
+        return host_params, pool_kwargs
+
+    def send(self, request, **kwargs):
+        if time.time() - self._last_sweep > HTTP_POOL_IDLE_TIMEOUT / 3:
+            self.evict_idle_pools()
+        host = urlparse(request.url).hostname or ''
+        breaker = upstream_breakers.get(host)
+        if not breaker.allow():
+            metrics.inc('upstream_responses_total', {'host': host, 'status': 'circuit_open'})
+            raise CircuitOpen(f"Circuit open for {host} ({breaker.reason}); retrying in {breaker.retry_in():.0f}s", request=request)
+        try:
+            release_limit = upstream_limiter.acquire(host)
+        except UpstreamBusy:
+            breaker.cancel()
+            metrics.inc('upstream_responses_total', {'host': host, 'status': 'throttled'})
+            raise
+        # The slot and the in-use mark last until the body is read, not just the headers, so the
+        # limiter counts streamed downloads and eviction never closes a pool mid-response
+        with self._lock:
+            self._in_use[host] = self._in_use.get(host, 0) + 1
+        slot = _ResponseSlot(self, host, release_limit)
+        started = time.monotonic()
+        try:
+            response = super().send(request, **kwargs)
+        except BaseException as e:
+            slot.release()
+            if isinstance(e, requests.exceptions.RequestException):
+                breaker.record(False, time.monotonic() - started)
+                metrics.inc('upstream_responses_total', {'host': host, 'status': 'error'})
+            raise
+        slot.hold_until_released(response)
+        breaker.record(response.status_code < 500 and response.status_code != 429, time.monotonic() - started)
+        upstream_pacing.observe(host, response.status_code, response.headers)
+        metrics.inc('upstream_responses_total', {'host': host, 'status': response.status_code})
+        return response
+
+    def evict_idle_pools(self):
+        # Under the lock send takes to mark a host in use, so a pool is never closed between a
+        # request picking it and its response being released
+        self._last_sweep = now = time.time()
+        pools = self.poolmanager.pools
+        with self._lock:
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None or self._in_use.get((pool.host or '').lower()): continue
+                if now - getattr(pool, 'last_used', now) > HTTP_POOL_IDLE_TIMEOUT:
+                    del pools[key] # closes the pool's connections
+                    with pool_counters.lock: pool_counters.evicted_pools += 1
+
+    def close(self):
+        # Sessions are throwaway but the pool is not; keep connections open when a session closes
+        pass
+
+http_adapter = PooledHTTPAdapter()
+
+def new_session():
+    session = requests.Session()
+    adapter = fixture_adapter(http_adapter) or http_adapter
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    upstream_pacing.track(session)
+    return session
+
+def pool_stats():
+    with pool_counters.lock:
+        hits, misses, evicted = pool_counters.hits, pool_counters.misses, pool_counters.evicted_pools
+    return {"hits": hits, "misses": misses, "pooledHosts": len(http_adapter.poolmanager.pools), "evictedPools": evicted}
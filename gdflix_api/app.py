@@ -1,7 +1,5 @@
 # gdflix_api/app.py
 import requests
-# import cloudscraper # Keep commented unless needed for Cloudflare
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 import time
 import re
@@ -9,19 +7,36 @@ import json
 import traceback
 import sys
 import os # Added for os.environ.get
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, request, jsonify, make_response, Response, stream_with_context
 from flask_cors import CORS # Import CORS
 import threading # For self-ping
 import logging # For better logging
-
-# Try importing lxml, fall back to html.parser if not installed
-try:
-    import lxml
-    PARSER = "lxml"
-    LXML_AVAILABLE = True
-except ImportError:
-    PARSER = "html.parser"
-    print("Warning: lxml not found, using html.parser.", file=sys.stderr)
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import hashlib
+import random
+from email.utils import parsedate_to_datetime
+
+# Shared infrastructure (caching, limits, breakers, jobs, batch, prefetch, metrics) lives next to both apps
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from bypass_common.batch import BATCH_MAX_URLS, batch_results
+from bypass_common.breakers import BreakerRegistry, upstream_breakers
+from bypass_common.extract import parse_with_fallback
+from bypass_common.jobs import submit_job
+from bypass_common.learning import STRATEGY_LEARNING, probe_strategy_link, strategy_learner, strategy_mirrors
+from bypass_common.metrics import metrics, timed_stage
+from bypass_common.pacing import note_challenge_page, upstream_pacing
+from bypass_common.prefetch import PREFETCH_MAX_URLS, prefetch_links
+from bypass_common.responses import (
+    DEFAULT_RESPONSE_MODE, LogBuffer, capture_requested, child_logs, log_html, merge_logs, request_log_level,
+    request_response_mode, shape_response, trace_requested,
+)
+from bypass_common.service import Service
+from bypass_common.settings import env_float, env_int
+from bypass_common.streaming import fetch_html, stop_on_pattern
+from bypass_common.tracing import tracer
+from bypass_common.upstream import new_session
 
 # --- Flask App Initialization ---
 app = Flask(__name__)
@@ -51,640 +66,1093 @@ POLL_INTERVAL = 5
 REQUEST_TIMEOUT = 30
 MAX_REDIRECT_HOPS = 5
 
+# --- Circuit Breaker Configuration ---
+# Per-strategy breakers, on top of the per-host ones in bypass_common
+BREAKER_STRATEGY_SLOW_SECONDS = 60 # whole strategy, Fast Cloud polling included
+
+# --- Negative Cache Configuration ---
+# Failure classes specific to GDFLIX pages, matched after the shared ones
+GDFLIX_FAILURE_FINGERPRINTS = (
+    ('no_download_link', r'no supported download buttons|all prioritized search attempts'),
+    ('strategy_step_failed', r'drivebot|fastcloud|fast cloud|polling|initial page content'),
+)
+
+# --- Fast Cloud Polling Configuration ---
+# "adaptive" (fast first check, jittered backoff, server hints) or "fixed" (every POLL_INTERVAL)
+FAST_CLOUD_POLL_SCHEDULER = os.environ.get("FAST_CLOUD_POLL_SCHEDULER", "adaptive").lower()
+POLL_FIRST_DELAY = 1.0 # first check shortly after the generate POST
+POLL_MIN_INTERVAL = 1.5
+POLL_MAX_INTERVAL = 8
+POLL_BACKOFF_FACTOR = 1.5 # applied while the polled page stays unchanged
+POLL_JITTER = 0.2 # +/- fraction applied to each adaptive delay
+POLL_HINT_KEYS = ('retry_after', 'retryAfter', 'wait', 'delay', 'countdown', 'eta')
+
+# --- Redirect Shortcut Configuration ---
+# Redirect chains (meta refresh, location.replace and HTTP redirects) that end on a file page are
+# learned as rewrite rules: start host + path template -> final host + path template, where {id}
+# is the last start-path segment, or an id-like one (REDIRECT_SHORTCUT_ID_PATTERN), that survives
+# into the final path; literal segments such as "file" never become {id}. Later links matching a rule
+# jump straight to the file page. Each rule is re-checked against the full chain every
+# REDIRECT_SHORTCUT_VERIFY_INTERVAL seconds and dropped when its target stops serving a file page
+# or after REDIRECT_SHORTCUT_MAX_AGE seconds without a successful check.
+REDIRECT_SHORTCUTS = os.environ.get("REDIRECT_SHORTCUTS", "1") != "0"
+REDIRECT_SHORTCUT_VERIFY_INTERVAL = env_int("REDIRECT_SHORTCUT_VERIFY_INTERVAL", 600, minimum=0)
+REDIRECT_SHORTCUT_MAX_AGE = 3600
+REDIRECT_SHORTCUT_MAX_RULES = 500
+REDIRECT_SHORTCUT_ID_PATTERN = re.compile(r'(?=.*\d)[\w-]{6,}') # 6+ word characters with a digit
+
+# --- Speculative Strategy Configuration ---
+# When a page offers both Fast Cloud and Drivebot, run both multi-step paths at once
+SPECULATIVE_STRATEGIES = os.environ.get("GDFLIX_SPECULATIVE_STRATEGIES", "false").lower() in ("1", "true", "yes")
+# Once a branch finds a link, higher-priority branches still running get this long to find one too
+SPECULATIVE_GRACE_SECONDS = env_float("GDFLIX_SPECULATIVE_GRACE_SECONDS", 1, minimum=0)
+STRATEGY_WORKERS = env_int("STRATEGY_WORKERS", 16, minimum=1)
+
 # --- Self-Ping Configuration (NEW) ---
 SELF_PING_INTERVAL_SECONDS = 48  # Ping every 48 seconds to keep the instance awake
 PING_REQUEST_TIMEOUT = 20
 
-# --- Core GDFLIX Bypass Function (Unchanged) ---
-def get_gdflix_download_link(start_url):
-    session = requests.Session()
-    session.headers.update(HEADERS)
-    logs = []
-    current_url = start_url
-    hops_count = 0
-    landed_url = None
-    html_content = None
+# --- Redirect Detection ---
+META_REFRESH_PATTERN = re.compile(r'<meta\s+http-equiv="refresh"\s+content="[^"]*url=([^"]+)"', re.IGNORECASE)
+JS_REDIRECT_PATTERN = re.compile(r"location\.replace\(['\"]([^'\"]+)['\"]", re.IGNORECASE)
+HEAD_CLOSE_PATTERN = re.compile(r'</head\s*>', re.IGNORECASE)
+# 'Cloud Resume Download' as the whole text of a closed <a>/<button>; nested markup just means no early exit
+RESUME_ELEMENT_PATTERN = re.compile(r'>[^<]*cloud\s+resume\s+download[^<]*</(?:a|button)\s*>', re.IGNORECASE)
+
+def meta_refresh_target(match, landed_url):
+    potential_next = urljoin(landed_url, match.group(1).strip().split(';')[0])
+    return potential_next if potential_next.split('#')[0] != landed_url.split('#')[0] else None
+
+def js_redirect_target(match, landed_url):
+    extracted_url = match.group(1).strip().split('+document.location.hash')[0].strip("'\" ")
+    potential_next = urljoin(landed_url, extracted_url)
+    return potential_next if potential_next.split('#')[0] != landed_url.split('#')[0] else None
+
+def redirect_stop_condition():
+    # A hop is decided by an actionable first META refresh, or by an actionable first
+    # location.replace once </head> has closed (a META refresh, which wins, belongs in <head>).
+    state = {'meta': None, 'js': None, 'head_closed': False}
+    def decided(response, text, pos):
+        if state['meta'] is None:
+            match = META_REFRESH_PATTERN.search(text, pos)
+            if match:
+                state['meta'] = meta_refresh_target(match, response.url) is not None
+                if state['meta']: return True
+        if state['js'] is None:
+            match = JS_REDIRECT_PATTERN.search(text, pos)
+            if match: state['js'] = js_redirect_target(match, response.url) is not None
+        if not state['head_closed']:
+            state['head_closed'] = HEAD_CLOSE_PATTERN.search(text, pos) is not None
+        return bool(state['js']) and state['head_closed']
+    return decided
+
+# --- Page Analysis ---
+# Button text patterns per page, in priority order. All are matched case-insensitively.
+GDFLIX_PAGE1_PATTERNS = {
+    'pixeldrain': re.compile(r'pixeldrain\s*(dl)?', re.IGNORECASE),
+    'r2': re.compile(r'cloud\s+download\s+\[R2\]', re.IGNORECASE),
+    'fast_cloud': re.compile(r'fast\s*cloud\s*(download|dl)', re.IGNORECASE),
+    'drivebot': re.compile(r'DRIVEBOT', re.IGNORECASE),
+}
+FAST_CLOUD_PAGE_PATTERNS = {
+    'resume': re.compile(r'cloud\s+resume\s+download', re.IGNORECASE),
+    'generate': re.compile(r'generate\s+cloud\s+link', re.IGNORECASE),
+}
+FAST_CLOUD_POLL_PATTERNS = {'resume': FAST_CLOUD_PAGE_PATTERNS['resume']}
+DRIVEBOT_INDEX_PATTERNS = {
+    'preferred': re.compile(r'DRIVEBOT\s*1(?:\s*\[R1\])?', re.IGNORECASE),
+    'generic': re.compile(r'DRIVEBOT', re.IGNORECASE),
+}
+DRIVEBOT_GENERATE_PATTERNS = {'generate': re.compile(r'Generate Link', re.IGNORECASE)}
+GDINDEX_LINK_PATTERN = re.compile(r'https?://[^\s"\']*\.gdindex\.lol[^\s"\']*')
+
+@lru_cache(maxsize=32)
+def _combined_pattern(sources):
+    return re.compile('|'.join(f'(?:{source})' for source in sources), re.IGNORECASE)
+
+def tag_text(tag):
+    if tag.name == 'input':
+        return tag.get('value', '') if tag.get('type') in ['button', 'submit'] else ''
+    return tag.get_text(strip=True)
+
+def analyze_page(soup, patterns, tag_names=('a', 'button')):
+    # Walks the candidate tags once. Each tag's text is computed a single time and checked
+    # against one alternation of every pattern; only tags passing that are tested per
+    # pattern, keeping the first match in document order for each (as the old loops did).
+    combined = _combined_pattern(tuple(pattern.pattern for pattern in patterns.values()))
+    candidates = []
+    matches = {}
+    for tag in soup.find_all(list(tag_names)):
+        candidate = {'tag': tag, 'name': tag.name, 'text': tag_text(tag), 'href': tag.get('href'), 'onclick': tag.get('onclick')}
+        candidates.append(candidate)
+        if len(matches) == len(patterns) or not combined.search(candidate['text']):
+            continue
+        parent_form = tag.find_parent('form')
+        candidate['form_action'] = parent_form.get('action') if parent_form else None
+        for name, pattern in patterns.items():
+            if name not in matches and pattern.search(candidate['text']):
+                matches[name] = candidate
+    return candidates, matches
+
+def analyze_html(html, patterns, tag_names=('a', 'button')):
+    return parse_with_fallback(html, lambda page: analyze_page(page, patterns, tag_names), found=lambda result: result[1])
+
+def find_gdindex_link_tags(page):
+    return page.find('input', {'value': GDINDEX_LINK_PATTERN}), page.find('a', {'href': GDINDEX_LINK_PATTERN})
+
+# --- Fast Cloud Polling ---
+def retry_after_seconds(value):
+    if not value: return None
+    value = value.strip()
+    if value.isdigit(): return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def json_wait_hint(data):
+    if not isinstance(data, dict): return None
+    for key in POLL_HINT_KEYS:
+        try:
+            seconds = float(data.get(key))
+        except (TypeError, ValueError):
+            continue
+        if seconds >= 0: return seconds
+    return None
+
+class PollScheduler:
+    # Fixed cadence (the original behaviour), plus the change detection and server hints
+    # shared by every scheduler.
+    def __init__(self):
+        self.interval = POLL_INTERVAL
+        self.hint = None
+        self.signature = None
+        self.etag = None
+        self.last_modified = None
+        self.polls = 0
+        self.unchanged = 0
+
+    def use_hint(self, seconds):
+        if seconds is not None: self.hint = seconds
+
+    def next_delay(self):
+        if self.hint is not None:
+            delay, self.hint = self.hint, None
+            return delay
+        return self.interval
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag: headers['If-None-Match'] = self.etag
+        if self.last_modified: headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def page_changed(self, response, html):
+        # A 304 answers the conditional headers; otherwise compare ETag, else a body digest
+        self.polls += 1
+        self.etag = response.headers.get('ETag') or self.etag
+        self.last_modified = response.headers.get('Last-Modified') or self.last_modified
+        if response.status_code == 304:
+            changed = False
+        else:
+            signature = response.headers.get('ETag') or hashlib.blake2b(html.encode('utf-8', 'replace'), digest_size=16).hexdigest()
+            changed = signature != self.signature
+            self.signature = signature
+        if not changed: self.unchanged += 1
+        self.observe(changed)
+        return changed
+
+    def observe(self, changed):
+        pass
+
+class AdaptivePollScheduler(PollScheduler):
+    def __init__(self):
+        super().__init__()
+        self.interval = POLL_MIN_INTERVAL
+        self.first = True
+
+    def next_delay(self):
+        if self.hint is not None: return super().next_delay()
+        if self.first:
+            self.first = False
+            return POLL_FIRST_DELAY
+        return self.interval * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+
+    def observe(self, changed):
+        self.interval = POLL_MIN_INTERVAL if changed else min(self.interval * POLL_BACKOFF_FACTOR, POLL_MAX_INTERVAL)
+
+POLL_SCHEDULERS = {'fixed': PollScheduler, 'adaptive': AdaptivePollScheduler}
+
+def new_poll_scheduler():
+    return POLL_SCHEDULERS.get(FAST_CLOUD_POLL_SCHEDULER, AdaptivePollScheduler)()
+
+# --- Strategy Helpers ---
+class StrategyCancelled(Exception):
+    pass
+
+def check_strategy_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise StrategyCancelled()
+
+def pause_strategy(seconds, cancel_event=None):
+    # Sleeps like time.sleep, but wakes up early if a competing strategy already won
+    if cancel_event is None:
+        time.sleep(seconds)
+    elif cancel_event.wait(seconds):
+        raise StrategyCancelled()
+
+strategy_executor = ThreadPoolExecutor(max_workers=STRATEGY_WORKERS, thread_name_prefix="gdflix-strategy")
+
+def element_href(tag):
+    href = tag.get('href')
+    if not href and tag.name == 'button':
+        parent_form = tag.find_parent('form')
+        if parent_form: href = parent_form.get('action')
+    return href
+
+def _run_strategy_branch(strategy_fn, session, page1_url, href, logs, cancel_event, trace_context=None):
+    # Returns (link or None, seconds, cancelled)
+    started = time.monotonic()
+    try:
+        with tracer.activate(trace_context):
+            return strategy_fn(session, page1_url, href, logs, cancel_event), time.monotonic() - started, False
+    except StrategyCancelled:
+        logs.append("  Info: Branch cancelled because another strategy already produced a link.")
+        return None, time.monotonic() - started, True
+    except requests.exceptions.RequestException as e:
+        logs.append(f"  Error: Network or Request error: {e}")
+    except Exception as e:
+        logs.append(f"  Error: Unexpected error in strategy branch: {e}")
+    return None, time.monotonic() - started, False
+
+def run_speculative_strategies(session, page1_url, branches, logs):
+    # branches are (strategy, strategy_fn, href) in priority order. All start at once; the first
+    # valid link wins unless a higher-priority branch also finds one within SPECULATIVE_GRACE_SECONDS,
+    # then the rest are cancelled.
+    # Each branch logs into its own buffer and only the winner's is kept.
+    # Returns (winning strategy, link, outcomes); outcomes maps each branch that ran to the end
+    # to (link, seconds), so cancelled branches are neither a success nor a failure.
+    cancel_event = threading.Event()
+    trace_context = tracer.current()
+    futures = {}
+    for priority, (strategy, strategy_fn, href) in enumerate(branches):
+        branch_session = new_session()
+        branch_session.headers.update(session.headers)
+        branch_session.cookies.update(session.cookies)
+        branch_logs = child_logs(logs)
+        future = strategy_executor.submit(_run_strategy_branch, strategy_fn, branch_session, page1_url, href, branch_logs, cancel_event, trace_context)
+        futures[future] = (priority, strategy, branch_logs)
+
+    winner, winning_link = None, None
+    outcomes = {}
+    pending = set(futures)
+    grace_ends = None
+    while pending:
+        if winning_link is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        else:
+            higher = {future for future in pending if futures[future][0] < futures[winner][0]}
+            remaining = grace_ends - time.monotonic()
+            if not higher or remaining <= 0: break
+            done, _ = wait(higher, timeout=remaining, return_when=FIRST_COMPLETED)
+            pending -= done
+        for future in sorted(done, key=lambda f: futures[f][0]):
+            link, seconds, cancelled = future.result()
+            if not cancelled: outcomes[futures[future][1]] = (link, seconds)
+            if link and (winning_link is None or futures[future][0] < futures[winner][0]):
+                if winning_link is None: grace_ends = time.monotonic() + SPECULATIVE_GRACE_SECONDS
+                winner, winning_link = future, link
+    # Losers still queued never start; running ones stop at their next pause or cancellation check
+    cancel_event.set()
+    for future in pending: future.cancel()
+
+    if winner is None:
+        # Nobody produced a link, so every branch's log is needed to explain the failure
+        for future, (priority, strategy, branch_logs) in sorted(futures.items(), key=lambda item: item[1][0]):
+            logs.append(f"--- Speculative branch: {GDFLIX_STRATEGY_NAMES[strategy]} ---")
+            merge_logs(logs, branch_logs)
+        return None, None, outcomes
+
+    winner_name, winner_logs = GDFLIX_STRATEGY_NAMES[futures[winner][1]], futures[winner][2]
+    logs.append(f"--- Speculative branch: {winner_name} ---")
+    merge_logs(logs, winner_logs)
+    for future, (priority, strategy, branch_logs) in futures.items():
+        if future is winner: continue
+        if (outcomes.get(strategy) or (None,))[0]:
+            logs.append(f"Info: Speculative branch '{GDFLIX_STRATEGY_NAMES[strategy]}' also found a link, but '{winner_name}' has priority; its logs were discarded.")
+        else:
+            logs.append(f"Info: Speculative branch '{GDFLIX_STRATEGY_NAMES[strategy]}' lost to '{winner_name}' and was cancelled; its logs were discarded.")
+    logs.append(f"Success: Speculative branch '{winner_name}' won with link: {winning_link}")
+    return futures[winner][1], winning_link, outcomes
+
+@timed_stage('strategy_fast_cloud')
+def gdflix_fast_cloud_strategy(session, page1_url, fast_cloud_href, logs, cancel_event=None):
+    intermediate_url = urljoin(page1_url, fast_cloud_href)
+    logs.append(f"Found intermediate link URL (from Fast Cloud button): {intermediate_url}")
+    pause_strategy(upstream_pacing.delay_for(session, intermediate_url), cancel_event)
+
+    logs.append(f"Fetching intermediate page URL (potentially with Generate button): {intermediate_url}")
+    fetch_headers_p2 = {'Referer': page1_url}
+    with timed_stage('fast_cloud_page', url=intermediate_url):
+        response_intermediate = session.get(intermediate_url, timeout=REQUEST_TIMEOUT, headers=fetch_headers_p2, allow_redirects=True)
+    response_intermediate.raise_for_status()
+    page2_url = response_intermediate.url 
+    html_content_p2 = response_intermediate.text
+    logs.append(f"Landed on intermediate page: {page2_url} (Status: {response_intermediate.status_code})")
+
+    log_html(logs, f"Intermediate Page HTML (URL: {page2_url})", html_content_p2)
+    logs.append(f"--- End Intermediate Page HTML Snippet ---")
+    if "cloudflare" in html_content_p2.lower() or "checking your browser" in html_content_p2.lower():
+         logs.append("WARNING: Potential Cloudflare challenge page detected on Intermediate Page!")
+    note_challenge_page(page2_url, html_content_p2)
+
+    soup2, (possible_tags_p2, page2_matches) = analyze_html(html_content_p2, FAST_CLOUD_PAGE_PATTERNS)
+    logs.append(f"Found {len(possible_tags_p2)} potential link/button tags on intermediate page ({page2_url}).")
+
+    resume_link_tag = None
+    logs.append("Searching for 'Cloud Resume Download' button text pattern on intermediate page...")
+    if 'resume' in page2_matches:
+        match = page2_matches['resume']
+        resume_link_tag = match['tag']
+        logs.append(f"Success: Found final link tag directly: <{match['name']}> with text '{match['text']}'")
+
+    if resume_link_tag:
+        final_link_href = resume_link_tag.get('href')
+        if not final_link_href and resume_link_tag.name == 'button':
+             parent_form = resume_link_tag.find_parent('form')
+             if parent_form: final_link_href = parent_form.get('action')
+
+        if not final_link_href:
+            logs.append(f"Error: Found '{resume_link_tag.get_text(strip=True)}' but no href/action.")
+            return None
+
+        final_download_link = urljoin(page2_url, final_link_href)
+        logs.append(f"Success: Found final Cloud Resume link URL directly: {final_download_link}")
+        return final_download_link
+    else:
+        logs.append("Info: 'Cloud Resume Download' not found directly. Checking for 'Generate Cloud Link' button...")
+        generate_tag = None
+        generate_tag_by_id = soup2.find('button', id='cloud')
+        if generate_tag_by_id:
+            logs.append("  Found 'Generate Cloud Link' button by id='cloud'.")
+            generate_tag = generate_tag_by_id
+        else:
+            logs.append("  Button with id='cloud' not found. Searching by text pattern 'generate cloud link'...")
+            if 'generate' in page2_matches:
+                match = page2_matches['generate']
+                generate_tag = match['tag']
+                logs.append(f"  Success: Found potential generate tag by text: <{match['name']}> with text '{match['text']}'")
+        
+        if generate_tag:
+            logs.append(f"Found 'Generate Cloud Link' button: <{generate_tag.name}> id='{generate_tag.get('id', 'N/A')}'")
+            logs.append("Attempting to mimic the JavaScript POST request...")
+
+            post_data = {}
+            parent_form = generate_tag.find_parent('form')
+            if parent_form:
+                logs.append("  Found parent form for generate button. Extracting hidden inputs...")
+                for input_tag in parent_form.find_all('input', type='hidden'):
+                    name = input_tag.get('name')
+                    value = input_tag.get('value')
+                    if name:
+                        post_data[name] = value if value is not None else ''
+                        logs.append(f"    Extracted hidden input: name='{name}', value='{value}'")
+                btn_name = generate_tag.get('name')
+                btn_value = generate_tag.get('value')
+                if btn_name and generate_tag.name == 'button': 
+                     post_data[btn_name] = btn_value if btn_value is not None else ''
+                     logs.append(f"    Added button data: name='{btn_name}', value='{btn_value}'")
+
+            default_post_data = {'action': 'cloud', 'key': '08df4425e31c4330a1a0a3cefc45c19e84d0a192', 'action_token': ''}
+            final_post_data = {**default_post_data, **post_data}
+            if 'action' not in final_post_data: final_post_data['action'] = 'cloud'
+            logs.append(f"  Final POST data payload: {final_post_data}")
+
+            parsed_uri = urlparse(page2_url)
+            hostname = parsed_uri.netloc
+            post_headers = {
+                'Referer': page2_url,
+                'x-token': hostname,
+                'Accept': 'application/json, text/javascript, */*; q=0.01',
+                'X-Requested-With': 'XMLHttpRequest',
+            }
+            logs.append(f"  POST headers (excluding session defaults): {post_headers}")
+
+            logs.append(f"Sending POST request to: {page2_url}")
+            page3_fc_url = None # Differentiate from drivebot's page3_url
+            try:
+                with timed_stage('fast_cloud_post', url=page2_url):
+                    post_response = session.post(page2_url, data=final_post_data, headers=post_headers, timeout=REQUEST_TIMEOUT)
+                logs.append(f"  POST response status: {post_response.status_code}")
+                content_type = post_response.headers.get('Content-Type', '').lower()
+                response_text = post_response.text
+                extracted_poll_url = False
+                response_data = None
+
+                if 'application/json' in content_type:
+                    try:
+                        response_data = post_response.json()
+                        logs.append(f"  POST response JSON (from header): {response_data}")
+                        if post_response.status_code == 200 and not response_data.get('error'):
+                             poll_url_relative = response_data.get('visit_url') or response_data.get('url')
+                             if poll_url_relative:
+                                 page3_fc_url = urljoin(page2_url, poll_url_relative)
+                                 logs.append(f"  POST successful. Extracted polling URL: {page3_fc_url}")
+                                 extracted_poll_url = True
+                             else:
+                                 logs.append("  Error: POST success status but no 'visit_url' or 'url' key found in JSON.")
+                        elif response_data.get('error'):
+                             error_msg = response_data.get('message', 'Unknown error from server POST response')
+                             logs.append(f"  Error from POST JSON response: {error_msg} (Status: {post_response.status_code})")
+                        else:
+                             logs.append(f"  Error: POST returned status {post_response.status_code} with JSON, but format unclear.")
+                             logs.append(f"  Response JSON: {response_data}")
+                    except json.JSONDecodeError:
+                        logs.append(f"  Error: Failed to decode JSON response, though Content-Type was JSON.")
+                        logs.append(f"  Response text (first 500 chars): {response_text[:500]}")
+                elif post_response.status_code == 200:
+                    logs.append(f"  Info: POST Content-Type is '{content_type}', not JSON. Status 200 received. Attempting to parse body as JSON anyway...")
+                    try:
+                        response_data = json.loads(response_text)
+                        logs.append(f"  Success: Parsed response body as JSON despite incorrect Content-Type.")
+                        logs.append(f"  Parsed JSON data: {response_data}")
+                        if not response_data.get('error'):
+                            poll_url_relative = response_data.get('visit_url') or response_data.get('url')
+                            if poll_url_relative:
+                                page3_fc_url = urljoin(page2_url, poll_url_relative)
+                                logs.append(f"  Extracted polling URL from parsed text: {page3_fc_url}")
+                                extracted_poll_url = True
+                            else:
+                                logs.append("  Error: Parsed JSON successfully but no 'visit_url' or 'url' key found.")
+                        elif response_data.get('error'):
+                            error_msg = response_data.get('message', 'Unknown error in parsed JSON')
+                            logs.append(f"  Error found in parsed JSON: {error_msg}")
+                        else:
+                            logs.append("  Warning: Parsed JSON but structure is unexpected (no error/url keys).")
+                    except json.JSONDecodeError:
+                        logs.append(f"  Error: Failed to decode potentially JSON response body (Content-Type was '{content_type}', Status 200).")
+                        logs.append(f"  Response text (first 500 chars): {response_text[:500]}")
+                else:
+                     logs.append(f"  Error: POST response status was {post_response.status_code} or Content-Type '{content_type}' was unexpected.")
+                     if not response_text.strip(): logs.append("  Response body was empty.")
+                     else: logs.append(f"  Response text (first 500 chars): {response_text[:500]}")
+                     if "cloudflare" in response_text.lower() or "captcha" in response_text.lower():
+                         logs.append("  Hint: Cloudflare/Captcha challenge likely blocked the POST request.")
+
+                if not extracted_poll_url:
+                     logs.append(f"  Error: Failed to obtain a valid polling URL from the POST response.")
+                     try:
+                         if post_response.status_code != 200: post_response.raise_for_status()
+                     except requests.exceptions.HTTPError as http_err: logs.append(f"  HTTP Error details: {http_err}")
+                     return None
+            except requests.exceptions.RequestException as post_err:
+                logs.append(f"  Error during POST request network operation: {post_err}")
+                return None
+
+            if page3_fc_url:
+                logs.append(f"Starting polling loop for {page3_fc_url}...")
+                scheduler = new_poll_scheduler()
+                post_hint = retry_after_seconds(post_response.headers.get('Retry-After'))
+                if post_hint is None: post_hint = json_wait_hint(response_data)
+                if post_hint is not None:
+                    scheduler.use_hint(post_hint)
+                    logs.append(f"  Server suggested waiting {post_hint:.1f}s before the first check.")
+                start_time = time.time()
+                while time.time() - start_time < GENERATION_TIMEOUT:
+                    elapsed_time = time.time() - start_time
+                    remaining_time = GENERATION_TIMEOUT - elapsed_time
+                    wait_time = min(scheduler.next_delay(), remaining_time)
+                    if wait_time <= 0: break
+
+                    logs.append(f"  Polling: Waiting {wait_time:.1f}s before checking {page3_fc_url}...")
+                    pause_strategy(wait_time, cancel_event)
+                    poll_landed_url = None
+                    try:
+                        poll_headers = {'Referer': page3_fc_url, **scheduler.conditional_headers()}
+                        with timed_stage('fast_cloud_poll', url=page3_fc_url, waited=round(wait_time, 1)):
+                            poll_response, poll_html, _ = fetch_html(session, page3_fc_url, stop_when=stop_on_pattern(RESUME_ELEMENT_PATTERN), timeout=REQUEST_TIMEOUT, headers=poll_headers, allow_redirects=True)
+                        poll_landed_url = poll_response.url
+                        poll_status = poll_response.status_code
+                        logs.append(f"  Polling: GET {page3_fc_url} -> Status {poll_status}, Landed on {poll_landed_url}")
+                        scheduler.use_hint(retry_after_seconds(poll_response.headers.get('Retry-After')))
+
+                        if poll_status not in (200, 304):
+                            logs.append(f"  Warning: Polling status {poll_status}, continuing poll loop.")
+                            scheduler.observe(False)
+                            continue
+
+                        if not scheduler.page_changed(poll_response, poll_html):
+                            logs.append("  Polling: Page unchanged since the last check, skipping parse.")
+                            continue
+
+                        polled_resume_tag = None
+                        _, (_, poll_matches) = analyze_html(poll_html, FAST_CLOUD_POLL_PATTERNS)
+                        if 'resume' in poll_matches:
+                            polled_resume_tag = poll_matches['resume']['tag']
+                            logs.append(f"    Success: Found 'Cloud Resume Download' after polling on {poll_landed_url}!")
+                        
+                        if polled_resume_tag:
+                            final_link_href = polled_resume_tag.get('href')
+                            if not final_link_href and polled_resume_tag.name == 'button':
+                                parent_form_poll = polled_resume_tag.find_parent('form')
+                                if parent_form_poll: final_link_href = parent_form_poll.get('action')
+
+                            if not final_link_href:
+                                logs.append(f"    Error: Found polled '{polled_resume_tag.get_text(strip=True)}' element but no href/action.")
+                                return None
+
+                            final_download_link = urljoin(poll_landed_url, final_link_href)
+                            logs.append(f"Success: Found final Cloud Resume link URL after polling ({scheduler.polls} checks, {scheduler.unchanged} unchanged): {final_download_link}")
+                            return final_download_link
+                    except requests.exceptions.Timeout:
+                         logs.append(f"  Warning: Timeout during polling request to {page3_fc_url}. Will retry.")
+                    except requests.exceptions.RequestException as poll_err:
+                         logs.append(f"  Warning: Network error during polling request: {poll_err}. Will retry.")
+                    except Exception as parse_err:
+                         logs.append(f"  Warning: Error parsing polled page {poll_landed_url or page3_fc_url}: {parse_err}. Will retry.")
+
+                logs.append(f"Error: Link generation timed out after {GENERATION_TIMEOUT}s of polling {page3_fc_url} ({scheduler.polls} checks, {scheduler.unchanged} unchanged).")
+                return None
+        else: 
+            logs.append("Error: Neither 'Cloud Resume Download' nor 'Generate Cloud Link' button/pattern found on the intermediate page (Fast Cloud path).")
+            body_tag_p2 = soup2.find('body')
+            log_html(logs, "Intermediate Page Body (Fast Cloud - for debugging why buttons were missed)", str(body_tag_p2) if body_tag_p2 else html_content_p2)
+            logs.append("--- End Intermediate Page Body Snippet (Fast Cloud) ---")
+            return None
+    return None
+
+@timed_stage('strategy_drivebot')
+def gdflix_drivebot_strategy(session, page1_url, drivebot_initial_href, logs, cancel_event=None):
     # Helper variables for Drivebot path to avoid NameError if path isn't fully taken
     page2_drivebot_url = None
     html_content_p2_drivebot = None # To store HTML of index server page for debugging
     page3_drivebot_url = None
     html_content_p3_drivebot = None # To store HTML of generate link page for debugging
 
+    drivebot_step1_url = urljoin(page1_url, drivebot_initial_href)
+    logs.append(f"  Following DRIVEBOT link to (Index Server Page): {drivebot_step1_url}")
+    pause_strategy(upstream_pacing.delay_for(session, drivebot_step1_url), cancel_event)
 
     try:
-        while hops_count < MAX_REDIRECT_HOPS:
-            logs.append(f"[Hop {hops_count}] Fetching/Checking URL: {current_url}")
-            try:
-                response = session.get(current_url, allow_redirects=True, timeout=REQUEST_TIMEOUT)
-                response.raise_for_status()
-            except requests.exceptions.RequestException as e:
-                logs.append(f"  Error fetching {current_url}: {e}")
-                return None, logs
-
-            landed_url = response.url
-            html_content = response.text
-            status_code = response.status_code
-            logs.append(f"  Landed on: {landed_url} (Status: {status_code})")
-
-            next_hop_url = None
-            is_secondary_redirect = False
-            meta_match = re.search(r'<meta\s+http-equiv="refresh"\s+content="[^"]*url=([^"]+)"', html_content, re.IGNORECASE)
-            if meta_match:
-                extracted_url = meta_match.group(1).strip().split(';')[0]
-                potential_next = urljoin(landed_url, extracted_url)
-                if potential_next.split('#')[0] != landed_url.split('#')[0]:
-                    next_hop_url = potential_next
-                    logs.append(f"  Detected META refresh redirect to: {next_hop_url}")
-                    is_secondary_redirect = True
-
-            if not is_secondary_redirect:
-                js_match = re.search(r"location\.replace\(['\"]([^'\"]+)['\"]", html_content, re.IGNORECASE)
-                if js_match:
-                    extracted_url = js_match.group(1).strip().split('+document.location.hash')[0].strip("'\" ")
-                    potential_next = urljoin(landed_url, extracted_url)
-                    if potential_next.split('#')[0] != landed_url.split('#')[0]:
-                        next_hop_url = potential_next
-                        logs.append(f"  Detected JS location.replace redirect to: {next_hop_url}")
-                        is_secondary_redirect = True
-
-            if is_secondary_redirect and next_hop_url:
-                logs.append(f"  Following secondary redirect...")
-                current_url = next_hop_url
-                hops_count += 1
-                time.sleep(0.5)
-            else:
-                logs.append(f"  No further actionable secondary redirect found. Proceeding with content analysis.")
-                break
-
-        if hops_count >= MAX_REDIRECT_HOPS:
-            logs.append(f"Error: Exceeded maximum redirect hops ({MAX_REDIRECT_HOPS}). Stuck at {landed_url}")
-            return None, logs
-
-        if not landed_url or not html_content:
-             logs.append("Error: Failed to retrieve final page content after redirect checks.")
-             return None, logs
-
-        page1_url = landed_url
-        logs.append(f"--- Final Content Page HTML Snippet (URL: {page1_url}) ---")
-        logs.append(html_content[:3000] + ('...' if len(html_content) > 3000 else ''))
-        logs.append(f"--- End Final Content Page HTML Snippet ---")
-
-        if "cloudflare" in html_content.lower() or "checking your browser" in html_content.lower() or "challenge-platform" in html_content.lower():
-             logs.append("WARNING: Potential Cloudflare challenge page detected on final content page!")
-
-        soup1 = BeautifulSoup(html_content, PARSER)
-        possible_tags_p1 = soup1.find_all(['a', 'button'])
-        logs.append(f"Found {len(possible_tags_p1)} potential link/button tags on final content page ({page1_url}).")
-
-        # --- PRIORITY 1: Look for "PixeldrainDL" or "Pixeldrain" ---
-        logs.append("Searching for 'PixeldrainDL' or 'Pixeldrain' button text pattern on final content page...")
-        pixeldrain_link_tag = None
-        pixeldrain_pattern = re.compile(r'pixeldrain\s*(dl)?', re.IGNORECASE)
-        for tag in possible_tags_p1:
-             tag_text = tag.get_text(strip=True)
-             if pixeldrain_pattern.search(tag_text):
-                pixeldrain_link_tag = tag
-                logs.append(f"  Success: Found potential Pixeldrain tag: <{tag.name}> with text '{tag_text}'")
-                break
+        with timed_stage('drivebot_index', url=drivebot_step1_url):
+            response_drivebot_s1 = session.get(drivebot_step1_url, timeout=REQUEST_TIMEOUT, headers={'Referer': page1_url}, allow_redirects=True)
+        response_drivebot_s1.raise_for_status()
+        page2_drivebot_url = response_drivebot_s1.url 
+        html_content_p2_drivebot = response_drivebot_s1.text 
+        logs.append(f"  Landed on DRIVEBOT Index Server page: {page2_drivebot_url} (Status: {response_drivebot_s1.status_code})")
         
-        if pixeldrain_link_tag:
-             pixeldrain_href = pixeldrain_link_tag.get('href')
-             if not pixeldrain_href and pixeldrain_link_tag.name == 'button':
-                 parent_form = pixeldrain_link_tag.find_parent('form')
-                 if parent_form: 
-                     pixeldrain_href = parent_form.get('action')
-                     logs.append(f"    Extracted href from parent form action: {pixeldrain_href}")
-
-             if pixeldrain_href:
-                 pixeldrain_full_url = urljoin(page1_url, pixeldrain_href)
-                 logs.append(f"Success: Found Pixeldrain link URL: {pixeldrain_full_url}")
-                 return pixeldrain_full_url, logs
-             else:
-                 logs.append(f"  Info: Found Pixeldrain element ('{pixeldrain_link_tag.get_text(strip=True)}') but couldn't get href/action. Trying next priority.")
-        else:
-            logs.append("Info: 'PixeldrainDL' or 'Pixeldrain' button/pattern not found. Trying next priority.")
-
-
-        # --- PRIORITY 2: Look for "CLOUD DOWNLOAD [R2]" ---
-        logs.append("Searching for 'CLOUD DOWNLOAD [R2]' button text pattern on final content page...")
-        cloud_r2_link_tag = None
-        cloud_r2_pattern = re.compile(r'cloud\s+download\s+\[R2\]', re.IGNORECASE)
-        for tag in possible_tags_p1:
-            tag_text = tag.get_text(strip=True)
-            if cloud_r2_pattern.search(tag_text):
-                cloud_r2_link_tag = tag
-                logs.append(f"  Success: Found potential 'CLOUD DOWNLOAD [R2]' tag: <{tag.name}> with text '{tag_text}'")
-                break
+        drivebot_server_choice_tag = None
+        _, (_, server_matches) = analyze_html(html_content_p2_drivebot, DRIVEBOT_INDEX_PATTERNS)
+        if 'preferred' in server_matches:
+            match = server_matches['preferred']
+            drivebot_server_choice_tag = match['tag']
+            logs.append(f"    Found preferred DRIVEBOT 1 server choice: <{match['name']}> '{match['text']}'")
         
-        if cloud_r2_link_tag:
-            cloud_r2_href = cloud_r2_link_tag.get('href')
-            if not cloud_r2_href and cloud_r2_link_tag.name == 'button':
-                parent_form = cloud_r2_link_tag.find_parent('form')
-                if parent_form: 
-                    cloud_r2_href = parent_form.get('action')
-                    logs.append(f"    Extracted href from parent form action: {cloud_r2_href}")
-            
-            if cloud_r2_href:
-                final_download_link = urljoin(page1_url, cloud_r2_href)
-                logs.append(f"Success: Found R2 download link: {final_download_link}")
-                return final_download_link, logs
-            else:
-                logs.append(f"  Info: Found 'CLOUD DOWNLOAD [R2]' element ('{cloud_r2_link_tag.get_text(strip=True)}') but couldn't get href/action. Trying next priority.")
-        else:
-            logs.append("Info: 'CLOUD DOWNLOAD [R2]' button/pattern not found. Trying next priority.")
+        if not drivebot_server_choice_tag:
+            logs.append("    Preferred DRIVEBOT 1 not found, looking for any DRIVEBOT server link on Index Page.")
+            if 'generic' in server_matches:
+                match = server_matches['generic']
+                drivebot_server_choice_tag = match['tag']
+                logs.append(f"    Found generic DRIVEBOT server choice: <{match['name']}> '{match['text']}'")
         
-
-        # --- PRIORITY 3: Look for "Fast Cloud Download" ---
-        logs.append("Searching for 'Fast Cloud Download/DL' button text pattern on final content page...")
-        fast_cloud_link_tag = None
-        fast_cloud_pattern = re.compile(r'fast\s*cloud\s*(download|dl)', re.IGNORECASE)
-        for tag in possible_tags_p1:
-            tag_text = tag.get_text(strip=True)
-            if fast_cloud_pattern.search(tag_text):
-                fast_cloud_link_tag = tag
-                logs.append(f"  Success: Found potential 'Fast Cloud Download' tag: <{tag.name}> with text '{tag_text}'")
-                break
-
-        if fast_cloud_link_tag:
-            fast_cloud_href = fast_cloud_link_tag.get('href')
-            if not fast_cloud_href and fast_cloud_link_tag.name == 'button':
-                parent_form = fast_cloud_link_tag.find_parent('form')
-                if parent_form: 
-                    fast_cloud_href = parent_form.get('action')
-                    logs.append(f"    Extracted href from parent form action: {fast_cloud_href}")
-
-            if not fast_cloud_href:
-                logs.append(f"  Error: Found '{fast_cloud_link_tag.get_text(strip=True)}' (Fast Cloud) element but couldn't get href/action. Trying next priority.")
-            else:
-                # --- Start of Fast Cloud multi-step logic ---
-                intermediate_url = urljoin(page1_url, fast_cloud_href)
-                logs.append(f"Found intermediate link URL (from Fast Cloud button): {intermediate_url}")
-                time.sleep(1) 
-
-                logs.append(f"Fetching intermediate page URL (potentially with Generate button): {intermediate_url}")
-                fetch_headers_p2 = {'Referer': page1_url}
-                response_intermediate = session.get(intermediate_url, timeout=REQUEST_TIMEOUT, headers=fetch_headers_p2, allow_redirects=True)
-                response_intermediate.raise_for_status()
-                page2_url = response_intermediate.url 
-                html_content_p2 = response_intermediate.text
-                logs.append(f"Landed on intermediate page: {page2_url} (Status: {response_intermediate.status_code})")
-
-                logs.append(f"--- Intermediate Page HTML Content Snippet (URL: {page2_url}) ---")
-                logs.append(html_content_p2[:2000] + ('...' if len(html_content_p2) > 2000 else ''))
-                logs.append(f"--- End Intermediate Page HTML Snippet ---")
-                if "cloudflare" in html_content_p2.lower() or "checking your browser" in html_content_p2.lower():
-                     logs.append("WARNING: Potential Cloudflare challenge page detected on Intermediate Page!")
-
-                soup2 = BeautifulSoup(html_content_p2, PARSER)
-                possible_tags_p2 = soup2.find_all(['a', 'button'])
-                logs.append(f"Found {len(possible_tags_p2)} potential link/button tags on intermediate page ({page2_url}).")
-
-                resume_link_tag = None
-                resume_text_pattern = re.compile(r'cloud\s+resume\s+download', re.IGNORECASE)
-                logs.append("Searching for 'Cloud Resume Download' button text pattern on intermediate page...")
-                for tag in possible_tags_p2:
-                     tag_text = tag.get_text(strip=True)
-                     if resume_text_pattern.search(tag_text):
-                        resume_link_tag = tag
-                        logs.append(f"Success: Found final link tag directly: <{tag.name}> with text '{tag_text}'")
-                        break
-
-                if resume_link_tag:
-                    final_link_href = resume_link_tag.get('href')
-                    if not final_link_href and resume_link_tag.name == 'button':
-                         parent_form = resume_link_tag.find_parent('form')
-                         if parent_form: final_link_href = parent_form.get('action')
-
-                    if not final_link_href:
-                        logs.append(f"Error: Found '{resume_link_tag.get_text(strip=True)}' but no href/action.")
-                        return None, logs 
-
-                    final_download_link = urljoin(page2_url, final_link_href)
-                    logs.append(f"Success: Found final Cloud Resume link URL directly: {final_download_link}")
-                    return final_download_link, logs
+        if drivebot_server_choice_tag:
+            drivebot_server_next_url = None
+            drivebot_server_payload = {} 
+            drivebot_server_method = 'GET' 
+
+            if drivebot_server_choice_tag.name == 'a' and drivebot_server_choice_tag.get('href'):
+                drivebot_server_next_url = urljoin(page2_drivebot_url, drivebot_server_choice_tag.get('href'))
+                logs.append(f"    DRIVEBOT server choice is an <a> tag. URL: {drivebot_server_next_url}")
+                drivebot_server_method = 'GET'
+            elif drivebot_server_choice_tag.name == 'button' or (drivebot_server_choice_tag.name == 'input' and drivebot_server_choice_tag.get('type') in ['submit', 'button']):
+                parent_form_db_s2 = drivebot_server_choice_tag.find_parent('form')
+                if parent_form_db_s2:
+                    logs.append(f"    DRIVEBOT server choice <{drivebot_server_choice_tag.name}> is in a form.")
+                    form_action = parent_form_db_s2.get('action')
+                    drivebot_server_next_url = urljoin(page2_drivebot_url, form_action if form_action else page2_drivebot_url)
+
+                    drivebot_server_method = parent_form_db_s2.get('method', 'GET').upper()
+                    logs.append(f"      Form method: {drivebot_server_method}, Action URL: {drivebot_server_next_url}")
+
+                    for input_tag_s2 in parent_form_db_s2.find_all('input'):
+                        name = input_tag_s2.get('name')
+                        value = input_tag_s2.get('value')
+                        if name: 
+                            drivebot_server_payload[name] = value if value is not None else ''
+                            logs.append(f"        Extracted form input: name='{name}', value='{value}'")
+                    
+                    btn_name = drivebot_server_choice_tag.get('name')
+                    btn_value = drivebot_server_choice_tag.get('value')
+                    if btn_name and drivebot_server_choice_tag.name in ['button', 'input']: 
+                        drivebot_server_payload[btn_name] = btn_value if btn_value is not None else ''
+                        logs.append(f"        Added button data: name='{btn_name}', value='{btn_value}'")
                 else:
-                    logs.append("Info: 'Cloud Resume Download' not found directly. Checking for 'Generate Cloud Link' button...")
-                    generate_tag = None
-                    generate_tag_by_id = soup2.find('button', id='cloud')
-                    if generate_tag_by_id:
-                        logs.append("  Found 'Generate Cloud Link' button by id='cloud'.")
-                        generate_tag = generate_tag_by_id
+                    logs.append(f"    Error: DRIVEBOT server choice <{drivebot_server_choice_tag.name}> found, but not within a <form>. Cannot determine action.")
+                    if html_content_p2_drivebot: 
+                        log_html(logs, f"DRIVEBOT Index Server Page HTML ({page2_drivebot_url}) for missing form", html_content_p2_drivebot)
                     else:
-                        logs.append("  Button with id='cloud' not found. Searching by text pattern 'generate cloud link'...")
-                        generate_pattern = re.compile(r'generate\s+cloud\s+link', re.IGNORECASE)
-                        for tag in possible_tags_p2:
-                            tag_text = tag.get_text(strip=True)
-                            if generate_pattern.search(tag_text):
-                                generate_tag = tag
-                                logs.append(f"  Success: Found potential generate tag by text: <{tag.name}> with text '{tag_text}'")
-                                break
+                        logs.append(f"    Debug: html_content_p2_drivebot was not available for logging.")
+            else: 
+                logs.append(f"    Warning: DRIVEBOT server choice tag <{drivebot_server_choice_tag.name}> type unhandled or lacks href. Attempting to find parent form action if any.")
+                parent_form_db_s2_fallback = drivebot_server_choice_tag.find_parent('form')
+                if parent_form_db_s2_fallback:
+                    form_action_fallback = parent_form_db_s2_fallback.get('action')
+                    drivebot_server_next_url = urljoin(page2_drivebot_url, form_action_fallback if form_action_fallback else page2_drivebot_url)
+                    drivebot_server_method = parent_form_db_s2_fallback.get('method', 'GET').upper()
+                    logs.append(f"      Fallback: Found parent form. Method: {drivebot_server_method}, Action URL: {drivebot_server_next_url}")
+            
+            if drivebot_server_next_url:
+                logs.append(f"    Proceeding to DRIVEBOT Generate Link Page. Method: {drivebot_server_method}, URL: {drivebot_server_next_url}, Payload: {drivebot_server_payload}")
+                pause_strategy(upstream_pacing.delay_for(session, drivebot_server_next_url), cancel_event)
+                
+                response_drivebot_s2 = None
+                request_headers_s2 = {'Referer': page2_drivebot_url}
+                with timed_stage('drivebot_server', url=drivebot_server_next_url, method=drivebot_server_method):
+                    if drivebot_server_method == 'POST':
+                        response_drivebot_s2 = session.post(drivebot_server_next_url, data=drivebot_server_payload, timeout=REQUEST_TIMEOUT, headers=request_headers_s2, allow_redirects=True)
+                    else: # GET
+                        response_drivebot_s2 = session.get(drivebot_server_next_url, params=drivebot_server_payload, timeout=REQUEST_TIMEOUT, headers=request_headers_s2, allow_redirects=True)
+                
+                response_drivebot_s2.raise_for_status()
+                page3_drivebot_url = response_drivebot_s2.url 
+                html_content_p3_drivebot = response_drivebot_s2.text 
+                logs.append(f"    Landed on DRIVEBOT Generate Link page: {page3_drivebot_url} (Status: {response_drivebot_s2.status_code})")
+                
+                generate_link_button = None
+                _, (_, generate_matches) = analyze_html(html_content_p3_drivebot, DRIVEBOT_GENERATE_PATTERNS, ('a', 'button', 'input'))
+                if 'generate' in generate_matches:
+                    match = generate_matches['generate']
+                    generate_link_button = match['tag']
+                    logs.append(f"      Found 'Generate Link' element: <{match['name']}> '{match['text']}'")
+                
+                if generate_link_button:
+                    post_url_generate = page3_drivebot_url 
+                    post_data_generate = {}
+                    http_method_generate = 'POST' 
+
+                    parent_form_generate = generate_link_button.find_parent('form')
+                    if parent_form_generate:
+                        logs.append("      'Generate Link' element is in a form. Extracting details.")
+                        form_action_gen = parent_form_generate.get('action')
+                        post_url_generate = urljoin(page3_drivebot_url, form_action_gen if form_action_gen else page3_drivebot_url)
+                        logs.append(f"        Form action URL: {post_url_generate}")
+                        
+                        http_method_generate = parent_form_generate.get('method', 'POST').upper()
+                        logs.append(f"        Form method: {http_method_generate}")
+
+                        for input_tag_gen in parent_form_generate.find_all('input'):
+                            name = input_tag_gen.get('name')
+                            value = input_tag_gen.get('value')
+                            if name:
+                                post_data_generate[name] = value if value is not None else ''
+                                logs.append(f"          Extracted form input: name='{name}', value='{value}'")
+                        
+                        if generate_link_button.name in ['input', 'button'] and generate_link_button.get('name'):
+                            btn_name_gen = generate_link_button.get('name')
+                            btn_value_gen = generate_link_button.get('value', '') 
+                            post_data_generate[btn_name_gen] = btn_value_gen
+                            logs.append(f"          Added button data: name='{btn_name_gen}', value='{btn_value_gen}'")
                     
-                    if generate_tag:
-                        logs.append(f"Found 'Generate Cloud Link' button: <{generate_tag.name}> id='{generate_tag.get('id', 'N/A')}'")
-                        logs.append("Attempting to mimic the JavaScript POST request...")
-
-                        post_data = {}
-                        parent_form = generate_tag.find_parent('form')
-                        if parent_form:
-                            logs.append("  Found parent form for generate button. Extracting hidden inputs...")
-                            for input_tag in parent_form.find_all('input', type='hidden'):
-                                name = input_tag.get('name')
-                                value = input_tag.get('value')
-                                if name:
-                                    post_data[name] = value if value is not None else ''
-                                    logs.append(f"    Extracted hidden input: name='{name}', value='{value}'")
-                            btn_name = generate_tag.get('name')
-                            btn_value = generate_tag.get('value')
-                            if btn_name and generate_tag.name == 'button': 
-                                 post_data[btn_name] = btn_value if btn_value is not None else ''
-                                 logs.append(f"    Added button data: name='{btn_name}', value='{btn_value}'")
-
-                        default_post_data = {'action': 'cloud', 'key': '08df4425e31c4330a1a0a3cefc45c19e84d0a192', 'action_token': ''}
-                        final_post_data = {**default_post_data, **post_data}
-                        if 'action' not in final_post_data: final_post_data['action'] = 'cloud'
-                        logs.append(f"  Final POST data payload: {final_post_data}")
-
-                        parsed_uri = urlparse(page2_url)
-                        hostname = parsed_uri.netloc
-                        post_headers = {
-                            'Referer': page2_url,
-                            'x-token': hostname,
-                            'Accept': 'application/json, text/javascript, */*; q=0.01',
-                            'X-Requested-With': 'XMLHttpRequest',
-                        }
-                        logs.append(f"  POST headers (excluding session defaults): {post_headers}")
-
-                        logs.append(f"Sending POST request to: {page2_url}")
-                        page3_fc_url = None # Differentiate from drivebot's page3_url
-                        try:
-                            post_response = session.post(page2_url, data=final_post_data, headers=post_headers, timeout=REQUEST_TIMEOUT)
-                            logs.append(f"  POST response status: {post_response.status_code}")
-                            content_type = post_response.headers.get('Content-Type', '').lower()
-                            response_text = post_response.text
-                            extracted_poll_url = False
-
-                            if 'application/json' in content_type:
-                                try:
-                                    response_data = post_response.json()
-                                    logs.append(f"  POST response JSON (from header): {response_data}")
-                                    if post_response.status_code == 200 and not response_data.get('error'):
-                                         poll_url_relative = response_data.get('visit_url') or response_data.get('url')
-                                         if poll_url_relative:
-                                             page3_fc_url = urljoin(page2_url, poll_url_relative)
-                                             logs.append(f"  POST successful. Extracted polling URL: {page3_fc_url}")
-                                             extracted_poll_url = True
-                                         else:
-                                             logs.append("  Error: POST success status but no 'visit_url' or 'url' key found in JSON.")
-                                    elif response_data.get('error'):
-                                         error_msg = response_data.get('message', 'Unknown error from server POST response')
-                                         logs.append(f"  Error from POST JSON response: {error_msg} (Status: {post_response.status_code})")
-                                    else:
-                                         logs.append(f"  Error: POST returned status {post_response.status_code} with JSON, but format unclear.")
-                                         logs.append(f"  Response JSON: {response_data}")
-                                except json.JSONDecodeError:
-                                    logs.append(f"  Error: Failed to decode JSON response, though Content-Type was JSON.")
-                                    logs.append(f"  Response text (first 500 chars): {response_text[:500]}")
-                            elif post_response.status_code == 200:
-                                logs.append(f"  Info: POST Content-Type is '{content_type}', not JSON. Status 200 received. Attempting to parse body as JSON anyway...")
-                                try:
-                                    response_data = json.loads(response_text)
-                                    logs.append(f"  Success: Parsed response body as JSON despite incorrect Content-Type.")
-                                    logs.append(f"  Parsed JSON data: {response_data}")
-                                    if not response_data.get('error'):
-                                        poll_url_relative = response_data.get('visit_url') or response_data.get('url')
-                                        if poll_url_relative:
-                                            page3_fc_url = urljoin(page2_url, poll_url_relative)
-                                            logs.append(f"  Extracted polling URL from parsed text: {page3_fc_url}")
-                                            extracted_poll_url = True
-                                        else:
-                                            logs.append("  Error: Parsed JSON successfully but no 'visit_url' or 'url' key found.")
-                                    elif response_data.get('error'):
-                                        error_msg = response_data.get('message', 'Unknown error in parsed JSON')
-                                        logs.append(f"  Error found in parsed JSON: {error_msg}")
-                                    else:
-                                        logs.append("  Warning: Parsed JSON but structure is unexpected (no error/url keys).")
-                                except json.JSONDecodeError:
-                                    logs.append(f"  Error: Failed to decode potentially JSON response body (Content-Type was '{content_type}', Status 200).")
-                                    logs.append(f"  Response text (first 500 chars): {response_text[:500]}")
-                            else:
-                                 logs.append(f"  Error: POST response status was {post_response.status_code} or Content-Type '{content_type}' was unexpected.")
-                                 if not response_text.strip(): logs.append("  Response body was empty.")
-                                 else: logs.append(f"  Response text (first 500 chars): {response_text[:500]}")
-                                 if "cloudflare" in response_text.lower() or "captcha" in response_text.lower():
-                                     logs.append("  Hint: Cloudflare/Captcha challenge likely blocked the POST request.")
-
-                            if not extracted_poll_url:
-                                 logs.append(f"  Error: Failed to obtain a valid polling URL from the POST response.")
-                                 try:
-                                     if post_response.status_code != 200: post_response.raise_for_status()
-                                 except requests.exceptions.HTTPError as http_err: logs.append(f"  HTTP Error details: {http_err}")
-                                 return None, logs 
-                        except requests.exceptions.RequestException as post_err:
-                            logs.append(f"  Error during POST request network operation: {post_err}")
-                            return None, logs 
-
-                        if page3_fc_url:
-                            logs.append(f"Starting polling loop for {page3_fc_url}...")
-                            start_time = time.time()
-                            while time.time() - start_time < GENERATION_TIMEOUT:
-                                elapsed_time = time.time() - start_time
-                                remaining_time = GENERATION_TIMEOUT - elapsed_time
-                                wait_time = min(POLL_INTERVAL, remaining_time)
-                                if wait_time <= 0: break
-
-                                logs.append(f"  Polling: Waiting {wait_time:.1f}s before checking {page3_fc_url}...")
-                                time.sleep(wait_time)
-                                poll_landed_url = None
-                                try:
-                                    poll_headers = {'Referer': page3_fc_url} 
-                                    poll_response = session.get(page3_fc_url, timeout=REQUEST_TIMEOUT, headers=poll_headers, allow_redirects=True)
-                                    poll_landed_url = poll_response.url
-                                    poll_status = poll_response.status_code
-                                    poll_html = poll_response.text
-                                    logs.append(f"  Polling: GET {page3_fc_url} -> Status {poll_status}, Landed on {poll_landed_url}")
-
-                                    if poll_status != 200:
-                                        logs.append(f"  Warning: Polling status {poll_status}, continuing poll loop.")
-                                        continue
-
-                                    poll_soup = BeautifulSoup(poll_html, PARSER)
-                                    polled_resume_tag = None
-                                    for tag in poll_soup.find_all(['a', 'button']):
-                                        if resume_text_pattern.search(tag.get_text(strip=True)): 
-                                            polled_resume_tag = tag
-                                            logs.append(f"    Success: Found 'Cloud Resume Download' after polling on {poll_landed_url}!")
-                                            break
-                                    
-                                    if polled_resume_tag:
-                                        final_link_href = polled_resume_tag.get('href')
-                                        if not final_link_href and polled_resume_tag.name == 'button':
-                                            parent_form_poll = polled_resume_tag.find_parent('form')
-                                            if parent_form_poll: final_link_href = parent_form_poll.get('action')
-
-                                        if not final_link_href:
-                                            logs.append(f"    Error: Found polled '{polled_resume_tag.get_text(strip=True)}' element but no href/action.")
-                                            return None, logs
-
-                                        final_download_link = urljoin(poll_landed_url, final_link_href)
-                                        logs.append(f"Success: Found final Cloud Resume link URL after polling: {final_download_link}")
-                                        return final_download_link, logs
-                                except requests.exceptions.Timeout:
-                                     logs.append(f"  Warning: Timeout during polling request to {page3_fc_url}. Will retry.")
-                                except requests.exceptions.RequestException as poll_err:
-                                     logs.append(f"  Warning: Network error during polling request: {poll_err}. Will retry.")
-                                except Exception as parse_err:
-                                     logs.append(f"  Warning: Error parsing polled page {poll_landed_url or page3_fc_url}: {parse_err}. Will retry.")
-
-                            logs.append(f"Error: Link generation timed out after {GENERATION_TIMEOUT}s of polling {page3_fc_url}.")
-                            return None, logs 
+                    elif generate_link_button.name == 'a' and generate_link_button.get('href') and generate_link_button.get('href').strip() not in ['#', 'javascript:void(0);', '']:
+                        post_url_generate = urljoin(page3_drivebot_url, generate_link_button.get('href'))
+                        http_method_generate = 'GET' 
+                        logs.append(f"      'Generate Link' is an <a> tag with href. Using GET to: {post_url_generate}")
                     else: 
-                        logs.append("Error: Neither 'Cloud Resume Download' nor 'Generate Cloud Link' button/pattern found on the intermediate page (Fast Cloud path).")
-                        body_tag_p2 = soup2.find('body')
-                        logs.append("--- Intermediate Page Body Snippet (Fast Cloud - for debugging why buttons were missed) ---")
-                        logs.append(str(body_tag_p2)[:1000] + '...' if body_tag_p2 else html_content_p2[:1000] + '...')
-                        logs.append("--- End Intermediate Page Body Snippet (Fast Cloud) ---")
-                        return None, logs 
-        else: 
-            logs.append("Info: 'Fast Cloud Download/DL' button/pattern not found. Trying next priority.")
-
-        # --- PRIORITY 4: Look for "DRIVEBOT" ---
-        logs.append("Searching for 'DRIVEBOT' button text pattern on final content page (Priority 4)...")
-        drivebot_initial_tag = None
-        drivebot_initial_pattern = re.compile(r'DRIVEBOT', re.IGNORECASE)
-        for tag in possible_tags_p1: 
-            tag_text = tag.get_text(strip=True)
-            if drivebot_initial_pattern.search(tag_text):
-                drivebot_initial_tag = tag
-                logs.append(f"  Success: Found potential DRIVEBOT tag: <{tag.name}> with text '{tag_text}'")
-                break
-
-        if drivebot_initial_tag:
-            drivebot_initial_href = drivebot_initial_tag.get('href')
-            if not drivebot_initial_href and drivebot_initial_tag.name == 'button':
-                parent_form_db_init = drivebot_initial_tag.find_parent('form')
-                if parent_form_db_init:
-                    drivebot_initial_href = parent_form_db_init.get('action')
-                    logs.append(f"    Extracted href from parent form action: {drivebot_initial_href}")
-
-            if drivebot_initial_href:
-                drivebot_step1_url = urljoin(page1_url, drivebot_initial_href)
-                logs.append(f"  Following DRIVEBOT link to (Index Server Page): {drivebot_step1_url}")
-                time.sleep(1)
-
-                try:
-                    response_drivebot_s1 = session.get(drivebot_step1_url, timeout=REQUEST_TIMEOUT, headers={'Referer': page1_url}, allow_redirects=True)
-                    response_drivebot_s1.raise_for_status()
-                    page2_drivebot_url = response_drivebot_s1.url 
-                    html_content_p2_drivebot = response_drivebot_s1.text 
-                    logs.append(f"  Landed on DRIVEBOT Index Server page: {page2_drivebot_url} (Status: {response_drivebot_s1.status_code})")
+                        logs.append("      'Generate Link' element not in a form and not a direct <a> link. Assuming POST to current page. This might need JS analysis if it fails.")
+                        post_url_generate = page3_drivebot_url 
                     
-                    soup_p2_drivebot = BeautifulSoup(html_content_p2_drivebot, PARSER)
-                    drivebot_server_choice_tag = None
-                    drivebot_server_pattern = re.compile(r'DRIVEBOT\s*1(?:\s*\[R1\])?', re.IGNORECASE)
-                    generic_drivebot_server_pattern = re.compile(r'DRIVEBOT', re.IGNORECASE) 
+                    check_strategy_cancelled(cancel_event)
+                    generate_headers = {
+                        'Referer': page3_drivebot_url,
+                        'X-Requested-With': 'XMLHttpRequest', 
+                        'Accept': '*/*' 
+                    }
                     
-                    possible_server_tags = soup_p2_drivebot.find_all(['a', 'button'])
-                    for tag in possible_server_tags:
-                        tag_text = tag.get_text(strip=True)
-                        if drivebot_server_pattern.search(tag_text):
-                            drivebot_server_choice_tag = tag
-                            logs.append(f"    Found preferred DRIVEBOT 1 server choice: <{tag.name}> '{tag_text}'")
-                            break
+                    response_generate = None
+                    with timed_stage('drivebot_generate', url=post_url_generate, method=http_method_generate):
+                        if http_method_generate == 'POST':
+                            logs.append(f"      Sending POST request to: {post_url_generate} with data: {post_data_generate}")
+                            response_generate = session.post(post_url_generate, data=post_data_generate, headers=generate_headers, timeout=REQUEST_TIMEOUT, allow_redirects=True)
+                        else: # GET
+                            logs.append(f"      Sending GET request to: {post_url_generate} with params: {post_data_generate}") 
+                            response_generate = session.get(post_url_generate, params=post_data_generate, headers=generate_headers, timeout=REQUEST_TIMEOUT, allow_redirects=True)
+
+                    response_generate.raise_for_status()
+                    page4_drivebot_url = response_generate.url 
+                    html_content_p4_drivebot = response_generate.text
+                    logs.append(f"      Landed on/Received content from 'Generate Link' action: {page4_drivebot_url} (Status: {response_generate.status_code})")
                     
-                    if not drivebot_server_choice_tag:
-                        logs.append("    Preferred DRIVEBOT 1 not found, looking for any DRIVEBOT server link on Index Page.")
-                        for tag in possible_server_tags:
-                            tag_text = tag.get_text(strip=True)
-                            if generic_drivebot_server_pattern.search(tag_text):
-                                drivebot_server_choice_tag = tag
-                                logs.append(f"    Found generic DRIVEBOT server choice: <{tag.name}> '{tag_text}'")
-                                break
+                    final_dl_link = None
                     
-                    if drivebot_server_choice_tag:
-                        drivebot_server_next_url = None
-                        drivebot_server_payload = {} 
-                        drivebot_server_method = 'GET' 
-
-                        if drivebot_server_choice_tag.name == 'a' and drivebot_server_choice_tag.get('href'):
-                            drivebot_server_next_url = urljoin(page2_drivebot_url, drivebot_server_choice_tag.get('href'))
-                            logs.append(f"    DRIVEBOT server choice is an <a> tag. URL: {drivebot_server_next_url}")
-                            drivebot_server_method = 'GET'
-                        elif drivebot_server_choice_tag.name == 'button' or (drivebot_server_choice_tag.name == 'input' and drivebot_server_choice_tag.get('type') in ['submit', 'button']):
-                            parent_form_db_s2 = drivebot_server_choice_tag.find_parent('form')
-                            if parent_form_db_s2:
-                                logs.append(f"    DRIVEBOT server choice <{drivebot_server_choice_tag.name}> is in a form.")
-                                form_action = parent_form_db_s2.get('action')
-                                drivebot_server_next_url = urljoin(page2_drivebot_url, form_action if form_action else page2_drivebot_url)
-
-                                drivebot_server_method = parent_form_db_s2.get('method', 'GET').upper()
-                                logs.append(f"      Form method: {drivebot_server_method}, Action URL: {drivebot_server_next_url}")
-
-                                for input_tag_s2 in parent_form_db_s2.find_all('input'):
-                                    name = input_tag_s2.get('name')
-                                    value = input_tag_s2.get('value')
-                                    if name: 
-                                        drivebot_server_payload[name] = value if value is not None else ''
-                                        logs.append(f"        Extracted form input: name='{name}', value='{value}'")
-                                
-                                btn_name = drivebot_server_choice_tag.get('name')
-                                btn_value = drivebot_server_choice_tag.get('value')
-                                if btn_name and drivebot_server_choice_tag.name in ['button', 'input']: 
-                                    drivebot_server_payload[btn_name] = btn_value if btn_value is not None else ''
-                                    logs.append(f"        Added button data: name='{btn_name}', value='{btn_value}'")
-                            else:
-                                logs.append(f"    Error: DRIVEBOT server choice <{drivebot_server_choice_tag.name}> found, but not within a <form>. Cannot determine action.")
-                                if html_content_p2_drivebot: 
-                                    logs.append(f"--- BEGIN HTML of DRIVEBOT Index Server Page ({page2_drivebot_url}) for missing form ---")
-                                    logs.append(html_content_p2_drivebot) 
-                                    logs.append(f"--- END HTML of DRIVEBOT Index Server Page ---")
-                                else:
-                                    logs.append(f"    Debug: html_content_p2_drivebot was not available for logging.")
-                        else: 
-                            logs.append(f"    Warning: DRIVEBOT server choice tag <{drivebot_server_choice_tag.name}> type unhandled or lacks href. Attempting to find parent form action if any.")
-                            parent_form_db_s2_fallback = drivebot_server_choice_tag.find_parent('form')
-                            if parent_form_db_s2_fallback:
-                                form_action_fallback = parent_form_db_s2_fallback.get('action')
-                                drivebot_server_next_url = urljoin(page2_drivebot_url, form_action_fallback if form_action_fallback else page2_drivebot_url)
-                                drivebot_server_method = parent_form_db_s2_fallback.get('method', 'GET').upper()
-                                logs.append(f"      Fallback: Found parent form. Method: {drivebot_server_method}, Action URL: {drivebot_server_next_url}")
-                        
-                        if drivebot_server_next_url:
-                            logs.append(f"    Proceeding to DRIVEBOT Generate Link Page. Method: {drivebot_server_method}, URL: {drivebot_server_next_url}, Payload: {drivebot_server_payload}")
-                            time.sleep(1)
-                            
-                            response_drivebot_s2 = None
-                            request_headers_s2 = {'Referer': page2_drivebot_url}
-                            if drivebot_server_method == 'POST':
-                                response_drivebot_s2 = session.post(drivebot_server_next_url, data=drivebot_server_payload, timeout=REQUEST_TIMEOUT, headers=request_headers_s2, allow_redirects=True)
-                            else: # GET
-                                response_drivebot_s2 = session.get(drivebot_server_next_url, params=drivebot_server_payload, timeout=REQUEST_TIMEOUT, headers=request_headers_s2, allow_redirects=True)
-                            
-                            response_drivebot_s2.raise_for_status()
-                            page3_drivebot_url = response_drivebot_s2.url 
-                            html_content_p3_drivebot = response_drivebot_s2.text 
-                            logs.append(f"    Landed on DRIVEBOT Generate Link page: {page3_drivebot_url} (Status: {response_drivebot_s2.status_code})")
-                            
-                            soup_p3_drivebot = BeautifulSoup(html_content_p3_drivebot, PARSER)
-                            generate_link_button = None
-                            generate_link_pattern = re.compile(r'Generate Link', re.IGNORECASE)
-                            possible_gen_tags = soup_p3_drivebot.find_all(['a', 'button', 'input'])
-                            for tag in possible_gen_tags:
-                                text_content = ""
-                                if tag.name == 'input':
-                                    if tag.get('type') in ['button', 'submit']:
-                                        text_content = tag.get('value', '')
-                                else: 
-                                    text_content = tag.get_text(strip=True)
-                                
-                                if generate_link_pattern.search(text_content):
-                                    generate_link_button = tag
-                                    logs.append(f"      Found 'Generate Link' element: <{tag.name}> '{text_content}'")
-                                    break
-                            
-                            if generate_link_button:
-                                post_url_generate = page3_drivebot_url 
-                                post_data_generate = {}
-                                http_method_generate = 'POST' 
-
-                                parent_form_generate = generate_link_button.find_parent('form')
-                                if parent_form_generate:
-                                    logs.append("      'Generate Link' element is in a form. Extracting details.")
-                                    form_action_gen = parent_form_generate.get('action')
-                                    post_url_generate = urljoin(page3_drivebot_url, form_action_gen if form_action_gen else page3_drivebot_url)
-                                    logs.append(f"        Form action URL: {post_url_generate}")
-                                    
-                                    http_method_generate = parent_form_generate.get('method', 'POST').upper()
-                                    logs.append(f"        Form method: {http_method_generate}")
-
-                                    for input_tag_gen in parent_form_generate.find_all('input'):
-                                        name = input_tag_gen.get('name')
-                                        value = input_tag_gen.get('value')
-                                        if name:
-                                            post_data_generate[name] = value if value is not None else ''
-                                            logs.append(f"          Extracted form input: name='{name}', value='{value}'")
-                                    
-                                    if generate_link_button.name in ['input', 'button'] and generate_link_button.get('name'):
-                                        btn_name_gen = generate_link_button.get('name')
-                                        btn_value_gen = generate_link_button.get('value', '') 
-                                        post_data_generate[btn_name_gen] = btn_value_gen
-                                        logs.append(f"          Added button data: name='{btn_name_gen}', value='{btn_value_gen}'")
-                                
-                                elif generate_link_button.name == 'a' and generate_link_button.get('href') and generate_link_button.get('href').strip() not in ['#', 'javascript:void(0);', '']:
-                                    post_url_generate = urljoin(page3_drivebot_url, generate_link_button.get('href'))
-                                    http_method_generate = 'GET' 
-                                    logs.append(f"      'Generate Link' is an <a> tag with href. Using GET to: {post_url_generate}")
-                                else: 
-                                    logs.append("      'Generate Link' element not in a form and not a direct <a> link. Assuming POST to current page. This might need JS analysis if it fails.")
-                                    post_url_generate = page3_drivebot_url 
-                                
-                                generate_headers = {
-                                    'Referer': page3_drivebot_url,
-                                    'X-Requested-With': 'XMLHttpRequest', 
-                                    'Accept': '*/*' 
-                                }
-                                
-                                response_generate = None
-                                if http_method_generate == 'POST':
-                                    logs.append(f"      Sending POST request to: {post_url_generate} with data: {post_data_generate}")
-                                    response_generate = session.post(post_url_generate, data=post_data_generate, headers=generate_headers, timeout=REQUEST_TIMEOUT, allow_redirects=True)
-                                else: # GET
-                                    logs.append(f"      Sending GET request to: {post_url_generate} with params: {post_data_generate}") 
-                                    response_generate = session.get(post_url_generate, params=post_data_generate, headers=generate_headers, timeout=REQUEST_TIMEOUT, allow_redirects=True)
-
-                                response_generate.raise_for_status()
-                                page4_drivebot_url = response_generate.url 
-                                html_content_p4_drivebot = response_generate.text
-                                logs.append(f"      Landed on/Received content from 'Generate Link' action: {page4_drivebot_url} (Status: {response_generate.status_code})")
-                                
-                                soup_p4_drivebot = BeautifulSoup(html_content_p4_drivebot, PARSER)
-                                final_dl_link = None
-                                
-                                link_input_tag = soup_p4_drivebot.find('input', {'value': re.compile(r'https?://[^\s"\']*\.gdindex\.lol[^\s"\']*')})
-                                if link_input_tag and link_input_tag.get('value'):
-                                    final_dl_link = link_input_tag.get('value').strip()
-                                    logs.append(f"Success: Found final Drivebot download link in input field: {final_dl_link}")
-                                
-                                if not final_dl_link:
-                                    link_anchor_tag = soup_p4_drivebot.find('a', {'href': re.compile(r'https?://[^\s"\']*\.gdindex\.lol[^\s"\']*')})
-                                    if link_anchor_tag and link_anchor_tag.get('href'):
-                                        final_dl_link = link_anchor_tag.get('href').strip()
-                                        logs.append(f"Success: Found final Drivebot download link in <a> tag: {final_dl_link}")
-
-                                if final_dl_link:
-                                    return final_dl_link, logs 
-                                else:
-                                    logs.append("        Error: Could not find the final gdindex.lol link in the response after 'Generate Link' action.")
-                                    if html_content_p4_drivebot:
-                                        logs.append(f"--- Drivebot Page 4 HTML Snippet (link not found) ---")
-                                        logs.append(html_content_p4_drivebot[:2000] + ('...' if len(html_content_p4_drivebot) > 2000 else ''))
-                                        logs.append(f"--- End Drivebot Page 4 HTML Snippet ---")
-                            else:
-                                logs.append("    Error: 'Generate Link' button/element not found on Drivebot page 3.")
-                                if html_content_p3_drivebot:
-                                    logs.append(f"--- Drivebot Page 3 HTML Snippet ('Generate Link' not found) ---")
-                                    logs.append(html_content_p3_drivebot[:2000] + ('...' if len(html_content_p3_drivebot) > 2000 else ''))
-                                    logs.append(f"--- End Drivebot Page 3 HTML Snippet ---")
-                        else:
-                            logs.append("  Error: Could not determine next URL or method for DRIVEBOT server choice on Index page.")
+                    _, (link_input_tag, link_anchor_tag) = parse_with_fallback(html_content_p4_drivebot, find_gdindex_link_tags, found=any)
+                    if link_input_tag and link_input_tag.get('value'):
+                        final_dl_link = link_input_tag.get('value').strip()
+                        logs.append(f"Success: Found final Drivebot download link in input field: {final_dl_link}")
+                    
+                    if not final_dl_link:
+                        if link_anchor_tag and link_anchor_tag.get('href'):
+                            final_dl_link = link_anchor_tag.get('href').strip()
+                            logs.append(f"Success: Found final Drivebot download link in <a> tag: {final_dl_link}")
+
+                    if final_dl_link:
+                        return final_dl_link
                     else:
-                        logs.append("  Error: Could not find a DRIVEBOT server choice button/link on Index page.")
-                        if html_content_p2_drivebot:
-                            logs.append(f"--- Drivebot Index Server Page HTML Snippet (server choice not found) ---")
-                            logs.append(html_content_p2_drivebot[:2000] + ('...' if len(html_content_p2_drivebot) > 2000 else ''))
-                            logs.append(f"--- End Drivebot Index Server Page HTML Snippet ---")
-
-                except requests.exceptions.RequestException as e_db_process:
-                    current_step_url_for_error = "unknown_drivebot_step"
-                    if 'page3_drivebot_url' in locals() and page3_drivebot_url: current_step_url_for_error = page3_drivebot_url
-                    elif 'page2_drivebot_url' in locals() and page2_drivebot_url: current_step_url_for_error = page2_drivebot_url
-                    elif 'drivebot_step1_url' in locals() and drivebot_step1_url: current_step_url_for_error = drivebot_step1_url
-                    logs.append(f"  Error during DRIVEBOT multi-step process (around URL {current_step_url_for_error}): {e_db_process}")
+                        logs.append("        Error: Could not find the final gdindex.lol link in the response after 'Generate Link' action.")
+                        if html_content_p4_drivebot:
+                            log_html(logs, "Drivebot Page 4 HTML (link not found)", html_content_p4_drivebot)
+                            logs.append(f"--- End Drivebot Page 4 HTML Snippet ---")
+                else:
+                    logs.append("    Error: 'Generate Link' button/element not found on Drivebot page 3.")
+                    if html_content_p3_drivebot:
+                        log_html(logs, "Drivebot Page 3 HTML ('Generate Link' not found)", html_content_p3_drivebot)
+                        logs.append(f"--- End Drivebot Page 3 HTML Snippet ---")
             else:
-                logs.append("  Info: Found DRIVEBOT element on initial page but couldn't get href/action. Trying next priority (or ending).")
+                logs.append("  Error: Could not determine next URL or method for DRIVEBOT server choice on Index page.")
         else:
-            logs.append("Info: 'DRIVEBOT' button/pattern not found on initial page.")
-        
+            logs.append("  Error: Could not find a DRIVEBOT server choice button/link on Index page.")
+            if html_content_p2_drivebot:
+                log_html(logs, "Drivebot Index Server Page HTML (server choice not found)", html_content_p2_drivebot)
+                logs.append(f"--- End Drivebot Index Server Page HTML Snippet ---")
+
+    except requests.exceptions.RequestException as e_db_process:
+        current_step_url_for_error = "unknown_drivebot_step"
+        if 'page3_drivebot_url' in locals() and page3_drivebot_url: current_step_url_for_error = page3_drivebot_url
+        elif 'page2_drivebot_url' in locals() and page2_drivebot_url: current_step_url_for_error = page2_drivebot_url
+        elif 'drivebot_step1_url' in locals() and drivebot_step1_url: current_step_url_for_error = drivebot_step1_url
+        logs.append(f"  Error during DRIVEBOT multi-step process (around URL {current_step_url_for_error}): {e_db_process}")
+    return None
+
+# --- Strategy Health ---
+GDFLIX_STRATEGIES = ('pixeldrain', 'r2', 'fast_cloud', 'drivebot') # default priority
+GDFLIX_STRATEGY_NAMES = {'pixeldrain': 'Pixeldrain', 'r2': 'R2', 'fast_cloud': 'Fast Cloud', 'drivebot': 'Drivebot'}
+GDFLIX_STRATEGY_LABELS = {
+    'pixeldrain': "'PixeldrainDL' or 'Pixeldrain'",
+    'r2': "'CLOUD DOWNLOAD [R2]'",
+    'fast_cloud': "'Fast Cloud Download/DL'",
+    'drivebot': "'DRIVEBOT'",
+}
+GDFLIX_STRATEGY_TYPICAL_SECONDS = {'pixeldrain': 0, 'r2': 0, 'fast_cloud': 10, 'drivebot': 15} # until learned
+
+strategy_breakers = BreakerRegistry('strategy', BREAKER_STRATEGY_SLOW_SECONDS)
+
+def strategy_health(name):
+    # A strategy is as healthy as its own breaker and the breaker of the mirror its links point to
+    breaker = strategy_breakers.get(name)
+    state = breaker.current_state()
+    mirror = strategy_mirrors.get(('gdflix', name))
+    if state == 'closed' and mirror:
+        mirror_breaker = upstream_breakers.get(mirror)
+        mirror_state = mirror_breaker.current_state()
+        if mirror_state != 'closed': return mirror_state, f"mirror {mirror}: {mirror_breaker.reason}"
+    return state, breaker.reason
+
+def order_strategies(page1_url, page1_matches, logs):
+    # Healthy strategies the page offers in learned order, then the rest of the healthy ones,
+    # then recovering (half-open) ones. Failing (open) strategies are left out; the ones the
+    # page offered are returned as skipped.
+    healthy, recovering, skipped = [], [], []
+    for name in GDFLIX_STRATEGIES:
+        state, reason = strategy_health(name)
+        if state == 'closed':
+            healthy.append(name)
+        elif state == 'half_open':
+            recovering.append(name)
+        elif name in page1_matches:
+            skipped.append(f"{GDFLIX_STRATEGY_NAMES[name]} ({reason})")
+            logs.append(f"Info: Skipping {GDFLIX_STRATEGY_NAMES[name]}: circuit breaker open ({reason}).")
+    offered = [name for name in healthy if name in page1_matches]
+    learned = strategy_learner.order('gdflix', urlparse(page1_url).hostname, offered)
+    if learned != offered:
+        logs.append(f"Info: Using learned strategy order for this host: {', '.join(GDFLIX_STRATEGY_NAMES[name] for name in learned)}.")
+    healthy = learned + [name for name in healthy if name not in page1_matches]
+    if recovering:
+        logs.append(f"Info: Trying recovering strategies last: {', '.join(GDFLIX_STRATEGY_NAMES[name] for name in recovering)}.")
+    return healthy + recovering, skipped
+
+def run_page1_strategy(name, session, page1_url, href, page1_matches, logs):
+    # Returns (strategy that produced the link, link, outcomes); outcomes maps every strategy
+    # that ran to the end to (link, seconds). With speculation that can be more than one.
+    started = time.monotonic()
+    if name == 'pixeldrain':
+        link = urljoin(page1_url, href)
+        logs.append(f"Success: Found Pixeldrain link URL: {link}")
+    elif name == 'r2':
+        link = urljoin(page1_url, href)
+        logs.append(f"Success: Found R2 download link: {link}")
+    elif name == 'fast_cloud':
+        drivebot_href = element_href(page1_matches['drivebot']['tag']) if SPECULATIVE_STRATEGIES and 'drivebot' in page1_matches else None
+        if drivebot_href and strategy_breakers.get('drivebot').allow():
+            logs.append("Speculative mode: page offers both Fast Cloud and Drivebot, starting both paths in parallel.")
+            winner, link, outcomes = run_speculative_strategies(session, page1_url, [
+                ('fast_cloud', gdflix_fast_cloud_strategy, href),
+                ('drivebot', gdflix_drivebot_strategy, drivebot_href),
+            ], logs)
+            if 'drivebot' not in outcomes: strategy_breakers.get('drivebot').cancel()
+            return winner, link, outcomes
+        link = gdflix_fast_cloud_strategy(session, page1_url, href, logs)
+    else:
+        link = gdflix_drivebot_strategy(session, page1_url, href, logs)
+    return (name if link else None), link, {name: (link, time.monotonic() - started)}
+
+# --- Redirect Shortcuts ---
+def _id_positions(parts):
+    # Indexes of the path parts that may hold the id, last first: the last segment, then id-like ones
+    last = max((index for index, part in enumerate(parts) if part), default=None)
+    return [index for index in reversed(range(len(parts)))
+            if parts[index] and (index == last or REDIRECT_SHORTCUT_ID_PATTERN.fullmatch(parts[index]))]
+
+def _path_template(parts, index):
+    return '/'.join(parts[:index] + ['{id}'] + parts[index + 1:])
+
+class RedirectShortcuts:
+    def __init__(self):
+        self._rules = OrderedDict() # (start netloc, start path template) -> rule
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.learned = 0
+        self.dropped = 0
+
+    def _find(self, parsed):
+        # (segment, key, rule) for the first rule matching the URL, trying the last path segment first
+        parts = parsed.path.split('/')
+        for index in _id_positions(parts):
+            key = (parsed.netloc.lower(), _path_template(parts, index))
+            rule = self._rules.get(key)
+            if rule is not None: return parts[index], key, rule
+        return None, None, None
+
+    def lookup(self, url):
+        if not REDIRECT_SHORTCUTS: return None
+        parsed = urlparse(url)
+        now = time.time()
+        with self._lock:
+            segment, key, rule = self._find(parsed)
+            if rule is None: return None
+            if now - rule['verifiedAt'] > REDIRECT_SHORTCUT_MAX_AGE:
+                del self._rules[key]
+                self.dropped += 1
+                return None
+            if now - rule['verifiedAt'] > REDIRECT_SHORTCUT_VERIFY_INTERVAL and now - rule['verifyStartedAt'] > REQUEST_TIMEOUT * MAX_REDIRECT_HOPS:
+                rule['verifyStartedAt'] = now # this request walks the full chain; others keep using the rule meanwhile
+                return None
+            rule['hits'] += 1
+            self.hits += 1
+        return rule['target'].replace('{id}', segment) + (f"?{parsed.query}" if rule['keepQuery'] and parsed.query else '')
+
+    def learn(self, start_url, final_url, round_trips):
+        # Returns True when a new or changed rule was stored
+        start, final = urlparse(start_url), urlparse(final_url)
+        if not REDIRECT_SHORTCUTS or round_trips < 2: return False
+        if final.query and final.query != start.query: return False # per-request tokens can't be rewritten
+        start_parts, final_parts = start.path.split('/'), final.path.split('/')
+        start_index = next((index for index in _id_positions(start_parts) if start_parts[index] in final_parts), None)
+        if start_index is None: return False
+        segment = start_parts[start_index]
+        final_index = len(final_parts) - 1 - final_parts[::-1].index(segment)
+        key = (start.netloc.lower(), _path_template(start_parts, start_index))
+        target = f"{final.scheme}://{final.netloc}{_path_template(final_parts, final_index)}"
+        now = time.time()
+        with self._lock:
+            rule = self._rules.get(key)
+            if rule is not None and rule['target'] == target:
+                rule['verifiedAt'], rule['verifyStartedAt'] = now, 0
+                return False
+            self._rules[key] = {'target': target, 'keepQuery': bool(final.query), 'roundTripsSaved': round_trips - 1,
+                                'learnedAt': now, 'verifiedAt': now, 'verifyStartedAt': 0, 'hits': 0}
+            self._rules.move_to_end(key)
+            while len(self._rules) > REDIRECT_SHORTCUT_MAX_RULES:
+                self._rules.popitem(last=False)
+            self.learned += 1
+        return True
+
+    def forget(self, url):
+        with self._lock:
+            _, key, rule = self._find(urlparse(url))
+            if rule is None: return
+            del self._rules[key]
+            self.dropped += 1
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            rules = [{"from": f"{netloc}{template}", "to": rule['target'], "hits": rule['hits'], "roundTripsSaved": rule['roundTripsSaved'],
+                      "verifiedSecondsAgo": round(now - rule['verifiedAt'])}
+                     for (netloc, template), rule in list(self._rules.items())[-50:]]
+            return {"enabled": REDIRECT_SHORTCUTS, "hits": self.hits, "learned": self.learned, "dropped": self.dropped,
+                    "size": len(self._rules), "rules": rules}
+
+redirect_shortcuts = RedirectShortcuts()
+
+# --- Core GDFLIX Bypass Function ---
+def follow_redirect_chain(session, start_url, logs):
+    # Follows meta refresh / location.replace hops from start_url. Returns (landed_url, html_content,
+    # round_trips) for the page where the chain ends, or None after logging why it failed.
+    current_url = start_url
+    hops_count = 0
+    round_trips = 0
+    landed_url = None
+    html_content = None
+
+    while hops_count < MAX_REDIRECT_HOPS:
+        logs.append(f"[Hop {hops_count}] Fetching/Checking URL: {current_url}")
+        try:
+            with timed_stage('redirect_hop', url=current_url, hop=hops_count):
+                response, html_content, complete = fetch_html(session, current_url, stop_when=redirect_stop_condition(), allow_redirects=True, timeout=REQUEST_TIMEOUT)
+            round_trips += 1 + len(response.history)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logs.append(f"  Error fetching {current_url}: {e}")
+            return None
+
+        landed_url = response.url
+        status_code = response.status_code
+        logs.append(f"  Landed on: {landed_url} (Status: {status_code})")
+        if not complete:
+            logs.append(f"  Redirect found in the first {len(html_content)} characters; stopped downloading the rest of the page.")
+
+        next_hop_url = None
+        is_secondary_redirect = False
+        meta_match = META_REFRESH_PATTERN.search(html_content)
+        if meta_match:
+            potential_next = meta_refresh_target(meta_match, landed_url)
+            if potential_next:
+                next_hop_url = potential_next
+                logs.append(f"  Detected META refresh redirect to: {next_hop_url}")
+                is_secondary_redirect = True
+
+        if not is_secondary_redirect:
+            js_match = JS_REDIRECT_PATTERN.search(html_content)
+            if js_match:
+                potential_next = js_redirect_target(js_match, landed_url)
+                if potential_next:
+                    next_hop_url = potential_next
+                    logs.append(f"  Detected JS location.replace redirect to: {next_hop_url}")
+                    is_secondary_redirect = True
+
+        if is_secondary_redirect and next_hop_url:
+            logs.append(f"  Following secondary redirect...")
+            current_url = next_hop_url
+            hops_count += 1
+            time.sleep(upstream_pacing.delay_for(session, current_url))
+        else:
+            logs.append(f"  No further actionable secondary redirect found. Proceeding with content analysis.")
+            break
+
+    if hops_count >= MAX_REDIRECT_HOPS:
+        logs.append(f"Error: Exceeded maximum redirect hops ({MAX_REDIRECT_HOPS}). Stuck at {landed_url}")
+        return None
+
+    if not landed_url or not html_content:
+         logs.append("Error: Failed to retrieve final page content after redirect checks.")
+         return None
+    return landed_url, html_content, round_trips
+
+def strategy_error_message(error):
+    # Worded like get_gdflix_download_link's own handlers, which the negative cache's failure classes match
+    if isinstance(error, requests.exceptions.Timeout): return f"Request timed out: {error}"
+    if isinstance(error, requests.exceptions.HTTPError):
+        return f"HTTP Error: {error.response.status_code} {error.response.reason} for {error.request.url}"
+    if isinstance(error, requests.exceptions.RequestException): return f"Network or Request error: {error}"
+    return f"Unexpected error: {error}"
+
+def get_gdflix_download_link(start_url, logs=None):
+    session = new_session()
+    session.headers.update(HEADERS)
+    if logs is None: logs = []
+
+    try:
+        shortcut_url = redirect_shortcuts.lookup(start_url)
+        for chain_start in ([shortcut_url] if shortcut_url else []) + [start_url]:
+            via_shortcut = chain_start != start_url
+            if via_shortcut:
+                logs.append(f"Using learned redirect shortcut: {start_url} -> {shortcut_url}")
+            chain = follow_redirect_chain(session, chain_start, logs)
+            if chain is None:
+                if via_shortcut:
+                    redirect_shortcuts.forget(start_url)
+                    logs.append("  Redirect shortcut failed; dropped it and following the full redirect chain.")
+                    continue
+                return None, logs
+            page1_url, html_content, round_trips = chain
+
+            log_html(logs, f"Final Content Page HTML (URL: {page1_url})", html_content)
+            logs.append(f"--- End Final Content Page HTML Snippet ---")
+
+            if "cloudflare" in html_content.lower() or "checking your browser" in html_content.lower() or "challenge-platform" in html_content.lower():
+                 logs.append("WARNING: Potential Cloudflare challenge page detected on final content page!")
+            note_challenge_page(page1_url, html_content)
+
+            with timed_stage('page1_parse'):
+                _, (possible_tags_p1, page1_matches) = analyze_html(html_content, GDFLIX_PAGE1_PATTERNS)
+            if via_shortcut and not page1_matches:
+                redirect_shortcuts.forget(start_url)
+                logs.append("  Redirect shortcut target has no download buttons; dropped it and following the full redirect chain.")
+                continue
+            if not via_shortcut and page1_matches and redirect_shortcuts.learn(start_url, page1_url, round_trips):
+                logs.append(f"  Learned redirect shortcut to {urlparse(page1_url).netloc} (skips {round_trips - 1} of {round_trips} requests next time).")
+            break
+        logs.append(f"Found {len(possible_tags_p1)} potential link/button tags on final content page ({page1_url}).")
+
+        page_host = urlparse(page1_url).hostname
+        strategy_order, skipped_strategies = order_strategies(page1_url, page1_matches, logs)
+        attempted = set()
+        strategy_errors = []
+        for priority, name in enumerate(strategy_order, 1):
+            label = GDFLIX_STRATEGY_LABELS[name]
+            logs.append(f"Searching for {label} button text pattern on final content page (Priority {priority})...")
+            match = page1_matches.get(name)
+            if not match:
+                logs.append(f"Info: {label} button/pattern not found. Trying next priority.")
+                continue
+            logs.append(f"  Success: Found potential {label} tag: <{match['name']}> with text '{match['text']}'")
+            strategy_href = element_href(match['tag'])
+            if not strategy_href:
+                logs.append(f"  Info: Found {label} element ('{match['tag'].get_text(strip=True)}') but couldn't get href/action. Trying next priority.")
+                continue
+
+            if name in attempted:
+                logs.append(f"  Info: {GDFLIX_STRATEGY_NAMES[name]} already ran as a speculative branch. Trying next priority.")
+                continue
+            breaker = strategy_breakers.get(name)
+            if not breaker.allow():
+                logs.append(f"  Info: {GDFLIX_STRATEGY_NAMES[name]} is recovering and already being probed. Trying next priority.")
+                skipped_strategies.append(f"{GDFLIX_STRATEGY_NAMES[name]} (recovering)")
+                continue
+            started = time.monotonic()
+            try:
+                winner, final_download_link, outcomes = run_page1_strategy(name, session, page1_url, strategy_href, page1_matches, logs)
+            except Exception as e:
+                # A failing strategy is scored like one that found nothing; the next one still gets its turn
+                seconds = time.monotonic() - started
+                breaker.record(False, seconds)
+                strategy_learner.record('gdflix', page_host, name, False, seconds)
+                attempted.add(name)
+                error = strategy_error_message(e)
+                strategy_errors.append(error)
+                app.logger.warning(f"GDFLIX strategy {name} failed on {page1_url}: {error}",
+                                   exc_info=not isinstance(e, requests.exceptions.RequestException))
+                logs.append(f"  Error: {error}")
+                logs.append(f"Info: {GDFLIX_STRATEGY_NAMES[name]} failed. Trying next priority.")
+                continue
+            if name not in outcomes: breaker.cancel() # lost a speculative race before finishing
+            # Each strategy that ran is scored on its own result, so a speculative win is
+            # credited to the branch that produced the link
+            for strategy, (link, seconds) in outcomes.items():
+                strategy_breakers.get(strategy).record(bool(link), seconds)
+                strategy_learner.record('gdflix', page_host, strategy, link, seconds, link)
+            attempted.update(outcomes)
+            if final_download_link:
+                probe_strategy_link('gdflix', winner, page_host, final_download_link, HEADERS)
+                return final_download_link, logs
+            logs.append(f"Info: {GDFLIX_STRATEGY_NAMES[name]} did not yield a download link. Trying next priority.")
 
+        if skipped_strategies:
+            logs.append(f"Error: Download strategies offered by this page are currently failing: {', '.join(skipped_strategies)}. Please try again later.")
+            return None, logs
+        if strategy_errors:
+            # Reported as the last strategy's error, so it is classified (and negative-cached) as before
+            logs.append(f"Error: {strategy_errors[-1]}")
+            return None, logs
         logs.append("Error: All prioritized search attempts (Pixeldrain, R2, Fast Cloud, Drivebot) failed to yield a download link.")
 
     except requests.exceptions.Timeout as e:
@@ -704,17 +1172,96 @@ def get_gdflix_download_link(start_url):
 
     return None, logs
 
-# --- Flask API Endpoint (Unchanged) ---
+# --- Error Extraction ---
+def extract_error_message(logs):
+    failure_indicators = [
+        "Error:", "FATAL:", "FAILED", "timed out", "neither", "blocked", 
+        "exceeded maximum", "all prioritized search attempts", 
+        "could not find the final gdindex.lol link", 
+        "'Generate Link' button/element not found",
+        "Could not determine next URL or method for DRIVEBOT server choice",
+        "Could not find a DRIVEBOT server choice button/link",
+        "DRIVEBOT server choice <.+> found, but not within a <form>" 
+    ]
+    extracted_error = "GDFLIX Extraction Failed (Check logs for details)"
+    timeout_occurred = False 
+
+    last_error_log = ""
+    for log_entry in reversed(logs):
+        log_entry_lower = log_entry.lower()
+        if "link generation timed out" in log_entry_lower: 
+            last_error_log = log_entry
+            timeout_occurred = True
+            break 
+        
+        if any( (indicator.startswith("DRIVEBOT server choice <.+>") and re.search(indicator, log_entry, re.IGNORECASE)) or 
+                 (not indicator.startswith("DRIVEBOT server choice <.+>") and indicator.lower() in log_entry_lower)
+                 for indicator in failure_indicators):
+            if not last_error_log or len(log_entry) > len(last_error_log): 
+                 last_error_log = log_entry
+    
+    if timeout_occurred: 
+        extracted_error = "Link generation (FastCloud) timed out, please try again."
+    elif last_error_log:
+        parts = re.split(r'(?:Error|FATAL|Info|Warning):\s*', last_error_log, maxsplit=1, flags=re.IGNORECASE)
+        extracted_error = (parts[-1] if len(parts) > 1 else last_error_log).strip()
+
+        if "Neither 'Cloud Resume Download' nor 'Generate Cloud Link'" in extracted_error:
+             extracted_error = "Could not find required buttons on intermediate page (FastCloud)."
+        elif "Exceeded maximum redirect hops" in extracted_error:
+               extracted_error = "Too many redirects encountered."
+        elif "Failed to obtain a valid polling URL" in extracted_error: 
+               extracted_error = "Failed to initiate link generation process (FastCloud)."
+        elif "Failed to retrieve final page content" in extracted_error:
+             extracted_error = "Could not load initial page content."
+        elif "could not find the final gdindex.lol link" in extracted_error.lower(): 
+            extracted_error = "Failed to extract link after Drivebot generation step."
+        elif "'Generate Link' button/element not found" in extracted_error: 
+            extracted_error = "Drivebot 'Generate Link' button missing."
+        elif "DRIVEBOT server choice <.+> found, but not within a <form>" in extracted_error or \
+             "Could not determine next URL or method for DRIVEBOT server choice" in extracted_error or \
+             "Could not find a DRIVEBOT server choice button/link" in extracted_error : 
+            extracted_error = "Failed at Drivebot server selection step (button not in form or action unclear)."
+        elif "All prioritized search attempts" in extracted_error:
+            extracted_error = "No supported download buttons found on the page."
+    else: 
+         extracted_error = "Extraction failed. See logs for details."
+    return extracted_error[:250]
+
+# --- Service ---
+def find_gdflix_link(gdflix_url, logs):
+    logs.append(f"Starting GDFLIX bypass process for: {gdflix_url}")
+    final_download_link, _ = get_gdflix_download_link(gdflix_url, logs)
+    return final_download_link
+
+def gdflix_extra_stats():
+    return {
+        "circuitBreakers": {"hosts": upstream_breakers.stats(), "strategies": strategy_breakers.stats()},
+        "redirectShortcuts": redirect_shortcuts.stats(),
+    }
+
+service = Service('gdflix', find_gdflix_link, extract_error_message, 'gdflixUrl', ('gdflix',), ('HUBCLOUD_API_URL', 'HubCloud'),
+                  failure_fingerprints=GDFLIX_FAILURE_FINGERPRINTS, typical_seconds={'gdflix': GDFLIX_STRATEGY_TYPICAL_SECONDS},
+                  extra_stats=gdflix_extra_stats)
+service.instrument(app)
+
+# --- Flask API Endpoint ---
 @app.route('/api/gdflix', methods=['POST'])
 def gdflix_bypass_api():
-    script_logs = []
-    result = {"success": False, "error": "Request processing failed", "finalUrl": None, "logs": script_logs}
+    script_logs = LogBuffer()
+    result = {"success": False, "error": "Request processing failed", "finalUrl": None, "expiresAt": None, "cached": False, "logs": script_logs}
     status_code = 500
+    response_mode = DEFAULT_RESPONSE_MODE
+    log_level = request_log_level(None, response_mode)
+    trace = None
     try:
         gdflix_url = None
         try:
             data = request.get_json()
             if not data: raise ValueError("No JSON data received")
+            response_mode = request_response_mode(data)
+            log_level = request_log_level(data, response_mode)
+            script_logs.capture = service.debug_captures if capture_requested(data) else None
             gdflix_url = data.get('gdflixUrl')
             if not gdflix_url: raise ValueError("Missing 'gdflixUrl' key")
             script_logs.append(f"Received JSON POST body with gdflixUrl: {gdflix_url}")
@@ -736,73 +1283,22 @@ def gdflix_bypass_api():
             result["logs"] = script_logs
             return jsonify(result), status_code
 
-        script_logs.append(f"Starting GDFLIX bypass process for: {gdflix_url}")
-        final_download_link, script_logs_from_func = get_gdflix_download_link(gdflix_url)
-        script_logs.extend(script_logs_from_func)
+        with tracer.trace('gdflix.resolve', force=trace_requested(data), url=gdflix_url) as trace:
+            final_download_link, resolve_error, cached, link_expires_at = service.process_request(gdflix_url, script_logs)
+        result["cached"] = cached
+        if trace and data.get('trace') is True: result["trace"] = trace.to_dict()
 
         if final_download_link:
-            script_logs.append("Bypass process completed successfully.")
+            if not cached: script_logs.append("Bypass process completed successfully.")
             result["success"] = True
             result["finalUrl"] = final_download_link
+            result["expiresAt"] = link_expires_at
             result["error"] = None
             status_code = 200
         else:
-            script_logs.append("Bypass process failed to find the final download link.")
+            if not cached: script_logs.append("Bypass process failed to find the final download link.")
             result["success"] = False
-            failure_indicators = [
-                "Error:", "FATAL:", "FAILED", "timed out", "neither", "blocked", 
-                "exceeded maximum", "all prioritized search attempts", 
-                "could not find the final gdindex.lol link", 
-                "'Generate Link' button/element not found",
-                "Could not determine next URL or method for DRIVEBOT server choice",
-                "Could not find a DRIVEBOT server choice button/link",
-                "DRIVEBOT server choice <.+> found, but not within a <form>" 
-            ]
-            extracted_error = "GDFLIX Extraction Failed (Check logs for details)"
-            timeout_occurred = False 
-
-            last_error_log = ""
-            for log_entry in reversed(script_logs):
-                log_entry_lower = log_entry.lower()
-                if "link generation timed out" in log_entry_lower: 
-                    last_error_log = log_entry
-                    timeout_occurred = True
-                    break 
-                
-                if any( (indicator.startswith("DRIVEBOT server choice <.+>") and re.search(indicator, log_entry, re.IGNORECASE)) or 
-                         (not indicator.startswith("DRIVEBOT server choice <.+>") and indicator.lower() in log_entry_lower)
-                         for indicator in failure_indicators):
-                    if not last_error_log or len(log_entry) > len(last_error_log): 
-                         last_error_log = log_entry
-            
-            if timeout_occurred: 
-                extracted_error = "Link generation (FastCloud) timed out, please try again."
-            elif last_error_log:
-                parts = re.split(r'(?:Error|FATAL|Info|Warning):\s*', last_error_log, maxsplit=1, flags=re.IGNORECASE)
-                extracted_error = (parts[-1] if len(parts) > 1 else last_error_log).strip()
-
-                if "Neither 'Cloud Resume Download' nor 'Generate Cloud Link'" in extracted_error:
-                     extracted_error = "Could not find required buttons on intermediate page (FastCloud)."
-                elif "Exceeded maximum redirect hops" in extracted_error:
-                       extracted_error = "Too many redirects encountered."
-                elif "Failed to obtain a valid polling URL" in extracted_error: 
-                       extracted_error = "Failed to initiate link generation process (FastCloud)."
-                elif "Failed to retrieve final page content" in extracted_error:
-                     extracted_error = "Could not load initial page content."
-                elif "could not find the final gdindex.lol link" in extracted_error.lower(): 
-                    extracted_error = "Failed to extract link after Drivebot generation step."
-                elif "'Generate Link' button/element not found" in extracted_error: 
-                    extracted_error = "Drivebot 'Generate Link' button missing."
-                elif "DRIVEBOT server choice <.+> found, but not within a <form>" in extracted_error or \
-                     "Could not determine next URL or method for DRIVEBOT server choice" in extracted_error or \
-                     "Could not find a DRIVEBOT server choice button/link" in extracted_error : 
-                    extracted_error = "Failed at Drivebot server selection step (button not in form or action unclear)."
-                elif "All prioritized search attempts" in extracted_error:
-                    extracted_error = "No supported download buttons found on the page."
-            else: 
-                 extracted_error = "Extraction failed. See logs for details."
-
-            result["error"] = extracted_error[:250] 
+            result["error"] = resolve_error
             status_code = 200 
 
     except Exception as e:
@@ -813,10 +1309,88 @@ def gdflix_bypass_api():
         status_code = 500
 
     finally:
-        result["logs"] = script_logs
+        shape_response(result, script_logs, response_mode, log_level, trace)
         response = make_response(jsonify(result), status_code)
         return response
 
+# --- Batch Endpoint ---
+@app.route('/api/batch', methods=['POST'])
+def batch_bypass_api():
+    data = request.get_json(silent=True) or {}
+    urls = data.get('urls')
+    if not isinstance(urls, list) or not urls:
+        return jsonify({"success": False, "error": "Invalid or missing JSON (expected {'urls': ['...', ...] })"}), 400
+    if len(urls) > BATCH_MAX_URLS:
+        return jsonify({"success": False, "error": f"Too many URLs in one batch (max {BATCH_MAX_URLS})."}), 400
+    include_logs = bool(data.get('includeLogs'))
+    include_trace = data.get('trace') is True
+
+    def generate():
+        # One NDJSON line per link, in completion order
+        for item in batch_results(service, urls, include_logs, include_trace):
+            yield json.dumps(item) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# --- Job Endpoints ---
+@app.route('/api/gdflix/jobs', methods=['POST'])
+def gdflix_submit_job_api():
+    data = request.get_json(silent=True) or {}
+    gdflix_url = data.get('gdflixUrl')
+    if not gdflix_url or not isinstance(gdflix_url, str):
+        return jsonify({"success": False, "error": "Invalid or missing JSON (expected {'gdflixUrl': '...' })"}), 400
+    parsed_start_url = urlparse(gdflix_url)
+    if not parsed_start_url.scheme or not parsed_start_url.netloc:
+        return jsonify({"success": False, "error": f"Invalid URL format provided: {gdflix_url}"}), 400
+
+    job = submit_job(service, gdflix_url, capture_html=capture_requested(data), include_trace=data.get('trace') is True)
+    if job is None:
+        return jsonify({"success": False, "error": "Too many jobs in progress, please try again later."}), 503
+    return jsonify({"success": True, "jobId": job["id"], "status": job["status"], "statusUrl": f"/api/gdflix/jobs/{job['id']}"}), 202
+
+@app.route('/api/gdflix/jobs/<job_id>', methods=['GET'])
+def gdflix_job_status_api(job_id):
+    job = service.jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found (it may have expired)."}), 404
+    return jsonify(job), 200
+
+# --- Prefetch Endpoint ---
+@app.route('/api/prefetch', methods=['POST'])
+def prefetch_api():
+    data = request.get_json(silent=True) or {}
+    urls = data.get('urls')
+    if not isinstance(urls, list) or not urls:
+        return jsonify({"success": False, "error": "Invalid or missing JSON (expected {'urls': ['...' or {'url': '...', 'priority': 1}, ...] })"}), 400
+    if len(urls) > PREFETCH_MAX_URLS:
+        return jsonify({"success": False, "error": f"Too many URLs in one request (max {PREFETCH_MAX_URLS})."}), 400
+    body, status_code = prefetch_links(service, urls, data.get('priority', 0))
+    return jsonify(body), status_code
+
+# --- Debug Capture Endpoint ---
+@app.route('/api/gdflix/debug/<capture_id>', methods=['GET'])
+def gdflix_debug_capture_api(capture_id):
+    html = service.debug_captures.get(capture_id)
+    if html is None:
+        return jsonify({"success": False, "error": "Capture not found (it may have expired)."}), 404
+    # Served as text so captured upstream pages never run in this origin
+    return Response(html, content_type='text/plain; charset=utf-8', headers={'X-Content-Type-Options': 'nosniff'})
+
+# --- Stats Endpoint ---
+@app.route('/api/gdflix/stats', methods=['GET'])
+def gdflix_stats_api():
+    return jsonify(service.stats()), 200
+
+# --- Strategy Stats Endpoint ---
+@app.route('/api/gdflix/strategies', methods=['GET'])
+def gdflix_strategy_stats_api():
+    return jsonify({"learning": STRATEGY_LEARNING, "strategies": strategy_learner.stats()}), 200
+
+# --- Metrics Endpoint ---
+@app.route('/metrics', methods=['GET'])
+def metrics_api():
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # --- Self-Ping Endpoint (NEW) ---
 @app.route('/ping', methods=['GET'])
 def ping_service():
@@ -851,7 +1425,7 @@ def self_ping_task():
 
 # --- Run Flask App (MODIFIED) ---
 if __name__ == '__main__':
-    port = int(os.environ.get("PORT", 5001))
+    port = env_int("PORT", 5001, minimum=1)
 
     # Start the self-ping thread only when deployed on Render
     if os.environ.get("RENDER_EXTERNAL_URL"):
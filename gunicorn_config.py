@@ -1,6 +1,7 @@
 # render-bypass-apis/gunicorn_config.py
 import os
 import multiprocessing
+import importlib.util
 
 # Render typically injects the PORT environment variable from its environment settings.
 # Gunicorn will listen on all interfaces (0.0.0.0) on the port Render assigns.
@@ -13,6 +14,18 @@ bind = "0.0.0.0:{}".format(os.environ.get("PORT", 10000))
 # You can experiment, but too many workers can hurt performance on small instances.
 workers = int(os.environ.get("WEB_CONCURRENCY", 2))
 
+# Resolutions spend almost all their time waiting on upstream hosts or sleeping between polls.
+# The gevent worker monkey-patches requests and time.sleep so that waiting is cooperative,
+# letting one process keep hundreds of resolutions in flight instead of one per worker.
+# Falls back to threaded workers if gevent isn't installed. Keep preload_app off so the
+# app is imported after the worker has patched the standard library.
+if importlib.util.find_spec("gevent"):
+    worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+else:
+    worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+worker_connections = int(os.environ.get("WORKER_CONNECTIONS", 500)) # gevent: concurrent requests per worker
+threads = int(os.environ.get("GUNICORN_THREADS", 16)) # gthread: threads per worker
+
 # Increase the request timeout for potentially long scraping/bypass operations.
 # Render itself might have higher-level timeouts, but this gives Gunicorn more time.
 timeout = 120 # seconds (Increased from Gunicorn's default of 30)
@@ -1,6 +1,7 @@
 # hubcloud_api/app.py
 
 import requests
+from bs4 import BeautifulSoup
 import time
 import re
 from urllib.parse import urljoin, urlparse, unquote
@@ -8,21 +9,29 @@ import traceback
 import sys
 import json
 import os
-from flask import Flask, request, jsonify, make_response # Import Flask components
+from flask import Flask, request, jsonify, make_response, Response, stream_with_context # Import Flask components
 import threading # For self-ping
 import logging # For better logging
 
-# Try importing lxml, fall back to html.parser if not installed
-try:
-    from bs4 import BeautifulSoup
-    PARSER = "lxml"
-    LXML_AVAILABLE = True
-except ImportError:
-    from bs4 import BeautifulSoup
-    PARSER = "html.parser"
-    LXML_AVAILABLE = False
-    # Print warning to stderr so it appears in Render/console logs
-    print("Warning: lxml not found, using html.parser.", file=sys.stderr)
+# Shared infrastructure (caching, limits, breakers, jobs, batch, prefetch, metrics) lives next to both apps
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from bypass_common.batch import BATCH_MAX_URLS, batch_results
+from bypass_common.extract import PARSER, extract_with_fallback, fast_page, parse_with_fallback
+from bypass_common.jobs import submit_job
+from bypass_common.learning import STRATEGY_LEARNING, probe_strategy_link, strategy_learner
+from bypass_common.limits import upstream_limiter
+from bypass_common.metrics import metrics, timed_stage
+from bypass_common.pacing import note_challenge_page, upstream_pacing
+from bypass_common.prefetch import PREFETCH_MAX_URLS, prefetch_links
+from bypass_common.responses import (
+    DEFAULT_RESPONSE_MODE, LogBuffer, capture_requested, log_html, request_log_level, request_response_mode,
+    shape_response, trace_requested,
+)
+from bypass_common.service import Service
+from bypass_common.settings import env_int
+from bypass_common.streaming import fetch_html, stop_on_pattern
+from bypass_common.tracing import tracer
+from bypass_common.upstream import new_session
 
 # --- Flask App Initialization ---
 app = Flask(__name__)
@@ -40,7 +49,6 @@ if not app.debug: # Avoid duplicate handlers if Flask's debug mode is on
     # Also configure root logger if other libraries use it
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-
 # --- Configuration ---
 DEFAULT_HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36',
@@ -48,22 +56,57 @@ DEFAULT_HEADERS = {
     'Accept-Language': 'en-US,en;q=0.9',
 }
 REQUEST_TIMEOUT = 30 # In seconds
-DRIVE_PREFERRED_BUTTON_TEXTS = [
-    r'Download\s*\[FSL Server\]',
-    r'Download\s*File\s*\[\s*\d+(\.\d+)?\s*(GB|MB)\s*\]',
-    r'Download\s*\[PixelServer\s*:\s*\d+\]',
-    r'Download\s*\[Server\s*:\s*\d+Gbps\]'
+DRIVE_PREFERRED_BUTTONS = [ # (strategy name, button text pattern), default priority
+    ('fsl_server', r'Download\s*\[FSL Server\]'),
+    ('download_file', r'Download\s*File\s*\[\s*\d+(\.\d+)?\s*(GB|MB)\s*\]'),
+    ('pixel_server', r'Download\s*\[PixelServer\s*:\s*\d+\]'),
+    ('gbps_server', r'Download\s*\[Server\s*:\s*\d+Gbps\]'),
 ]
+DRIVE_PREFERRED_BUTTON_TEXTS = [pattern for _, pattern in DRIVE_PREFERRED_BUTTONS]
+DRIVE_PREFERRED_BUTTON_NAMES = {pattern: name for name, pattern in DRIVE_PREFERRED_BUTTONS}
+DRIVE_PREFERRED_BUTTON_PATTERNS_BY_NAME = dict(DRIVE_PREFERRED_BUTTONS)
+DRIVE_STRATEGY_NAMES = [name for name, _ in DRIVE_PREFERRED_BUTTONS]
+DRIVE_PREFERRED_BUTTON_PATTERNS = [(pattern, re.compile(pattern, re.IGNORECASE)) for pattern in DRIVE_PREFERRED_BUTTON_TEXTS]
 DRIVE_FINAL_LINK_HINTS = ['r2.dev', 'fsl.pub', '/dl/', '.cdn.', 'storage.', 'pixeldrain.com/api/file/']
 DRIVE_INTERMEDIATE_DOMAINS = [
     'gamerxyt.com', 'adf.ly', 'linkvertise.com', 'tinyurl.com',
     'cdn.ampproject.org', 'bloggingvector.shop', 'newssongs.co.in',
 ]
+# Extra intermediate hosts (host or host:port), e.g. a local mock upstream for load tests
+DRIVE_INTERMEDIATE_DOMAINS += [domain.strip().lower() for domain in os.environ.get("EXTRA_DRIVE_INTERMEDIATE_DOMAINS", "").split(',') if domain.strip()]
+
+# --- Upstream Rate Limit Configuration ---
+# The drive flow's intermediate (shortener/ad) hosts are the quickest to answer bursts with 429s
+UPSTREAM_INTERMEDIATE_LIMITS = (4, 2, 4)
+for domain in DRIVE_INTERMEDIATE_DOMAINS:
+    upstream_limiter.overrides.setdefault(domain, UPSTREAM_INTERMEDIATE_LIMITS)
+
+# --- Negative Cache Configuration ---
+# Failure classes specific to HubCloud pages, matched after the shared ones
+HUBCLOUD_FAILURE_FINGERPRINTS = (
+    ('no_download_link', r'usable download link|no final link|could not find (the intermediate|final link)|intermediate link didn.t yield|required .op. and .id.'),
+    ('strategy_step_failed', r'failed to fetch or parse|intermediate|post'),
+)
 
 # --- Self-Ping Configuration (MODIFIED FOR AGGRESSIVE PING) ---
 SELF_PING_INTERVAL_SECONDS = 45  # Ping every 45 seconds to keep it hot
 PING_REQUEST_TIMEOUT = 20 # Timeout for the self-ping request itself
 
+# --- Video Page Detection ---
+# Decisive elements for the video pages: the intermediate 'Generate' anchor, and the
+# top-priority PixelServer button with a usable href. Nested markup just means no early exit.
+VIDEO_GENERATE_ANCHOR_PATTERN = re.compile(r'<a\b[^>]*>[^<]*Generate Direct Download Link[^<]*</a\s*>')
+VIDEO_PIXELSERVER_ANCHOR_PATTERN = re.compile(
+    r'<a\b(?=[^>]*\bclass\s*=\s*["\'][^"\']*btn-success)(?=[^>]*\bhref\s*=\s*["\'](?!#|javascript:)[^"\'\s])[^>]*>'
+    r'[^<]*Download\s*\[PixelServer[^<]*</a\s*>', re.IGNORECASE)
+VIDEO_SEARCH_PRIORITIES = [ # final-link strategies on the intermediate page, default priority
+    {'type': 'PixelDrain Button', 'tag': 'a', 'attrs': {'class': re.compile(r'btn-success', re.I)}, 'text_pattern': r'Download\s*\[PixelServer'},
+    {'type': 'FSL Server Button', 'tag': 'a', 'attrs': {'class': re.compile(r'btn-success', re.I)}, 'text_pattern': r'Download\s*\[FSL Server'},
+    {'type': 'Download File [Size] Button', 'tag': 'a', 'attrs': {'class': re.compile(r'btn-success', re.I)}, 'text_pattern': r'Download File\s*\['},
+    {'type': 'Generic Download Button', 'tag': 'a', 'attrs': {'class': re.compile(r'btn', re.I)}, 'text_pattern': r'^Download( Now)?$'},
+    {'type': 'Link with PixelDrain Hint', 'tag': 'a', 'attrs': {'href': re.compile(r'pixel', re.I)}},
+    {'type': 'Link with FSL Hint', 'tag': 'a', 'attrs': {'href': re.compile(r'fsl\.pub', re.I)}}, ]
+VIDEO_STRATEGY_NAMES = [priority['type'] for priority in VIDEO_SEARCH_PRIORITIES]
 
 # --- Helper Functions (No changes needed below) ---
 def drive_is_intermediate_link(url):
@@ -73,14 +116,40 @@ def drive_is_intermediate_link(url):
         return any(domain == intermediate or domain.endswith('.' + intermediate) for intermediate in DRIVE_INTERMEDIATE_DOMAINS)
     except Exception: return False
 
-def drive_extract_final_download_link(soup, base_url, log_entries):
+def record_page_strategies(kind, page_url, outcomes):
+    # outcomes: strategy -> (link it produced, or None when it was on the page but yielded nothing,
+    # seconds it took). Returned links are HEAD-checked like GDFLIX mirror links.
+    host = urlparse(page_url).hostname
+    for strategy, (link, seconds) in outcomes.items():
+        strategy_learner.record(kind, host, strategy, link, seconds, link)
+        if link: probe_strategy_link(kind, strategy, host, link, DEFAULT_HEADERS)
+
+def drive_extract_final_download_link(soup, base_url, log_entries, outcomes=None, learned=None):
+    # learned: every preferred button name in the host's learned order; the caller asks the
+    # learner once for both parses of extract_with_fallback
+    if outcomes is None: outcomes = {}
+    if learned is None: learned = strategy_learner.order('drive', urlparse(base_url).hostname, DRIVE_STRATEGY_NAMES)
     direct_link = None
     found_link = False
+    # Single walk over the page: a tag goes under every text pattern its own string matches
+    # (same semantics as one find_all(string=...) per pattern) and the anchors are kept for the
+    # href-hint fallback, instead of re-scanning the document once per pattern.
+    candidate_tags = soup.find_all(['a', 'button'])
+    matches_by_pattern = {pattern: [] for pattern in DRIVE_PREFERRED_BUTTON_TEXTS}
+    for tag in candidate_tags:
+        tag_string = tag.string
+        if tag_string is None: continue
+        for pattern, compiled in DRIVE_PREFERRED_BUTTON_PATTERNS:
+            if compiled.search(tag_string):
+                matches_by_pattern[pattern].append(tag)
     log_entries.append("(drive) Searching for preferred button text...")
-    for pattern in DRIVE_PREFERRED_BUTTON_TEXTS:
+    offered = [DRIVE_PREFERRED_BUTTON_NAMES[pattern] for pattern in DRIVE_PREFERRED_BUTTON_TEXTS if matches_by_pattern[pattern]]
+    learned = [name for name in learned if name in offered]
+    if learned != offered: log_entries.append(f"(drive) Using learned button order for this host: {', '.join(learned)}")
+    for pattern in [DRIVE_PREFERRED_BUTTON_PATTERNS_BY_NAME[name] for name in learned]:
+        started = time.monotonic()
         try:
-            potential_matches = soup.find_all(['a', 'button'], string=re.compile(pattern, re.IGNORECASE))
-            for match in potential_matches:
+            for match in matches_by_pattern[pattern]:
                 href = None
                 if match.name == 'a': href = match.get('href')
                 elif match.name == 'button':
@@ -99,6 +168,7 @@ def drive_extract_final_download_link(soup, base_url, log_entries):
                         log_entries.append(f"(drive) Found via preferred text '{pattern}': {direct_link}")
                         break
                     else: log_entries.append(f"(drive) Found preferred text '{pattern}' but resolved href '{temp_link}' doesn't look final or is intermediate.")
+            outcomes[DRIVE_PREFERRED_BUTTON_NAMES[pattern]] = (direct_link, time.monotonic() - started)
             if found_link: break
         except Exception as e:
             log_entries.append(f"(drive) Error during preferred text search for pattern '{pattern}': {e}")
@@ -106,7 +176,7 @@ def drive_extract_final_download_link(soup, base_url, log_entries):
 
     if not found_link:
         log_entries.append("(drive) Preferred text not found/yielded final link. Searching for links with FINAL_LINK_HINTS...")
-        potential_links = soup.find_all('a', href=True)
+        potential_links = [tag for tag in candidate_tags if tag.name == 'a' and tag.has_attr('href')]
         for link_tag in potential_links:
             href = link_tag.get('href', '')
             if href and isinstance(href, str):
@@ -129,23 +199,24 @@ def drive_extract_final_download_link(soup, base_url, log_entries):
         return None
 
 # --- Core Function for 'drive' links ---
-def handle_drive_link(session, hubcloud_url):
+def handle_drive_link(session, hubcloud_url, log_entries=None):
     current_url = hubcloud_url
-    log_entries = []
+    if log_entries is None: log_entries = []
     final_link = None
     try:
         log_entries.append(f"Processing Drive Link: {current_url}")
         initial_headers = DEFAULT_HEADERS.copy(); initial_headers['Referer'] = 'https://google.com/'
-        response_get = session.get(current_url, headers=initial_headers, timeout=REQUEST_TIMEOUT, allow_redirects=True)
+        with timed_stage('drive_initial', url=current_url):
+            response_get = session.get(current_url, headers=initial_headers, timeout=REQUEST_TIMEOUT, allow_redirects=True)
         response_get.raise_for_status()
+        note_challenge_page(response_get.url, response_get.text)
         session.headers.update(DEFAULT_HEADERS); session.headers['Referer'] = response_get.url
-        soup_get = BeautifulSoup(response_get.text, PARSER)
+        soup_get, form = parse_with_fallback(response_get.text, lambda page: page.find('form', {'method': re.compile('post', re.IGNORECASE)}))
         current_url = response_get.url
         log_entries.append(f"(drive) Initial page fetched (Status: {response_get.status_code}, URL: {current_url})")
 
         form_data = {}
         log_entries.append("(drive) Searching for POST form data...")
-        form = soup_get.find('form', {'method': re.compile('post', re.IGNORECASE)})
         if form:
             inputs = form.find_all('input', {'type': 'hidden'})
             for input_tag in inputs:
@@ -183,15 +254,19 @@ def handle_drive_link(session, hubcloud_url):
         log_entries.append(f"(drive) Using POST data: {form_data}")
         post_url = current_url
         session.headers['Referer'] = current_url
-        response_post1 = session.post(post_url, data=form_data, timeout=REQUEST_TIMEOUT + 15, allow_redirects=True)
+        with timed_stage('drive_post', url=post_url):
+            response_post1 = session.post(post_url, data=form_data, timeout=REQUEST_TIMEOUT + 15, allow_redirects=True)
         response_post1.raise_for_status()
-        soup_post1 = BeautifulSoup(response_post1.text, PARSER)
+        note_challenge_page(response_post1.url, response_post1.text)
         current_url = response_post1.url
         session.headers['Referer'] = current_url
         log_entries.append(f"(drive) POST request successful (Status: {response_post1.status_code}, Landed on URL: {current_url})")
 
         log_entries.append(f"(drive) Analyzing response from {current_url}...")
-        final_link = drive_extract_final_download_link(soup_post1, current_url, log_entries)
+        outcomes = {}
+        learned = strategy_learner.order('drive', urlparse(current_url).hostname, DRIVE_STRATEGY_NAMES)
+        soup_post1, final_link = extract_with_fallback(response_post1.text, lambda page, page_logs: drive_extract_final_download_link(page, current_url, page_logs, outcomes, learned), log_entries, outcomes=outcomes)
+        record_page_strategies('drive', current_url, outcomes)
         if final_link:
             log_entries.append(f"(drive) Found final link directly after first POST.")
             return final_link, log_entries
@@ -210,8 +285,9 @@ def handle_drive_link(session, hubcloud_url):
                          break
         if intermediate_link:
             log_entries.append(f"(drive) Following intermediate link: {intermediate_link}")
-            time.sleep(2)
-            response_intermediate = session.get(intermediate_link, timeout=REQUEST_TIMEOUT + 30, allow_redirects=True)
+            time.sleep(upstream_pacing.delay_for(session, intermediate_link))
+            with timed_stage('drive_intermediate', url=intermediate_link):
+                response_intermediate = session.get(intermediate_link, timeout=REQUEST_TIMEOUT + 30, allow_redirects=True)
             intermediate_final_url = response_intermediate.url
             session.headers['Referer'] = intermediate_final_url
             content_type = response_intermediate.headers.get('Content-Type', '').lower()
@@ -239,17 +315,21 @@ def handle_drive_link(session, hubcloud_url):
                 log_entries.append("Error: Intermediate link didn't yield a final file or recognizable redirect.")
                 return None, log_entries
             response_intermediate.raise_for_status()
-            soup_intermediate = BeautifulSoup(response_intermediate.text, PARSER)
             log_entries.append(f"(drive) Intermediate page fetched (Status: {response_intermediate.status_code}, Final URL: {intermediate_final_url})")
-            final_link = drive_extract_final_download_link(soup_intermediate, intermediate_final_url, log_entries)
+            outcomes = {}
+            learned = strategy_learner.order('drive', urlparse(intermediate_final_url).hostname, DRIVE_STRATEGY_NAMES)
+            _, final_link = extract_with_fallback(response_intermediate.text, lambda page, page_logs: drive_extract_final_download_link(page, intermediate_final_url, page_logs, outcomes, learned), log_entries, outcomes=outcomes)
+            record_page_strategies('drive', intermediate_final_url, outcomes)
             if final_link:
                  log_entries.append(f"(drive) Found final link after following intermediate link.")
                  return final_link, log_entries
             else:
                  log_entries.append("Error: Could not find final link after following intermediate link.")
+                 log_html(log_entries, f"Intermediate Page HTML (URL: {intermediate_final_url})", response_intermediate.text)
                  return None, log_entries
         else:
              log_entries.append("Error: No final link or recognized intermediate link found in the first POST response.")
+             log_html(log_entries, f"POST Response HTML (URL: {current_url})", response_post1.text)
              return None, log_entries
     except requests.exceptions.Timeout as e:
         log_entries.append(f"Error: Request timed out during process for {hubcloud_url}. Details: {e}")
@@ -265,18 +345,20 @@ def handle_drive_link(session, hubcloud_url):
         return None, log_entries
 
 # --- Helper/Core Functions for 'video' links ---
-def video_fetch_and_parse(session, url, referer=None, log_entries=None):
+def video_fetch_and_parse(session, url, referer=None, log_entries=None, stop_when=None):
     if log_entries is None: log_entries = []
     log_entries.append(f"(video) Fetching: {url}")
     current_headers = session.headers.copy()
     if referer: current_headers['Referer'] = referer
     try:
-        response = session.get(url, headers=current_headers, timeout=REQUEST_TIMEOUT, allow_redirects=True)
+        response, raw_html, complete = fetch_html(session, url, stop_when=stop_when, headers=current_headers, timeout=REQUEST_TIMEOUT, allow_redirects=True)
         response.raise_for_status()
-        raw_html = response.text
         session.headers['Referer'] = response.url
+        note_challenge_page(response.url, raw_html)
         log_entries.append(f"(video) Successfully fetched (Status: {response.status_code}, Landed on: {response.url})")
-        soup = BeautifulSoup(raw_html, PARSER)
+        if not complete: log_entries.append(f"(video) Target found in the first {len(raw_html)} characters; stopped downloading the rest of the page.")
+        # The lxml view when available; callers fall back to a BeautifulSoup tree if it finds nothing
+        soup = fast_page(raw_html) or BeautifulSoup(raw_html, PARSER)
         return soup, raw_html, response.url, log_entries
     except requests.exceptions.Timeout:
         log_entries.append(f"Error: Request timed out ({REQUEST_TIMEOUT}s) for {url}")
@@ -314,52 +396,95 @@ def video_find_intermediate_link(soup, initial_url, log_entries):
         log_entries.append(f"Error: Could not find the intermediate 'Generate' <a> tag using text OR href search.")
         return None, log_entries
 
-def video_find_final_download_link(soup, raw_html, intermediate_url, log_entries):
+def video_find_final_download_link(soup, raw_html, intermediate_url, log_entries, outcomes=None, learned=None):
+    # learned: VIDEO_STRATEGY_NAMES in the host's learned order, asked for once by the caller
+    if outcomes is None: outcomes = {}
+    if learned is None: learned = strategy_learner.order('video', urlparse(intermediate_url).hostname, VIDEO_STRATEGY_NAMES)
     if not soup: return None, log_entries
     log_entries.append("(video) Searching for final download link on intermediate page...")
     final_link_tag = None; link_type = "Unknown"
-    search_priorities = [
-        {'type': 'PixelDrain Button', 'tag': 'a', 'attrs': {'class': re.compile(r'btn-success', re.I)}, 'text_pattern': r'Download\s*\[PixelServer'},
-        {'type': 'FSL Server Button', 'tag': 'a', 'attrs': {'class': re.compile(r'btn-success', re.I)}, 'text_pattern': r'Download\s*\[FSL Server'},
-        {'type': 'Download File [Size] Button', 'tag': 'a', 'attrs': {'class': re.compile(r'btn-success', re.I)}, 'text_pattern': r'Download File\s*\['},
-        {'type': 'Generic Download Button', 'tag': 'a', 'attrs': {'class': re.compile(r'btn', re.I)}, 'text_pattern': r'^Download( Now)?$'},
-        {'type': 'Link with PixelDrain Hint', 'tag': 'a', 'attrs': {'href': re.compile(r'pixel', re.I)}},
-        {'type': 'Link with FSL Hint', 'tag': 'a', 'attrs': {'href': re.compile(r'fsl\.pub', re.I)}}, ]
+    search_priorities = VIDEO_SEARCH_PRIORITIES
+    if learned != VIDEO_STRATEGY_NAMES:
+        log_entries.append(f"(video) Using learned strategy order for this host: {', '.join(learned)}")
+        search_priorities = sorted(search_priorities, key=lambda priority: learned.index(priority['type']))
     for priority in search_priorities:
+        started = time.monotonic()
         link_type = priority['type']; log_entries.append(f"(video) Trying strategy: {link_type}")
         potential_tags = soup.find_all(priority['tag'], **priority.get('attrs', {}))
+        matched = False
         for tag in potential_tags:
             if 'text_pattern' in priority:
                 tag_text = tag.get_text(strip=True);
                 if not re.search(priority['text_pattern'], tag_text, re.IGNORECASE): continue
+            matched = True
             href_value = tag.get('href','').strip()
             if href_value and not href_value.startswith(('#', 'javascript:')): final_link_tag = tag; break
         if final_link_tag: log_entries.append(f"(video) Found potential tag via strategy: {link_type}"); break
+        if matched: outcomes[link_type] = (None, time.monotonic() - started)
     if final_link_tag:
         href_value = final_link_tag.get('href','').strip(); final_url = urljoin(intermediate_url, href_value)
         log_entries.append(f"(video) Resolved final link: {final_url}")
         if not urlparse(final_url).scheme or not urlparse(final_url).netloc:
-             log_entries.append(f"Error: Resolved final URL '{final_url}' seems invalid."); return None, log_entries
+             log_entries.append(f"Error: Resolved final URL '{final_url}' seems invalid."); outcomes[link_type] = (None, time.monotonic() - started); return None, log_entries
+        outcomes[link_type] = (final_url, time.monotonic() - started)
         return final_url, log_entries
     else:
         log_entries.append("FAILED TO FIND VIDEO DOWNLOAD LINK"); log_entries.append("Could not find a usable download link.")
         return None, log_entries
 
-def handle_video_link(session, hubcloud_url):
-    final_link = None; log_entries = []
+def handle_video_link(session, hubcloud_url, log_entries=None):
+    final_link = None
+    if log_entries is None: log_entries = []
     try:
         log_entries.append(f"Processing Video Link: {hubcloud_url}"); session.headers.update(DEFAULT_HEADERS)
-        initial_soup, _, initial_final_url, log_entries = video_fetch_and_parse(session, hubcloud_url, log_entries=log_entries)
+        with timed_stage('video_initial', url=hubcloud_url):
+            initial_soup, initial_raw_html, initial_final_url, log_entries = video_fetch_and_parse(session, hubcloud_url, log_entries=log_entries, stop_when=stop_on_pattern(VIDEO_GENERATE_ANCHOR_PATTERN))
         if not initial_soup: log_entries.append("Error: Failed to fetch or parse initial page."); return None, log_entries
-        intermediate_link, log_entries = video_find_intermediate_link(initial_soup, initial_final_url, log_entries)
-        if not intermediate_link: log_entries.append("Error: Could not find the intermediate link."); return None, log_entries
-        time.sleep(1)
-        intermediate_soup, intermediate_raw_html, intermediate_final_url, log_entries = video_fetch_and_parse(session, intermediate_link, referer=initial_final_url, log_entries=log_entries)
+        _, intermediate_link = extract_with_fallback(initial_raw_html, lambda page, page_logs: video_find_intermediate_link(page, initial_final_url, page_logs)[0], log_entries, page=initial_soup)
+        if not intermediate_link:
+            log_entries.append("Error: Could not find the intermediate link.")
+            log_html(log_entries, f"Initial Page HTML (URL: {initial_final_url})", initial_raw_html)
+            return None, log_entries
+        time.sleep(upstream_pacing.delay_for(session, intermediate_link))
+        with timed_stage('video_intermediate', url=intermediate_link):
+            intermediate_soup, intermediate_raw_html, intermediate_final_url, log_entries = video_fetch_and_parse(session, intermediate_link, referer=initial_final_url, log_entries=log_entries, stop_when=stop_on_pattern(VIDEO_PIXELSERVER_ANCHOR_PATTERN))
         if not intermediate_soup: log_entries.append("Error: Failed to fetch or parse intermediate page."); return None, log_entries
-        final_link, log_entries = video_find_final_download_link(intermediate_soup, intermediate_raw_html, intermediate_final_url, log_entries)
+        outcomes = {}
+        learned = strategy_learner.order('video', urlparse(intermediate_final_url).hostname, VIDEO_STRATEGY_NAMES)
+        _, final_link = extract_with_fallback(intermediate_raw_html, lambda page, page_logs: video_find_final_download_link(page, intermediate_raw_html, intermediate_final_url, page_logs, outcomes, learned)[0], log_entries, page=intermediate_soup, outcomes=outcomes)
+        record_page_strategies('video', intermediate_final_url, outcomes)
     except Exception as e: log_entries.append(f"FATAL ERROR during video link processing: {e}\n{traceback.format_exc()}"); return None, log_entries
     return final_link, log_entries
 
+# --- Error Extraction ---
+def extract_error_message(logs):
+    failure_indicators = ["Error:", "FATAL ERROR", "FAILED", "Could not find", "timed out"]
+    extracted_error = "Extraction Failed (Check logs)"
+    for log_entry in reversed(logs):
+       if any(indicator in log_entry for indicator in failure_indicators):
+            parts = log_entry.split(":", 1)
+            extracted_error = parts[-1].strip() if len(parts) > 1 else log_entry.strip()
+            break
+    return extracted_error[:150]
+
+# --- Service ---
+def is_supported_hubcloud_path(path):
+    path = path.lower()
+    return path.startswith('/drive/') or path.startswith('/video/')
+
+def find_hubcloud_link(hubcloud_url, logs):
+    session = new_session()
+    if urlparse(hubcloud_url).path.lower().startswith('/drive/'):
+        logs.append("Detected '/drive/' link type.")
+        final_download_link, _ = handle_drive_link(session, hubcloud_url, logs)
+    else:
+        logs.append("Detected '/video/' link type.")
+        final_download_link, _ = handle_video_link(session, hubcloud_url, logs)
+    return final_download_link
+
+service = Service('hubcloud', find_hubcloud_link, extract_error_message, 'hubcloudUrl', ('drive', 'video'), ('GDFLIX_API_URL', 'GDFLIX'),
+                  failure_fingerprints=HUBCLOUD_FAILURE_FINGERPRINTS)
+service.instrument(app)
 
 # --- CORS Helper Functions ---
 def _build_cors_preflight_response():
@@ -380,11 +505,14 @@ def hubcloud_bypass_api():
         return _build_cors_preflight_response()
 
     elif request.method == 'POST':
-        logs = []
-        result = {"success": False, "error": "Request processing failed", "finalUrl": None, "logs": logs}
+        logs = LogBuffer()
+        result = {"success": False, "error": "Request processing failed", "finalUrl": None, "expiresAt": None, "cached": False, "logs": logs}
         hubcloud_url = None
-        final_download_link = None
+        final_download_link = link_expires_at = None
         status_code = 500
+        response_mode = DEFAULT_RESPONSE_MODE
+        log_level = request_log_level(None, response_mode)
+        trace = None
 
         try:
             try:
@@ -392,6 +520,9 @@ def hubcloud_bypass_api():
                 if not data:
                     raise ValueError("No JSON data received")
                 hubcloud_url = data.get('hubcloudUrl')
+                response_mode = request_response_mode(data)
+                log_level = request_log_level(data, response_mode)
+                logs.capture = service.debug_captures if capture_requested(data) else None
                 logs.append("Received JSON POST body.")
             except Exception as e:
                 logs.append(f"Error: Could not parse JSON request body: {e}")
@@ -413,17 +544,13 @@ def hubcloud_bypass_api():
                  status_code = 400
                  return _corsify_actual_response(jsonify(result)), status_code
 
-            session = requests.Session()
-            path = parsed_start_url.path.lower()
-
-            if path.startswith('/drive/'):
-                logs.append("Detected '/drive/' link type.")
-                final_download_link, script_logs = handle_drive_link(session, hubcloud_url)
-                logs.extend(script_logs)
-            elif path.startswith('/video/'):
-                 logs.append("Detected '/video/' link type.")
-                 final_download_link, script_logs = handle_video_link(session, hubcloud_url)
-                 logs.extend(script_logs)
+            resolve_error = None
+
+            if is_supported_hubcloud_path(parsed_start_url.path):
+                with tracer.trace('hubcloud.resolve', force=trace_requested(data), url=hubcloud_url) as trace:
+                    final_download_link, resolve_error, cached, link_expires_at = service.process_request(hubcloud_url, logs)
+                result["cached"] = cached
+                if trace and data.get('trace') is True: result["trace"] = trace.to_dict()
             else:
                  error_msg = f"Unknown HubCloud URL type (path: {parsed_start_url.path})"
                  logs.append(f"Error: {error_msg}")
@@ -432,19 +559,13 @@ def hubcloud_bypass_api():
             if final_download_link:
                 result["success"] = True
                 result["finalUrl"] = final_download_link
+                result["expiresAt"] = link_expires_at
                 result["error"] = None
                 status_code = 200
             else:
                 result["success"] = False
-                if result.get("error", "Request processing failed") == "Request processing failed":
-                     failure_indicators = ["Error:", "FATAL ERROR", "FAILED", "Could not find", "timed out"]
-                     extracted_error = "Extraction Failed (Check logs)"
-                     for log_entry in reversed(logs):
-                        if any(indicator in log_entry for indicator in failure_indicators):
-                             parts = log_entry.split(":", 1)
-                             extracted_error = parts[-1].strip() if len(parts) > 1 else log_entry.strip()
-                             break
-                     result["error"] = extracted_error[:150]
+                if resolve_error:
+                     result["error"] = resolve_error
 
         except Exception as e:
             app.logger.error(f"FATAL API Handler Error: {e}", exc_info=True)
@@ -454,11 +575,97 @@ def hubcloud_bypass_api():
             status_code = 500
 
         finally:
-            result["logs"] = logs
+            shape_response(result, logs, response_mode, log_level, trace)
             return _corsify_actual_response(jsonify(result)), status_code
     else:
         return jsonify({"error": "Method Not Allowed"}), 405
 
+# --- Batch Endpoint ---
+@app.route('/api/batch', methods=['POST', 'OPTIONS'])
+def batch_bypass_api():
+    if request.method == 'OPTIONS':
+        return _build_cors_preflight_response()
+    data = request.get_json(silent=True) or {}
+    urls = data.get('urls')
+    if not isinstance(urls, list) or not urls:
+        return _corsify_actual_response(jsonify({"success": False, "error": "Missing or invalid urls list in request body"})), 400
+    if len(urls) > BATCH_MAX_URLS:
+        return _corsify_actual_response(jsonify({"success": False, "error": f"Too many URLs in one batch (max {BATCH_MAX_URLS})."})), 400
+    include_logs = bool(data.get('includeLogs'))
+    include_trace = data.get('trace') is True
+
+    def generate():
+        # One NDJSON line per link, in completion order
+        for item in batch_results(service, urls, include_logs, include_trace):
+            yield json.dumps(item) + "\n"
+
+    return _corsify_actual_response(Response(stream_with_context(generate()), mimetype='application/x-ndjson'))
+
+# --- Job Endpoints ---
+@app.route('/api/hubcloud/jobs', methods=['POST', 'OPTIONS'])
+def hubcloud_submit_job_api():
+    if request.method == 'OPTIONS':
+        return _build_cors_preflight_response()
+    data = request.get_json(silent=True) or {}
+    hubcloud_url = data.get('hubcloudUrl')
+    if not hubcloud_url or not isinstance(hubcloud_url, str):
+        return _corsify_actual_response(jsonify({"success": False, "error": "Missing or invalid hubcloudUrl in request body"})), 400
+    parsed_start_url = urlparse(hubcloud_url)
+    if not parsed_start_url.scheme or not parsed_start_url.netloc:
+        return _corsify_actual_response(jsonify({"success": False, "error": f"Invalid URL format provided: {hubcloud_url}"})), 400
+    if not is_supported_hubcloud_path(parsed_start_url.path):
+        return _corsify_actual_response(jsonify({"success": False, "error": f"Unknown HubCloud URL type (path: {parsed_start_url.path})"})), 400
+
+    job = submit_job(service, hubcloud_url, capture_html=capture_requested(data), include_trace=data.get('trace') is True)
+    if job is None:
+        return _corsify_actual_response(jsonify({"success": False, "error": "Too many jobs in progress, please try again later."})), 503
+    return _corsify_actual_response(jsonify({"success": True, "jobId": job["id"], "status": job["status"], "statusUrl": f"/api/hubcloud/jobs/{job['id']}"})), 202
+
+@app.route('/api/hubcloud/jobs/<job_id>', methods=['GET'])
+def hubcloud_job_status_api(job_id):
+    job = service.jobs.get(job_id)
+    if job is None:
+        return _corsify_actual_response(jsonify({"success": False, "error": "Job not found (it may have expired)."})), 404
+    return _corsify_actual_response(jsonify(job)), 200
+
+# --- Prefetch Endpoint ---
+@app.route('/api/prefetch', methods=['POST', 'OPTIONS'])
+def prefetch_api():
+    if request.method == 'OPTIONS':
+        return _build_cors_preflight_response()
+    data = request.get_json(silent=True) or {}
+    urls = data.get('urls')
+    if not isinstance(urls, list) or not urls:
+        return _corsify_actual_response(jsonify({"success": False, "error": "Missing or invalid urls list in request body"})), 400
+    if len(urls) > PREFETCH_MAX_URLS:
+        return _corsify_actual_response(jsonify({"success": False, "error": f"Too many URLs in one request (max {PREFETCH_MAX_URLS})."})), 400
+    body, status_code = prefetch_links(service, urls, data.get('priority', 0))
+    return _corsify_actual_response(jsonify(body)), status_code
+
+# --- Debug Capture Endpoint ---
+@app.route('/api/hubcloud/debug/<capture_id>', methods=['GET'])
+def hubcloud_debug_capture_api(capture_id):
+    html = service.debug_captures.get(capture_id)
+    if html is None:
+        return _corsify_actual_response(jsonify({"success": False, "error": "Capture not found (it may have expired)."})), 404
+    # Served as text so captured upstream pages never run in this origin
+    return _corsify_actual_response(Response(html, content_type='text/plain; charset=utf-8', headers={'X-Content-Type-Options': 'nosniff'}))
+
+# --- Stats Endpoint ---
+@app.route('/api/hubcloud/stats', methods=['GET'])
+def hubcloud_stats_api():
+    return _corsify_actual_response(jsonify(service.stats())), 200
+
+# --- Strategy Stats Endpoint ---
+@app.route('/api/hubcloud/strategies', methods=['GET'])
+def hubcloud_strategy_stats_api():
+    return _corsify_actual_response(jsonify({"learning": STRATEGY_LEARNING, "strategies": strategy_learner.stats()})), 200
+
+# --- Metrics Endpoint ---
+@app.route('/metrics', methods=['GET'])
+def metrics_api():
+    return _corsify_actual_response(Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8'))
+
 # --- Self-Ping Endpoint ---
 @app.route('/ping', methods=['GET'])
 def ping_service():
@@ -491,10 +698,9 @@ def self_ping_task():
         except Exception as e:
             app.logger.error(f"Unexpected error in HubCloud self_ping_task: {e}", exc_info=True)
 
-
 # --- Run Flask App ---
 if __name__ == '__main__':
-    port = int(os.environ.get("PORT", 5002))
+    port = env_int("PORT", 5002, minimum=1)
 
     if os.environ.get("RENDER_EXTERNAL_URL"):
         ping_thread = threading.Thread(target=self_ping_task, daemon=True)
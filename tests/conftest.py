@@ -0,0 +1,107 @@
+"""Fixtures running benchmarks/mock_upstream.py and the two apps as subprocesses on free ports."""
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlparse
+
+import pytest
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT) # bypass_common, for the unit tests
+STARTUP_TIMEOUT = 30 # seconds
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_until_up(process, url, log_path):
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if process.poll() is not None: break
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    with open(log_path, encoding='utf-8', errors='replace') as handle:
+        pytest.fail(f"{url} did not start:\n{handle.read()[-3000:]}")
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def resolve(base, **body):
+    # POST body to the GDFLIX app at base and return its JSON answer
+    return requests.post(f"{base}/api/gdflix", json=body, timeout=60).json()
+
+def start_mock(log_path):
+    # Fast and small: no added latency, 4 KB pages, Fast Cloud links ready after 1s. Returns (process, base URL)
+    port = free_port()
+    with open(log_path, 'w') as log:
+        process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'benchmarks', 'mock_upstream.py'), '--port', str(port),
+                                    '--latency', '0', '--page-kb', '4', '--fast-cloud-ready', '1'],
+                                   stdout=log, stderr=subprocess.STDOUT)
+    base = f"http://127.0.0.1:{port}"
+    wait_until_up(process, f"{base}/video/ready", log_path)
+    return process, base
+
+@pytest.fixture(scope='session')
+def mock_upstream(tmp_path_factory):
+    process, base = start_mock(tmp_path_factory.mktemp('mock') / 'mock.log')
+    yield base
+    stop(process)
+
+@pytest.fixture
+def start_app(mock_upstream, tmp_path):
+    # start_app('gdflix' or 'hubcloud', server='python' or 'gunicorn', **env) -> (base URL, log path).
+    # Each app gets its own SQLite file and capture directory under the test's tmp_path, and the
+    # mock host is exempt from the default 5 requests/s upstream rate limit.
+    processes = []
+
+    def start(name, server='python', **env):
+        port = free_port()
+        app_dir = os.path.join(ROOT, f"{name}_api")
+        app_env = dict(os.environ, PORT=str(port), SHARED_CACHE_DB_PATH=str(tmp_path / f"{name}.sqlite3"),
+                       DEBUG_CAPTURE_DIR=str(tmp_path / f"{name}_captures"), BREAKER_LINK_PROBE_RATE='0',
+                       EXTRA_DRIVE_INTERMEDIATE_DOMAINS=urlparse(mock_upstream).netloc,
+                       UPSTREAM_HOST_LIMITS=f"{urlparse(mock_upstream).hostname}=64/1000/1000", **env)
+        if server == 'gunicorn':
+            command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn_config.py'), '--chdir', app_dir, 'app:app']
+        else:
+            command = [sys.executable, os.path.join(app_dir, 'app.py')]
+        log_path = tmp_path / f"{name}.log"
+        with open(log_path, 'w') as log:
+            process = subprocess.Popen(command, env=app_env, stdout=log, stderr=subprocess.STDOUT)
+        processes.append(process)
+        base = f"http://127.0.0.1:{port}"
+        wait_until_up(process, f"{base}/ping", log_path)
+        return base, log_path
+
+    yield start
+    for process in processes: stop(process)
+
+@pytest.fixture(scope='session')
+def gdflix_module(tmp_path_factory):
+    # gdflix_api/app.py imported in-process, for unit tests of its own classes
+    directory = tmp_path_factory.mktemp('gdflix_module')
+    env = {'SHARED_CACHE_DB_PATH': str(directory / 'gdflix.sqlite3'), 'DEBUG_CAPTURE_DIR': str(directory / 'captures')}
+    saved = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    try:
+        spec = importlib.util.spec_from_file_location('gdflix_app', os.path.join(ROOT, 'gdflix_api', 'app.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        for name, value in saved.items():
+            if value is None: os.environ.pop(name, None)
+            else: os.environ[name] = value
+    return module
@@ -0,0 +1,89 @@
+"""Batch resolution: per-host dispatch and the NDJSON endpoint."""
+import json
+import queue
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import requests
+
+from bypass_common import batch
+from bypass_common.batch import HostDispatcher
+
+# Stands in for a GDFLIX Service whose HubCloud sibling is configured
+SERVICE = SimpleNamespace(link_types=('gdflix',), sibling_url='http://sibling.invalid', sibling_env='HUBCLOUD_API_URL',
+                          sibling_label='HubCloud')
+
+class SiblingResponse:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+def test_dispatcher_keeps_a_slow_host_from_blocking_others():
+    executor = ThreadPoolExecutor(max_workers=2)
+    dispatcher = HostDispatcher(executor, per_host=1)
+    release, done, all_done = threading.Event(), [], threading.Semaphore(0)
+    for index in range(3):
+        dispatcher.submit('slow.example', lambda index: release.wait(10) and (done.append(('slow', index)), all_done.release()), index)
+    fast_done = threading.Event()
+    dispatcher.submit('fast.example', lambda: (done.append(('fast', 0)), fast_done.set()))
+    assert fast_done.wait(5), "the fast host waited behind the slow one"
+    assert dispatcher.stats() == {"running": 1, "waiting": 2}
+    release.set()
+    assert all(all_done.acquire(timeout=5) for _ in range(3))
+    executor.shutdown(wait=True)
+    assert sorted(done) == [('fast', 0), ('slow', 0), ('slow', 1), ('slow', 2)]
+    assert dispatcher.stats() == {"running": 0, "waiting": 0}
+
+def test_batch_streams_one_line_per_link(start_app, mock_upstream):
+    gdflix, _ = start_app('gdflix')
+    urls = [f"{mock_upstream}/file/pd/{uuid.uuid4().hex}" for _ in range(6)] + ["not a url"]
+    response = requests.post(f"{gdflix}/api/batch", json={"urls": urls, "includeLogs": True}, timeout=60)
+    assert response.headers["Content-Type"].startswith('application/x-ndjson')
+    items = sorted((json.loads(line) for line in response.text.splitlines()), key=lambda item: item["index"])
+    assert [item["index"] for item in items] == list(range(7))
+    assert all(item["success"] and item["finalUrl"].startswith('https://pixeldrain.com/') for item in items[:6])
+    assert items[6]["error"] == "Invalid URL format provided: not a url"
+    assert items[0]["logs"]
+
+def test_mixed_batch_without_sibling_rejects_other_links(start_app, mock_upstream):
+    gdflix, _ = start_app('gdflix', HUBCLOUD_API_URL='')
+    response = requests.post(f"{gdflix}/api/batch", json={"urls": [f"{mock_upstream}/drive/{uuid.uuid4().hex}"]}, timeout=60)
+    item = json.loads(response.text)
+    assert not item["success"] and 'HUBCLOUD_API_URL' in item["error"]
+
+def test_batch_rejects_bad_bodies(start_app):
+    gdflix, _ = start_app('gdflix')
+    assert requests.post(f"{gdflix}/api/batch", json={"urls": []}, timeout=10).status_code == 400
+    assert requests.post(f"{gdflix}/api/batch", json={"urls": ["x"] * 501}, timeout=10).status_code == 400
+
+def test_forwarding_answers_every_link_when_the_sibling_sends_garbage(monkeypatch):
+    lines = [json.dumps({"index": 0, "success": True}).encode(), b'[1, 2]']
+    monkeypatch.setattr(batch.sibling_session, 'post', lambda *args, **kwargs: SiblingResponse(lines))
+    results = queue.Queue()
+    batch.forward_batch_items(SERVICE, [(3, 'https://h.example/drive/a'), (5, 'https://h.example/drive/b'),
+                                        (7, 'https://h.example/drive/c')], False, False, results)
+    items = [results.get_nowait() for _ in range(3)]
+    assert results.empty()
+    assert items[0] == {"index": 3, "success": True}
+    assert [item["index"] for item in items[1:]] == [5, 7]
+    assert all(not item["success"] and 'invalid answer' in item["error"] for item in items[1:])
+
+def test_batch_gives_up_on_links_that_never_answer(monkeypatch):
+    monkeypatch.setattr(batch, 'BATCH_IDLE_TIMEOUT', 0.2)
+    monkeypatch.setattr(batch, 'forward_batch_items', lambda *args: None) # the sibling never answers
+    items = list(batch.batch_results(SERVICE, ['https://h.example/drive/a', 'not a url']))
+    assert [item["index"] for item in items] == [1, 0]
+    assert not items[1]["success"] and 'within 0.2s' in items[1]["error"]
@@ -0,0 +1,76 @@
+"""Circuit breaker transitions: closed -> open -> half_open -> closed (or back to open)."""
+import uuid
+
+import pytest
+
+from bypass_common import breakers
+from bypass_common.breakers import BREAKER_HALF_OPEN_PROBES, BREAKER_MIN_CALLS, CircuitBreaker
+from conftest import resolve
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker('test', 'upstream.example', slow_seconds=10)
+
+def trip(breaker):
+    for _ in range(BREAKER_MIN_CALLS): breaker.record(False, 0.1)
+
+def test_stays_closed_below_the_minimum_calls(breaker):
+    for _ in range(BREAKER_MIN_CALLS - 1): breaker.record(False, 0.1)
+    assert breaker.current_state() == 'closed'
+    assert breaker.allow()
+
+def test_opens_on_the_error_rate(breaker):
+    trip(breaker)
+    assert breaker.current_state() == 'open'
+    assert not breaker.allow()
+    assert breaker.reason.startswith('100% errors')
+    assert breaker.trips == 1
+
+def test_opens_on_the_slow_call_rate(breaker):
+    for _ in range(BREAKER_MIN_CALLS): breaker.record(True, 30)
+    assert breaker.current_state() == 'open'
+    assert 'slow' in breaker.reason
+
+def test_mixed_outcomes_under_the_thresholds_stay_closed(breaker):
+    for index in range(BREAKER_MIN_CALLS * 2): breaker.record(index % 3 != 0, 0.1)
+    assert breaker.current_state() == 'closed'
+
+def test_half_open_admits_a_few_probes_then_closes(breaker, monkeypatch):
+    trip(breaker)
+    monkeypatch.setattr(breakers, 'BREAKER_OPEN_SECONDS', 0)
+    assert breaker.current_state() == 'half_open'
+    assert all(breaker.allow() for _ in range(BREAKER_HALF_OPEN_PROBES))
+    monkeypatch.setattr(breakers, 'BREAKER_OPEN_SECONDS', 60)
+    assert not breaker.allow() # probes already in flight
+    for _ in range(BREAKER_HALF_OPEN_PROBES): breaker.record(True, 0.1)
+    assert breaker.current_state() == 'closed'
+    assert breaker.reason is None and not breaker.outcomes
+
+def test_a_failed_probe_reopens(breaker, monkeypatch):
+    trip(breaker)
+    monkeypatch.setattr(breakers, 'BREAKER_OPEN_SECONDS', 0)
+    assert breaker.allow()
+    breaker.record(False, 0.1)
+    monkeypatch.setattr(breakers, 'BREAKER_OPEN_SECONDS', 60)
+    assert breaker.current_state() == 'open'
+    assert breaker.reason == 'probe failed'
+    assert breaker.trips == 2
+
+def test_a_cancelled_probe_frees_its_place(breaker, monkeypatch):
+    trip(breaker)
+    monkeypatch.setattr(breakers, 'BREAKER_OPEN_SECONDS', 0)
+    assert all(breaker.allow() for _ in range(BREAKER_HALF_OPEN_PROBES))
+    monkeypatch.setattr(breakers, 'BREAKER_OPEN_SECONDS', 60)
+    breaker.cancel()
+    assert breaker.allow()
+    assert not breaker.allow()
+
+def test_a_failing_strategy_falls_through_to_the_next(start_app, mock_upstream):
+    gdflix, _ = start_app('gdflix')
+    result = resolve(gdflix, gdflixUrl=f"{mock_upstream}/file/bcdb/{uuid.uuid4().hex}")
+    assert result["success"] and "gdindex.lol" in result["finalUrl"]
+    assert any("Fast Cloud failed. Trying next priority." in line for line in result["logs"])
+
+    result = resolve(gdflix, gdflixUrl=f"{mock_upstream}/file/bc/{uuid.uuid4().hex}")
+    assert not result["success"] and result["error"].startswith("HTTP Error: 503")
+    assert any("as upstream_error" in line for line in result["logs"])
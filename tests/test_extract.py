@@ -0,0 +1,20 @@
+"""The lxml fast path and its BeautifulSoup fallback."""
+import pytest
+
+from bypass_common.extract import FastTag, etree, extract_with_fallback
+
+pytestmark = pytest.mark.skipif(etree is None, reason="lxml is not installed")
+
+def test_fallback_keeps_only_the_answering_parse_outcomes():
+    # The fast path finds nothing and records a miss; the fallback's outcomes replace it
+    outcomes = {}
+    def extract(page, page_logs):
+        fast = isinstance(page, FastTag)
+        page_logs.append(f"searched {'fast' if fast else 'soup'} page")
+        outcomes['fast' if fast else 'soup'] = (None if fast else 'https://cdn.example/file', 0.1)
+        return None if fast else 'https://cdn.example/file'
+    logs = []
+    _, link = extract_with_fallback('<a href="https://cdn.example/file">Download</a>', extract, logs, outcomes=outcomes)
+    assert link == 'https://cdn.example/file'
+    assert outcomes == {'soup': ('https://cdn.example/file', 0.1)}
+    assert logs == ["searched soup page"]
@@ -0,0 +1,42 @@
+"""HTTP fixtures: a recorded benchmark run replays offline, with the upstream gone, to the same final links."""
+import json
+import os
+import subprocess
+import sys
+import uuid
+from urllib.parse import urlparse
+
+from conftest import ROOT, start_mock, stop
+
+def bench(tmp_path, mock, *args):
+    # benchmarks/bench_resolvers.py in a subprocess run from tmp_path, so relative paths are not taken from the repo
+    env = dict(os.environ, SHARED_CACHE_DB_PATH=str(tmp_path / 'cache.sqlite3'), DEBUG_CAPTURE_DIR=str(tmp_path / 'captures'),
+               BREAKER_LINK_PROBE_RATE='0', EXTRA_DRIVE_INTERMEDIATE_DOMAINS=urlparse(mock).netloc,
+               UPSTREAM_HOST_LIMITS=f"{urlparse(mock).hostname}=64/1000/1000")
+    return subprocess.run([sys.executable, os.path.join(ROOT, 'benchmarks', 'bench_resolvers.py'), *args], cwd=tmp_path,
+                          env=env, capture_output=True, text=True, timeout=300)
+
+def test_recorded_resolutions_replay_offline_to_the_same_link(tmp_path):
+    # A private mock, so it can be stopped before the replay without affecting other tests
+    process, mock = start_mock(tmp_path / 'mock.log')
+    try:
+        recorded = bench(tmp_path, mock, 'record', '--fixtures', 'recorded', f"pixeldrain={mock}/file/pd/{uuid.uuid4().hex}",
+                         f"cloud={mock}/file/fc/{uuid.uuid4().hex}")
+    finally:
+        stop(process)
+    assert recorded.returncode == 0, recorded.stderr
+    with open(tmp_path / 'recorded' / 'manifest.json', encoding='utf-8') as handle:
+        manifest = json.load(handle)
+    assert [entry["name"] for entry in manifest] == ['pixeldrain', 'cloud']
+    assert all(entry["finalUrl"] for entry in manifest)
+
+    replayed = bench(tmp_path, mock, 'run', '--fixtures', 'recorded', '--iterations', '2')
+    assert replayed.returncode == 0, replayed.stderr
+    rows = {line.split()[0]: line.split()[1:3] for line in replayed.stdout.splitlines()[1:]}
+    assert rows == {'pixeldrain': ['2', '2'], 'cloud': ['2', '2']}
+
+def test_relative_fixture_dir_is_taken_from_the_repo_root(tmp_path):
+    env = dict(os.environ, HTTP_FIXTURE_DIR='recorded', PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, '-c', 'from bypass_common import fixtures; print(fixtures.HTTP_FIXTURE_DIR)'],
+                            cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60)
+    assert result.stdout.strip() == os.path.join(ROOT, 'recorded')
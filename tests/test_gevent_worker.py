@@ -0,0 +1,47 @@
+"""Both apps under gunicorn's gevent worker, the default gunicorn_config.py picks when gevent is installed."""
+import importlib.util
+import json
+import runpy
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from conftest import ROOT
+
+pytestmark = pytest.mark.skipif(importlib.util.find_spec("gevent") is None, reason="gevent is not installed")
+
+def test_gevent_is_the_default_worker(monkeypatch):
+    monkeypatch.delenv("GUNICORN_WORKER_CLASS", raising=False)
+    config = runpy.run_path(f"{ROOT}/gunicorn_config.py")
+    assert config["worker_class"] == "gevent"
+
+def test_gevent_worker_resolves_concurrently(start_app, mock_upstream):
+    gdflix, gdflix_log = start_app('gdflix', server='gunicorn', WEB_CONCURRENCY='1')
+    hubcloud, hubcloud_log = start_app('hubcloud', server='gunicorn', WEB_CONCURRENCY='1', GDFLIX_API_URL=gdflix)
+
+    # Fast Cloud links are ready only after 1s of polling: one worker has to overlap them to finish in time
+    def resolve(index):
+        response = requests.post(f"{gdflix}/api/gdflix", json={"gdflixUrl": f"{mock_upstream}/file/fc/{uuid.uuid4().hex}"}, timeout=60)
+        return response.json()
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(resolve, range(8)))
+    assert all(result["success"] for result in results), [result["error"] for result in results]
+    assert time.time() - started < 8
+
+    urls = [f"{mock_upstream}/drive/{uuid.uuid4().hex}", f"{mock_upstream}/video/{uuid.uuid4().hex}",
+            f"{mock_upstream}/file/pd/{uuid.uuid4().hex}"]
+    response = requests.post(f"{hubcloud}/api/batch", json={"urls": urls}, timeout=60)
+    items = sorted((json.loads(line) for line in response.text.splitlines()), key=lambda item: item["index"])
+    assert [item["success"] for item in items] == [True, True, True]
+    assert items[2]["type"] == 'gdflix' # forwarded to the GDFLIX app
+
+    metrics = requests.get(f"{hubcloud}/metrics", timeout=10).text
+    assert 'hubcloud_resolutions_total{result="success",source="fresh"}' in metrics
+    for log_path in (gdflix_log, hubcloud_log):
+        log = log_path.read_text()
+        assert "Using worker: gevent" in log
+        assert "Traceback" not in log
@@ -0,0 +1,62 @@
+"""Submit/poll job endpoints of both apps, and the per-job locking of the job store."""
+import threading
+import time
+import uuid
+
+import pytest
+import requests
+
+from bypass_common.jobs import JobStore
+from bypass_common.store import SharedResultStore
+
+@pytest.fixture
+def gdflix(start_app):
+    base, _ = start_app('gdflix')
+    return base
+
+def wait_for_job(status_url):
+    deadline = time.time() + 30
+    while (job := requests.get(status_url, timeout=10).json())["status"] in ('queued', 'running'):
+        assert time.time() < deadline, "job did not finish"
+        time.sleep(0.2)
+    return job
+
+def test_job_runs_in_the_background(gdflix, mock_upstream):
+    file_id = uuid.uuid4().hex
+    response = requests.post(f"{gdflix}/api/gdflix/jobs", json={"gdflixUrl": f"{mock_upstream}/file/fc/{file_id}"}, timeout=10)
+    assert response.status_code == 202
+    job = wait_for_job(f"{gdflix}{response.json()['statusUrl']}")
+    assert job["status"] == 'succeeded'
+    assert file_id in job["finalUrl"]
+    assert job["logs"]
+
+def test_job_endpoint_errors(gdflix):
+    assert requests.post(f"{gdflix}/api/gdflix/jobs", json={}, timeout=10).status_code == 400
+    assert requests.post(f"{gdflix}/api/gdflix/jobs", json={"gdflixUrl": "not a url"}, timeout=10).status_code == 400
+    assert requests.get(f"{gdflix}/api/gdflix/jobs/{uuid.uuid4().hex}", timeout=10).status_code == 404
+
+def test_hubcloud_jobs(start_app, mock_upstream):
+    hubcloud, _ = start_app('hubcloud')
+    response = requests.post(f"{hubcloud}/api/hubcloud/jobs", json={"hubcloudUrl": f"{mock_upstream}/drive/{uuid.uuid4().hex}"}, timeout=10)
+    assert response.status_code == 202
+    assert wait_for_job(f"{hubcloud}{response.json()['statusUrl']}")["status"] == 'succeeded'
+
+def test_one_jobs_log_does_not_block_other_jobs(tmp_path):
+    shared = SharedResultStore(100)
+    shared.open(str(tmp_path / 'shared.sqlite3'))
+    store = JobStore(shared, max_jobs=10, retention=60)
+    busy, other = store.create('https://gdflix.example/file/a'), store.create('https://gdflix.example/file/b')
+    done = threading.Event()
+
+    def work():
+        other["logs"].append("step")
+        store.update(other, status="running")
+        assert store.create('https://gdflix.example/file/c') is not None
+        assert store.get(other["id"])["logs"] == ["step"]
+        done.set()
+
+    with busy["logs"].lock:
+        threading.Thread(target=work, daemon=True).start()
+        assert done.wait(5)
+    busy["logs"].append("after")
+    assert store.get(busy["id"])["logs"] == ["after"]
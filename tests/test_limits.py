@@ -0,0 +1,54 @@
+"""Per-host upstream limits: domain matching, queueing, token refill and slot release."""
+import threading
+import time
+
+import pytest
+
+from bypass_common import limits
+from bypass_common.limits import HostLimit, UpstreamBusy, UpstreamLimiter, upstream_limiter
+from bypass_common.upstream import new_session
+
+def test_the_most_specific_override_wins():
+    limiter = UpstreamLimiter({'gdflix.dev': (4,), 'new.gdflix.dev': (16,)})
+    assert limiter.key_for('cdn.new.gdflix.dev') == 'new.gdflix.dev'
+    assert limiter.key_for('NEW.gdflix.dev') == 'new.gdflix.dev'
+    assert limiter.key_for('old.gdflix.dev') == 'gdflix.dev'
+    assert limiter.key_for('gdflix.dev.example') == 'gdflix.dev.example'
+    assert limiter.limit_for(limiter.key_for('new.gdflix.dev')).concurrency == 16
+
+def test_requests_queue_for_a_slot_until_one_is_freed():
+    limiter = UpstreamLimiter({'upstream.example': (1, 1000, 1000)})
+    release = limiter.acquire('upstream.example')
+    threading.Timer(0.2, release).start()
+    started = time.monotonic()
+    limiter.acquire('upstream.example')()
+    assert 0.15 < time.monotonic() - started < limits.UPSTREAM_QUEUE_TIMEOUT
+    stats = limiter.stats()['upstream.example']
+    assert (stats["requests"], stats["queued"], stats["rejected"]) == (2, 1, 0)
+
+def test_busy_after_the_queue_deadline(monkeypatch):
+    monkeypatch.setattr(limits, 'UPSTREAM_QUEUE_TIMEOUT', 0.1)
+    limiter = UpstreamLimiter({'upstream.example': (1, 1000, 1000)})
+    limiter.acquire('upstream.example')
+    with pytest.raises(UpstreamBusy):
+        limiter.acquire('upstream.example')
+    assert limiter.stats()['upstream.example']["rejected"] == 1
+
+def test_tokens_refill_at_the_configured_rate():
+    limit = HostLimit(4, 20, 1) # one token every 50ms, no burst
+    assert limit.acquire(time.monotonic() + 1) < 0.01
+    assert 0.03 < limit.acquire(time.monotonic() + 1) < 0.2
+    # no token before the deadline: the call gives up and hands its slot back (two are still held)
+    assert limit.acquire(time.monotonic() + 0.01) is None
+    assert [limit.slots.acquire(blocking=False) for _ in range(3)] == [True, True, False]
+
+def test_the_slot_is_held_until_the_body_is_released(mock_upstream, monkeypatch):
+    monkeypatch.setattr(upstream_limiter, 'overrides', {'127.0.0.1': (1, 1000, 1000)})
+    monkeypatch.setattr(upstream_limiter, '_limits', {})
+    session = new_session()
+    response = session.get(f"{mock_upstream}/video/ready", stream=True, timeout=10)
+    slots = upstream_limiter.limit_for('127.0.0.1').slots
+    assert not slots.acquire(blocking=False) # headers are in, the body is still unread
+    response.content
+    assert slots.acquire(blocking=False)
+    slots.release()
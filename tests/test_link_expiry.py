@@ -0,0 +1,37 @@
+"""Link expiry: signed-URL parsing, per-family estimates and the cache TTL derived from them."""
+import time
+
+import pytest
+
+from bypass_common.cache import (
+    RESULT_CACHE_DEFAULT_TTL, RESULT_CACHE_EXPIRY_MARGIN, RESULT_CACHE_MAX_TTL, RESULT_CACHE_TTLS,
+    link_metadata, result_cache_ttl, signed_link_expiry,
+)
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://bucket.s3.amazonaws.com/f.mkv?X-Amz-Date=20260101T000000Z&X-Amz-Expires=3600&X-Amz-Signature=ab", 1767229200),
+    ("https://storage.googleapis.com/f.mkv?X-Goog-Date=20260101T000000Z&X-Goog-Expires=600", 1767226200),
+    ("https://cdn.example/f.mkv?expires=1767229200&sig=ab", 1767229200),
+    ("https://cdn.example/f.mkv?exp=900", 1000900),
+    ("https://cdn.example/f.mkv?Expires=soon", None),
+    ("https://pixeldrain.com/api/file/abc", None),
+])
+def test_signed_link_expiry(url, expected):
+    assert signed_link_expiry(url, issued_at=1000000) == expected
+
+def test_link_metadata_falls_back_to_the_family_estimate():
+    now = time.time()
+    signed = link_metadata(f"https://a.r2.dev/f.mkv?expires={now + 7200:.0f}", now)
+    assert signed["family"] == 'r2' and signed["expirySource"] == 'signed'
+    assert signed["expiresAt"] == pytest.approx(now + 7200, abs=1)
+    estimated = link_metadata("https://pixeldrain.com/api/file/abc", now)
+    assert estimated == {"family": 'pixeldrain', "expiresAt": now + RESULT_CACHE_TTLS['pixeldrain'], "expirySource": 'estimated'}
+
+def test_cache_ttl_keeps_a_margin_and_a_ceiling():
+    now = time.time()
+    assert result_cache_ttl(now + 3600, now) == pytest.approx(3600 - RESULT_CACHE_EXPIRY_MARGIN)
+    assert result_cache_ttl(now + 30 * 24 * 3600, now) == RESULT_CACHE_MAX_TTL
+    assert result_cache_ttl(now + RESULT_CACHE_EXPIRY_MARGIN / 2, now) <= 0 # too close to expiry to cache
+
+def test_unknown_family_uses_the_default_ttl():
+    assert link_metadata("https://files.example/abc", 0)["expiresAt"] == RESULT_CACHE_DEFAULT_TTL
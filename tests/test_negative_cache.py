@@ -0,0 +1,37 @@
+"""Negative caching: failure classes and the TTL each class is remembered for."""
+import uuid
+
+import pytest
+
+from bypass_common.cache import (
+    NEGATIVE_CACHE_TTLS, RESULT_CACHE_NEGATIVE_TTL, classify_failure, negative_cache_ttl,
+)
+from conftest import resolve
+
+@pytest.mark.parametrize("error, logs, failure_class", [
+    ("404 Client Error: NOT FOUND for url: https://gdflix.dev/file/x", [], 'not_found'),
+    ("503 Server Error: Service Unavailable for url: https://gdflix.dev/file/x", [], 'upstream_error'),
+    ("Circuit open for gdflix.dev (60% errors); retrying in 20s", [], 'circuit_open'),
+    ("HTTPSConnectionPool(host='gdflix.dev', port=443): Read timed out.", [], 'timeout'),
+    ("Max retries exceeded with url: /file/x (Caused by NewConnectionError)", [], 'network'),
+    ("Exceeded maximum redirect hops", [], 'too_many_redirects'),
+    ("Extraction Failed (Check logs)", ["  Error fetching https://gdflix.dev/file/x: 410 Client Error: Gone"], 'not_found'),
+    ("Extraction Failed (Check logs)", ["Info: page 404 mentioned on an info line"], 'unknown'),
+])
+def test_failure_classes_pick_their_negative_ttl(error, logs, failure_class):
+    assert classify_failure(error, logs) == failure_class
+    assert negative_cache_ttl(failure_class) == NEGATIVE_CACHE_TTLS.get(failure_class, RESULT_CACHE_NEGATIVE_TTL)
+
+def test_permanent_failures_are_remembered_longer_than_transient_ones():
+    assert negative_cache_ttl('not_found') > negative_cache_ttl('upstream_error') > negative_cache_ttl('circuit_open')
+    assert negative_cache_ttl('unknown') == RESULT_CACHE_NEGATIVE_TTL
+
+def test_negative_cache_serves_repeated_failures(start_app, mock_upstream):
+    gdflix, _ = start_app('gdflix')
+    url = f"{mock_upstream}/missing/{uuid.uuid4().hex}"
+    first = resolve(gdflix, gdflixUrl=url)
+    assert not first["success"] and not first["cached"]
+    assert any(f"as not_found (TTL {NEGATIVE_CACHE_TTLS['not_found']}s)" in line for line in first["logs"])
+    second = resolve(gdflix, gdflixUrl=url)
+    assert second["cached"] and second["error"] == first["error"]
+    assert any("Negative cache hit" in line and "not_found" in line for line in second["logs"])
@@ -0,0 +1,74 @@
+"""Learned pacing between steps on one host: penalties, Retry-After, relaxation and challenge pages."""
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from bypass_common import pacing
+from bypass_common.pacing import (
+    PACING_BASE_GAP, PACING_MAX_GAP, PACING_PENALTY_GAP, PACING_RELAX_AFTER, PacingPolicy, note_challenge_page,
+)
+
+HOST = 'upstream.example'
+URL = f'https://{HOST}/file/abc'
+
+@pytest.fixture
+def policy():
+    return PacingPolicy()
+
+def tracked_session(policy):
+    session = SimpleNamespace(hooks={'response': []})
+    policy.track(session)
+    return session
+
+def contact(session, url=URL):
+    for hook in session.hooks['response']: hook(SimpleNamespace(url=url))
+
+def gap(policy):
+    return policy.stats()[HOST]["gapSeconds"]
+
+def test_429s_and_challenges_double_the_gap_between_floor_and_cap(policy):
+    policy.observe(HOST, 429, {})
+    assert gap(policy) == max(PACING_PENALTY_GAP, PACING_BASE_GAP * 2)
+    policy.observe(HOST, 503, {'Server': 'cloudflare'})
+    assert gap(policy) == PACING_PENALTY_GAP * 2
+    policy.observe(HOST, 200, {'cf-mitigated': 'challenge'})
+    assert gap(policy) == PACING_PENALTY_GAP * 4
+    for _ in range(5): policy.observe(HOST, 429, {})
+    assert gap(policy) == PACING_MAX_GAP
+    assert policy.stats()[HOST]["penalties"] == 8
+
+def test_retry_after_blocks_every_session(policy):
+    policy.observe(HOST, 429, {'Retry-After': '3'})
+    fresh = SimpleNamespace() # never contacted the host
+    assert 2.5 < policy.delay_for(fresh, URL) <= 3
+    assert 2.5 < policy.delay_for(tracked_session(policy), URL) <= 3
+    policy.observe(HOST, 429, {'Retry-After': '3600'})
+    assert policy.delay_for(fresh, URL) <= PACING_MAX_GAP
+
+def test_clean_responses_relax_the_gap(policy):
+    policy.observe(HOST, 429, {})
+    penalized = gap(policy)
+    for _ in range(PACING_RELAX_AFTER - 1): policy.observe(HOST, 200, {})
+    assert gap(policy) == penalized
+    policy.observe(HOST, 200, {})
+    assert gap(policy) == pytest.approx(max(PACING_BASE_GAP, penalized * 0.75), abs=0.001)
+
+def test_delay_only_after_contacting_the_host(policy):
+    policy.observe(HOST, 429, {})
+    session = tracked_session(policy)
+    assert policy.delay_for(session, URL) == 0
+    contact(session)
+    assert gap(policy) - 0.1 < policy.delay_for(session, URL) <= gap(policy)
+    assert policy.delay_for(session, 'https://other.example/') == 0
+    contact(session, 'https://other.example/')
+    time.sleep(PACING_BASE_GAP)
+    assert policy.delay_for(session, 'https://other.example/') == 0 # its base gap already passed
+
+def test_challenge_interstitials_served_as_200_penalize(monkeypatch):
+    policy = PacingPolicy()
+    monkeypatch.setattr(pacing, 'upstream_pacing', policy)
+    note_challenge_page(URL, '<html><head><title>Just a moment...</title></head></html>')
+    note_challenge_page(URL, '<html><body>Your file is ready</body></html>')
+    assert policy.stats()[HOST]["penalties"] == 1
+    assert gap(policy) == max(PACING_PENALTY_GAP, PACING_BASE_GAP * 2)
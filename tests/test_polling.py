@@ -0,0 +1,75 @@
+"""Fast Cloud poll schedulers: conditional requests, change detection, backoff and server hints."""
+import re
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import resolve
+
+def poll_response(status=200, **headers):
+    return SimpleNamespace(status_code=status, headers=headers)
+
+@pytest.fixture
+def scheduler(gdflix_module, monkeypatch):
+    monkeypatch.setattr(gdflix_module, 'POLL_JITTER', 0)
+    return gdflix_module.AdaptivePollScheduler()
+
+def test_validators_are_sent_after_the_first_poll(scheduler):
+    assert scheduler.conditional_headers() == {}
+    scheduler.page_changed(poll_response(ETag='"v1"', **{'Last-Modified': 'Tue, 13 Oct 2026 10:00:00 GMT'}), 'waiting')
+    assert scheduler.conditional_headers() == {'If-None-Match': '"v1"', 'If-Modified-Since': 'Tue, 13 Oct 2026 10:00:00 GMT'}
+
+def test_304_and_repeated_etags_or_bodies_are_unchanged(scheduler):
+    assert scheduler.page_changed(poll_response(ETag='"v1"'), 'waiting')
+    assert not scheduler.page_changed(poll_response(304), '')
+    assert not scheduler.page_changed(poll_response(ETag='"v1"'), 'a different body, same ETag')
+    assert scheduler.page_changed(poll_response(ETag='"v2"'), 'ready')
+    bodies = type(scheduler)()
+    assert bodies.page_changed(poll_response(), 'waiting')
+    assert not bodies.page_changed(poll_response(), 'waiting')
+    assert bodies.page_changed(poll_response(), 'ready')
+    assert (scheduler.polls, scheduler.unchanged, bodies.polls, bodies.unchanged) == (4, 2, 3, 1)
+
+def test_unchanged_polls_back_off_to_the_maximum_and_a_change_resets(gdflix_module, scheduler):
+    assert scheduler.next_delay() == gdflix_module.POLL_FIRST_DELAY
+    assert scheduler.next_delay() == gdflix_module.POLL_MIN_INTERVAL
+    scheduler.page_changed(poll_response(), 'waiting')
+    delays = []
+    for _ in range(10):
+        scheduler.page_changed(poll_response(), 'waiting')
+        delays.append(scheduler.next_delay())
+    assert delays == sorted(delays) and delays[0] == gdflix_module.POLL_MIN_INTERVAL * gdflix_module.POLL_BACKOFF_FACTOR
+    assert delays[-1] == gdflix_module.POLL_MAX_INTERVAL
+    scheduler.page_changed(poll_response(), 'ready')
+    assert scheduler.next_delay() == gdflix_module.POLL_MIN_INTERVAL
+
+def test_server_hints_override_the_next_delay_once(gdflix_module, scheduler):
+    scheduler.next_delay() # the fast first check
+    scheduler.use_hint(gdflix_module.retry_after_seconds('7'))
+    assert scheduler.next_delay() == 7
+    assert scheduler.next_delay() == gdflix_module.POLL_MIN_INTERVAL
+    scheduler.use_hint(gdflix_module.json_wait_hint({'status': 'pending', 'countdown': '3'}))
+    assert scheduler.next_delay() == 3
+    assert scheduler.next_delay() == gdflix_module.POLL_MIN_INTERVAL
+    fixed = gdflix_module.PollScheduler()
+    fixed.use_hint(gdflix_module.json_wait_hint({'retryAfter': 2}))
+    assert (fixed.next_delay(), fixed.next_delay()) == (2, gdflix_module.POLL_INTERVAL)
+
+def test_wait_hint_parsing(gdflix_module):
+    assert gdflix_module.retry_after_seconds(None) is None
+    assert gdflix_module.retry_after_seconds('soon') is None
+    assert gdflix_module.retry_after_seconds('Thu, 01 Jan 1970 00:00:00 GMT') == 0
+    assert [gdflix_module.json_wait_hint(data) for data in ({'wait': -1, 'eta': 4}, {'delay': 'x'}, ['wait'])] == [4, None, None]
+
+def test_polling_uses_conditional_requests(start_app, mock_upstream):
+    # The mock's link is ready after 4s and its poll page answers a matching If-None-Match with 304
+    gdflix, _ = start_app('gdflix')
+    result = resolve(gdflix, gdflixUrl=f"{mock_upstream}/file/sc/{uuid.uuid4().hex}", logLevel='info')
+    assert result["success"] and 'fastcloud.example' in result["finalUrl"]
+    summary = next(line for line in result["logs"] if line.startswith("Success: Found final Cloud Resume link URL after polling"))
+    checks, unchanged = map(int, re.search(r'\((\d+) checks, (\d+) unchanged\)', summary).groups())
+    polls = [line for line in result["logs"] if line.startswith("  Polling: GET")]
+    assert len(polls) == checks and 3 <= checks <= 5
+    # the first poll and the ready page are changes; every check in between was a 304
+    assert unchanged == checks - 2 == sum('-> Status 304' in line for line in polls)
@@ -0,0 +1,67 @@
+"""Prefetch: the shared resolution budget and the /api/prefetch endpoint."""
+import sqlite3
+import time
+import uuid
+
+import pytest
+import requests
+
+from bypass_common import prefetch
+from bypass_common.cache import RESULT_CACHE_NEGATIVE_TTL
+from bypass_common.prefetch import PREFETCH_BURST, Prefetcher
+from bypass_common.store import SharedResultStore
+from conftest import resolve
+
+@pytest.fixture
+def store(tmp_path):
+    store = SharedResultStore(100)
+    store.open(str(tmp_path / 'shared.sqlite3'))
+    return store
+
+def prefetcher_for(store):
+    return Prefetcher(store, 'test')
+
+def test_budget_allows_a_burst_then_paces(store, monkeypatch):
+    monkeypatch.setattr(prefetch, 'PREFETCH_RATE_PER_MINUTE', 6) # a token every 10s
+    prefetcher = prefetcher_for(store)
+    assert [prefetcher._take_token() for _ in range(PREFETCH_BURST)] == [0] * PREFETCH_BURST
+    assert prefetcher._take_token() == pytest.approx(10, abs=0.5)
+
+def test_budget_is_shared_by_the_workers_of_an_app(store, monkeypatch):
+    monkeypatch.setattr(prefetch, 'PREFETCH_RATE_PER_MINUTE', 6)
+    first, second = prefetcher_for(store), prefetcher_for(store)
+    for _ in range(PREFETCH_BURST): assert first._take_token() == 0
+    assert second._take_token() > 0
+    other_app = prefetcher_for(store)
+    other_app.app_name = 'other'
+    assert other_app._take_token() == 0
+
+def test_watch_list_is_capped(store, monkeypatch):
+    monkeypatch.setattr(prefetch, 'PREFETCH_MAX_WATCHED', 3)
+    prefetcher = prefetcher_for(store)
+    assert prefetcher.enqueue([(f"https://gdflix.example/file/{index}", 0) for index in range(3)]) is None
+    assert "Too many watched links" in prefetcher.enqueue([("https://gdflix.example/file/4", 0)])
+
+def test_a_raising_resolver_still_releases_its_claim(store):
+    def resolve(url, key, logs): raise sqlite3.OperationalError("database is locked")
+    prefetcher = Prefetcher(store, 'test', resolve)
+    assert prefetcher.enqueue([("https://gdflix.example/file/abc", 0)]) is None
+    with pytest.raises(sqlite3.OperationalError):
+        prefetcher._work_once()
+    claimed_until, due_at = store.read(lambda conn: conn.execute("SELECT claimed_until, due_at FROM prefetch_links").fetchone())
+    assert claimed_until == 0 and due_at == pytest.approx(time.time() + RESULT_CACHE_NEGATIVE_TTL, abs=5)
+    assert prefetcher.stats()["resolved"] == 1
+
+def test_prefetched_links_are_served_from_cache(start_app, mock_upstream):
+    gdflix, _ = start_app('gdflix', PREFETCH_RATE_PER_MINUTE='600')
+    urls = [f"{mock_upstream}/file/pd/{uuid.uuid4().hex}" for _ in range(3)]
+    response = requests.post(f"{gdflix}/api/prefetch", json={"urls": urls + [{"url": "not a url"}]}, timeout=10)
+    assert response.status_code == 202
+    assert response.json()["queued"] == 3
+    assert [entry["index"] for entry in response.json()["rejected"]] == [3]
+    deadline = time.time() + 20
+    while requests.get(f"{gdflix}/api/gdflix/stats", timeout=10).json()["prefetch"]["resolved"] < 3:
+        assert time.time() < deadline, "prefetch did not resolve the links"
+        time.sleep(0.2)
+    result = resolve(gdflix, gdflixUrl=urls[0])
+    assert result["success"] and result["cached"]
@@ -0,0 +1,39 @@
+"""Redirect-chain shortcuts learned by the GDFLIX hop loop."""
+import uuid
+
+import requests
+
+from conftest import resolve
+
+def test_redirect_chain_is_learned_as_a_shortcut(start_app, mock_upstream):
+    gdflix, _ = start_app('gdflix')
+    first = resolve(gdflix, gdflixUrl=f"{mock_upstream}/file/pd/{uuid.uuid4().hex}")
+    assert first["success"] and any("Learned redirect shortcut" in line for line in first["logs"])
+    file_id = uuid.uuid4().hex
+    second = resolve(gdflix, gdflixUrl=f"{mock_upstream}/file/pd/{file_id}")
+    assert second["success"] and file_id in second["finalUrl"]
+    shortcut = next(line for line in second["logs"] if line.startswith("Using learned redirect shortcut"))
+    assert file_id in shortcut.split(' -> ')[1] # straight to the page the chain ended on
+    shortcuts = requests.get(f"{gdflix}/api/gdflix/stats", timeout=10).json()["redirectShortcuts"]
+    assert shortcuts["learned"] == 1 and shortcuts["hits"] == 1
+    assert '{id}' in shortcuts["rules"][0]["to"]
+
+def test_shortcuts_can_be_turned_off(start_app, mock_upstream):
+    gdflix, _ = start_app('gdflix', REDIRECT_SHORTCUTS='0')
+    for _ in range(2): assert resolve(gdflix, gdflixUrl=f"{mock_upstream}/file/pd/{uuid.uuid4().hex}")["success"]
+    shortcuts = requests.get(f"{gdflix}/api/gdflix/stats", timeout=10).json()["redirectShortcuts"]
+    assert not shortcuts["enabled"] and shortcuts["size"] == 0
+
+def test_only_the_id_segment_becomes_the_template_placeholder(start_app, mock_upstream):
+    gdflix, _ = start_app('gdflix')
+    # the chain leaves /go/pd/<id> for /file/pd/<id>/2: the "pd" both paths share stays literal
+    assert resolve(gdflix, gdflixUrl=f"{mock_upstream}/go/pd/{uuid.uuid4().hex}")["success"]
+    # /alias/ lands on another id, so only the shared literal "pd" survives; nothing is learned from it
+    assert resolve(gdflix, gdflixUrl=f"{mock_upstream}/alias/pd/{uuid.uuid4().hex}")["success"]
+    shortcuts = requests.get(f"{gdflix}/api/gdflix/stats", timeout=10).json()["redirectShortcuts"]
+    assert [(rule["from"].split('/', 1)[1], rule["to"].split('/', 3)[3]) for rule in shortcuts["rules"]] == [
+        ('go/pd/{id}', 'file/pd/{id}/2')]
+    file_id = uuid.uuid4().hex
+    result = resolve(gdflix, gdflixUrl=f"{mock_upstream}/go/pd/{file_id}")
+    assert result["success"] and file_id in result["finalUrl"]
+    assert any(line.startswith("Using learned redirect shortcut") for line in result["logs"])
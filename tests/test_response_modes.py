@@ -0,0 +1,67 @@
+"""Response modes, log levels and the debug HTML capture store."""
+import os
+import time
+import uuid
+
+import pytest
+import requests
+
+from bypass_common import responses
+from bypass_common.responses import LOG_INFO_MAX_CHARS, DebugCaptureStore
+from conftest import resolve
+
+@pytest.fixture
+def gdflix(start_app):
+    base, _ = start_app('gdflix')
+    return base
+
+def test_summary_is_the_default_and_captures_nothing(gdflix, mock_upstream):
+    result = resolve(gdflix, gdflixUrl=f"{mock_upstream}/file/xx/{uuid.uuid4().hex}") # a page without download buttons
+    assert not result["success"] and result["error"] == "No supported download buttons found on the page."
+    assert result["logs"] and "debugCaptures" not in result and "trace" not in result
+    assert any("not captured" in line for line in result["logs"])
+
+def test_debug_mode_captures_html(gdflix, mock_upstream):
+    result = resolve(gdflix, gdflixUrl=f"{mock_upstream}/file/xx/{uuid.uuid4().hex}", responseMode='debug')
+    assert result["logs"] and "stages" not in result
+    capture = result["debugCaptures"][0]
+    page = requests.get(f"{gdflix}{capture['url']}", timeout=10)
+    assert page.headers["Content-Type"].startswith('text/plain')
+    assert len(page.text) == capture["characters"]
+    assert requests.get(f"{gdflix}/api/gdflix/debug/{'0' * 32}", timeout=10).status_code == 404
+
+def test_summary_mode_reports_stages_and_trims_logs(gdflix, mock_upstream):
+    result = resolve(gdflix, gdflixUrl=f"{mock_upstream}/file/pd/{uuid.uuid4().hex}", responseMode='summary')
+    assert result["success"]
+    assert {stage["stage"] for stage in result["stages"]} >= {'resolution', 'redirect_hop'}
+    assert all(stage["status"] == 'ok' for stage in result["stages"])
+    assert "debugCaptures" not in result
+    assert all(len(line) <= LOG_INFO_MAX_CHARS + 40 for line in result["logs"])
+
+def test_minimal_mode_and_log_levels(gdflix, mock_upstream):
+    result = resolve(gdflix, gdflixUrl=f"{mock_upstream}/file/pd/{uuid.uuid4().hex}", responseMode='minimal')
+    assert set(result) == {"success", "error", "finalUrl", "expiresAt", "cached"}
+    failed = resolve(gdflix, gdflixUrl=f"{mock_upstream}/file/xx/{uuid.uuid4().hex}", logLevel='errors')
+    assert failed["logs"] and all('Error' in line or 'FAILED' in line or 'Warning' in line for line in failed["logs"])
+    assert resolve(gdflix, gdflixUrl=f"{mock_upstream}/file/xx/{uuid.uuid4().hex}", logLevel='none')["logs"] == []
+
+def test_hubcloud_summary_mode(start_app, mock_upstream):
+    hubcloud, _ = start_app('hubcloud')
+    result = requests.post(f"{hubcloud}/api/hubcloud", json={"hubcloudUrl": f"{mock_upstream}/video/{uuid.uuid4().hex}", "responseMode": 'summary'}, timeout=60).json()
+    assert result["success"] and result["stages"]
+
+def test_pruning_skips_temp_files_and_files_already_removed(tmp_path, monkeypatch):
+    store = DebugCaptureStore(str(tmp_path), '/debug/', ttl=60, max_files=1)
+    old = [store.put(f"<p>{index}</p>") for index in range(3)]
+    for index, capture_id in enumerate(old): os.utime(tmp_path / f"{capture_id}.html", (time.time() - 100 - index,) * 2)
+    in_flight = tmp_path / f"{old[0]}.html.{uuid.uuid4().hex}.tmp"
+    in_flight.write_text("<p>being written</p>")
+    fresh = store.put("<p>fresh</p>")
+    # another worker's prune removes one of the expired captures while this one runs
+    remove = os.remove
+    def remove_raced(path):
+        remove(path)
+        if path.endswith(f"{old[1]}.html"): raise FileNotFoundError(path)
+    monkeypatch.setattr(responses.os, 'remove', remove_raced)
+    store._prune()
+    assert sorted(os.listdir(tmp_path)) == sorted([f"{fresh}.html", in_flight.name])
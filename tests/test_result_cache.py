@@ -0,0 +1,43 @@
+"""In-process result cache: URL normalization, LRU eviction and per-entry expiry."""
+import time
+
+import pytest
+
+from bypass_common.cache import ResultCache, classify_final_link, normalize_url
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTPS://GDFlix.dev:443/file/abc/", "https://gdflix.dev/file/abc"),
+    ("http://hubcloud.one:80/drive/x?b=2&a=1", "http://hubcloud.one/drive/x?a=1&b=2"),
+    ("  https://gdflix.dev  ", "https://gdflix.dev/"),
+])
+def test_equivalent_urls_share_a_key(url, expected):
+    assert normalize_url(url) == expected
+
+@pytest.mark.parametrize("url, family", [
+    ("https://pixeldrain.com/api/file/abc", 'pixeldrain'),
+    ("https://pub-1.r2.dev/abc.mkv", 'r2'),
+    ("https://a.gdindex.lol/abc/file.mkv", 'gdindex'),
+    ("https://cdn.fsl.pub/dl/abc", 'fsl'),
+    ("https://files.example/abc", 'default'),
+])
+def test_final_links_are_grouped_by_family(url, family):
+    assert classify_final_link(url) == family
+
+def entry(final_url, ttl):
+    now = time.time()
+    return {'finalUrl': final_url, 'error': None, 'storedAt': now, 'expiresAt': now + ttl}
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_entries=2)
+    cache.set('a', entry('link-a', 60))
+    cache.set('b', entry('link-b', 60))
+    assert cache.get('a')['finalUrl'] == 'link-a' # 'a' is now the most recently used
+    cache.set('c', entry('link-c', 60))
+    assert cache.get('b') is None
+    assert cache.get('a') and cache.get('c')
+
+def test_expired_entries_are_misses():
+    cache = ResultCache(max_entries=4)
+    cache.set('a', entry('link-a', -1))
+    assert cache.get('a') is None
+    assert (cache.hits, cache.misses) == (0, 1)
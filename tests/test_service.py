@@ -0,0 +1,17 @@
+"""Services created in one process keep their own resolver, caches and sibling settings."""
+from bypass_common.batch import is_sibling_link
+from bypass_common.responses import LogBuffer
+from bypass_common.service import Service
+
+def test_two_services_in_one_process_stay_separate(tmp_path, monkeypatch):
+    # The benchmarks load both apps into one process
+    monkeypatch.setenv('SHARED_CACHE_DB_PATH', str(tmp_path / 'shared.sqlite3'))
+    monkeypatch.setenv('DEBUG_CAPTURE_DIR', str(tmp_path / 'captures'))
+    gdflix = Service('gdflix', lambda url, logs: 'https://pixeldrain.com/api/file/abc', lambda logs: "GDFLIX failed",
+                     'gdflixUrl', ('gdflix',), ('HUBCLOUD_API_URL', 'HubCloud'))
+    hubcloud = Service('hubcloud', lambda url, logs: None, lambda logs: "HubCloud failed",
+                       'hubcloudUrl', ('drive', 'video'), ('GDFLIX_API_URL', 'GDFLIX'))
+    assert gdflix.process_request('https://gdflix.example/file/abc', LogBuffer())[:2] == ('https://pixeldrain.com/api/file/abc', None)
+    assert hubcloud.process_request('https://hubcloud.example/drive/abc', LogBuffer())[:2] == (None, "HubCloud failed")
+    assert is_sibling_link(gdflix, 'drive') and not is_sibling_link(hubcloud, 'drive')
+    assert (gdflix.debug_captures.url_prefix, hubcloud.debug_captures.url_prefix) == ('/api/gdflix/debug/', '/api/hubcloud/debug/')
@@ -0,0 +1,31 @@
+"""Numeric settings from the environment: malformed or out-of-range values fall back with a warning."""
+import logging
+
+import pytest
+
+from bypass_common.limits import HostLimit, parse_host_limits
+from bypass_common.settings import env_float, env_int, env_map, parse_number
+
+def test_malformed_and_out_of_range_values_use_the_default(monkeypatch, caplog):
+    monkeypatch.setenv("TEST_WORKERS", "eight")
+    monkeypatch.setenv("TEST_RATE", "0")
+    with caplog.at_level(logging.WARNING, logger='bypass_common.settings'):
+        assert env_int("TEST_WORKERS", 8, minimum=1) == 8
+        assert env_float("TEST_RATE", 5, above=0) == 5
+    assert "TEST_WORKERS='eight'" in caplog.text and "TEST_RATE='0'" in caplog.text
+    monkeypatch.setenv("TEST_RATE", " 2.5 ")
+    assert env_float("TEST_RATE", 5, above=0) == 2.5
+    assert env_int("TEST_UNSET", 3) == 3
+
+def test_maps_skip_bad_entries(monkeypatch, caplog):
+    monkeypatch.setenv("TEST_LIMITS", "Good.example=4/2/8,zero.example=4/0,junk,bad.example=x,short.example=16")
+    with caplog.at_level(logging.WARNING, logger='bypass_common.settings'):
+        limits = env_map("TEST_LIMITS", parse_host_limits)
+    assert limits == {'good.example': (4, 2.0, 8), 'short.example': (16,)}
+    assert caplog.text.count("Ignoring TEST_LIMITS entry") == 3
+    monkeypatch.setenv("TEST_SIZES", "a.example=20,b.example=-1")
+    assert env_map("TEST_SIZES", lambda size: parse_number(size, int, minimum=1)) == {'a.example': 20}
+
+def test_host_limit_rejects_a_zero_rate():
+    with pytest.raises(ValueError):
+        HostLimit(4, 0, 10)
@@ -0,0 +1,61 @@
+"""Single-flight coalescing of concurrent identical resolutions."""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from bypass_common.cache import SingleFlight
+from conftest import resolve
+def test_single_flight_runs_one_call_for_concurrent_callers():
+    flight = SingleFlight()
+    calls, release = [], threading.Event()
+
+    def resolve():
+        calls.append(1)
+        release.wait(5)
+        return 'link'
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        futures = [pool.submit(flight.do, 'key', resolve) for _ in range(5)]
+        deadline = time.time() + 5
+        while flight._calls.get('key') is None or flight._calls['key'].served < 5:
+            assert time.time() < deadline, "callers never joined the flight"
+            time.sleep(0.01)
+        release.set()
+        results = [future.result(timeout=5) for future in futures]
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert all(result == 'link' for result, _ in results)
+    assert flight.stats() == {"resolutions": 1, "requestsServed": 5, "coalescedRequests": 4, "maxRequestsPerResolution": 5, "inFlight": 0}
+
+def test_single_flight_shares_the_leader_error():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream broke")
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, 'key', fail)
+        assert started.wait(5)
+        follower = pool.submit(flight.do, 'key', lambda: 'never called')
+        while flight._calls['key'].served < 2: time.sleep(0.01)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(ValueError, match="upstream broke"):
+                future.result(timeout=5)
+    assert flight.do('key', lambda: 'fresh') == ('fresh', False)
+
+def test_concurrent_requests_share_one_resolution(start_app, mock_upstream):
+    gdflix, _ = start_app('gdflix')
+    url = f"{mock_upstream}/file/fc/{uuid.uuid4().hex}" # Fast Cloud links take 1s, so the requests overlap
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        results = list(pool.map(lambda _: resolve(gdflix, gdflixUrl=url), range(6)))
+    assert all(result["success"] for result in results)
+    assert len({result["finalUrl"] for result in results}) == 1
+    single_flight = requests.get(f"{gdflix}/api/gdflix/stats", timeout=10).json()["singleFlight"]
+    assert single_flight["resolutions"] == 1
+    assert single_flight["coalescedRequests"] == 5
@@ -0,0 +1,15 @@
+"""Speculative Fast Cloud / Drivebot branches on pages that offer both."""
+import uuid
+
+import pytest
+
+from conftest import resolve
+
+@pytest.mark.parametrize('grace, winner', [('0', 'gdindex.lol'), ('10', 'fastcloud.example')])
+def test_higher_priority_branch_wins_within_the_grace_window(start_app, mock_upstream, grace, winner):
+    # Drivebot answers at once; Fast Cloud (higher priority) only once its link is ready after 1s
+    gdflix, _ = start_app('gdflix', GDFLIX_SPECULATIVE_STRATEGIES='1', GDFLIX_SPECULATIVE_GRACE_SECONDS=grace)
+    result = resolve(gdflix, gdflixUrl=f"{mock_upstream}/file/fcdb/{uuid.uuid4().hex}", logLevel='info')
+    assert result["success"] and winner in result["finalUrl"]
+    if winner == 'fastcloud.example':
+        assert any("'Drivebot' also found a link, but 'Fast Cloud' has priority" in line for line in result["logs"])
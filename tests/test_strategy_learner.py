@@ -0,0 +1,62 @@
+"""Strategy learning: ordering by expected cost, and outcomes shared between workers through SQLite."""
+import pytest
+
+from bypass_common.learning import STRATEGY_MIN_TIMED_SAMPLES, StrategyLearner
+from bypass_common.store import SharedResultStore
+
+HOST = 'gdflix.example'
+
+def manual_learner(store):
+    # Synced only by the test: no background syncer racing the explicit sync() calls
+    learner = StrategyLearner(store, 'test')
+    learner._syncer_started = True
+    return learner
+
+@pytest.fixture
+def learner():
+    # Without an open shared store only this learner's own outcomes count
+    return manual_learner(SharedResultStore(100))
+
+def test_default_priority_without_outcomes(learner):
+    assert learner.order('gdflix', HOST, ['pixeldrain', 'fast_cloud', 'drivebot']) == ['pixeldrain', 'fast_cloud', 'drivebot']
+
+def test_failing_strategy_moves_back(learner):
+    for _ in range(5):
+        learner.record('gdflix', HOST, 'pixeldrain', False, 0.5)
+        learner.record('gdflix', HOST, 'fast_cloud', True, 0.5, 'https://a.gdindex.lol/x')
+    learner.sync()
+    assert learner.order('gdflix', HOST, ['pixeldrain', 'fast_cloud']) == ['fast_cloud', 'pixeldrain']
+    assert learner.order('gdflix', 'other.example', ['pixeldrain', 'fast_cloud']) == ['pixeldrain', 'fast_cloud'] # per host
+
+def test_faster_strategy_wins_once_timed(learner):
+    learner.typical_seconds = {'gdflix': {'fast_cloud': 10, 'drivebot': 15}}
+    assert learner.order('gdflix', HOST, ['drivebot', 'fast_cloud']) == ['fast_cloud', 'drivebot'] # typical times
+    for _ in range(STRATEGY_MIN_TIMED_SAMPLES):
+        learner.record('gdflix', HOST, 'fast_cloud', True, 40, 'https://a.gdindex.lol/x')
+        learner.record('gdflix', HOST, 'drivebot', True, 3, 'https://a.gdindex.lol/y')
+    learner.sync()
+    assert learner.order('gdflix', HOST, ['fast_cloud', 'drivebot']) == ['drivebot', 'fast_cloud']
+    assert learner.summary('gdflix', HOST, 'drivebot')["medianSeconds"] == 3
+
+def test_dead_links_and_short_lived_links_cost_more(learner):
+    for _ in range(5):
+        learner.record('video', HOST, 'PixelDrain Button', True, 0.1, 'https://pixeldrain.com/api/file/x')
+        learner.record('video', HOST, 'FSL Server Button', True, 0.1, 'https://cdn.fsl.pub/x')
+        learner.record_check('video', HOST, 'PixelDrain Button', False)
+    learner.sync()
+    assert learner.order('video', HOST, ['PixelDrain Button', 'FSL Server Button']) == ['FSL Server Button', 'PixelDrain Button']
+    for _ in range(5):
+        learner.record('drive', HOST, 'fsl_server', True, 0.1, 'https://cdn.fsl.pub/x?exp=60')
+        learner.record('drive', HOST, 'pixel_server', True, 0.1, 'https://pixeldrain.com/api/file/x')
+    learner.sync()
+    assert learner.order('drive', HOST, ['fsl_server', 'pixel_server']) == ['pixel_server', 'fsl_server']
+
+def test_workers_learn_from_each_other(tmp_path):
+    store = SharedResultStore(100)
+    store.open(str(tmp_path / 'shared.sqlite3'))
+    first, second = manual_learner(store), manual_learner(store)
+    for _ in range(5): first.record('gdflix', HOST, 'pixeldrain', False, 0.5)
+    first.sync()
+    second.sync()
+    assert second.summary('gdflix', HOST, 'pixeldrain')["attempts"] == 5
+    assert second.order('gdflix', HOST, ['pixeldrain', 'r2']) == ['r2', 'pixeldrain']
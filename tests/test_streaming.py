@@ -0,0 +1,33 @@
+"""Streamed fetches that stop reading once a redirect hop is decided."""
+import uuid
+
+from bypass_common.streaming import STREAM_CHUNK_SIZE, fetch_html, stream_stats
+from bypass_common.upstream import http_adapter, new_session, upstream_limiter
+from conftest import resolve
+
+PAGE_BYTES = 1024 * 1024 # the mock's /big/ pages
+
+def test_early_exit_reads_little_and_frees_the_host(gdflix_module, mock_upstream, monkeypatch):
+    monkeypatch.setattr(upstream_limiter, 'overrides', {'127.0.0.1': (1, 1000, 1000)})
+    monkeypatch.setattr(upstream_limiter, '_limits', {})
+    before = stream_stats()
+    response, text, complete = fetch_html(new_session(), f"{mock_upstream}/big/pd/{uuid.uuid4().hex}",
+                                          stop_when=gdflix_module.redirect_stop_condition(), timeout=10)
+    assert not complete and response.raw.closed
+    assert gdflix_module.META_REFRESH_PATTERN.search(text)
+    bytes_read = stream_stats()["bytesRead"] - before["bytesRead"]
+    assert bytes_read <= 4 * STREAM_CHUNK_SIZE < PAGE_BYTES
+    assert stream_stats()["earlyExits"] == before["earlyExits"] + 1
+    # the limiter slot and the adapter's in-use mark went with the closed body
+    slots = upstream_limiter.limit_for('127.0.0.1').slots
+    assert slots.acquire(blocking=False)
+    slots.release()
+    assert '127.0.0.1' not in http_adapter._in_use
+
+def test_big_redirect_page_resolves_without_reading_it(start_app, mock_upstream):
+    gdflix, _ = start_app('gdflix')
+    file_id = uuid.uuid4().hex
+    result = resolve(gdflix, gdflixUrl=f"{mock_upstream}/big/pd/{file_id}", logLevel='info')
+    assert result["success"] and file_id in result["finalUrl"]
+    stopped = next(line for line in result["logs"] if "stopped downloading the rest of the page" in line)
+    assert int(stopped.split("first ")[1].split(" characters")[0]) < PAGE_BYTES // 4
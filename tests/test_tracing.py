@@ -0,0 +1,25 @@
+"""Per-request traces returned in the response."""
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from bypass_common.tracing import Tracer
+from conftest import resolve
+
+def test_trace_only_when_asked(start_app, mock_upstream):
+    gdflix, _ = start_app('gdflix')
+    traced = resolve(gdflix, gdflixUrl=f"{mock_upstream}/file/pd/{uuid.uuid4().hex}", trace=True)
+    assert traced["trace"]["spans"][0]["name"] == 'gdflix.resolve'
+    assert "trace" not in resolve(gdflix, gdflixUrl=f"{mock_upstream}/file/pd/{uuid.uuid4().hex}")
+
+def test_failed_requests_are_exported_with_an_errored_root_span():
+    submitted = []
+    tracer = Tracer(exporter=SimpleNamespace(submit=submitted.append))
+    with pytest.raises(RuntimeError):
+        with tracer.trace('test.resolve'):
+            with tracer.span('fetch'): pass
+            raise RuntimeError("upstream vanished")
+    spans = {span["name"]: span for span in submitted[0].to_dict()["spans"]}
+    assert spans['test.resolve']["status"] == 'error' and "upstream vanished" in spans['test.resolve']["message"]
+    assert spans['fetch']["status"] == 'ok'